@@ -0,0 +1,79 @@
+"""Authentication overhead per request, by path.
+
+Calls the auth dependencies directly, each with a fresh ``AsyncSession``
+as a request would get, against the database behind ``DATABASE_URL``:
+
+- user lookup: ``get_current_user`` with an empty principal cache
+- principal cache: ``get_current_user`` with the snapshot cached
+- stateless: ``get_current_principal`` with ``AUTH_STATELESS`` on and
+  the token version cached
+
+    python -m benchmarks.auth_overhead --repeat 2000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import format_percentiles
+from fast_async import security
+from fast_async.database import engine
+from fast_async.models import User
+
+
+async def seed():
+    name = f'bench-{uuid.uuid4().hex[:12]}'
+    async with engine.begin() as conn:
+        user = await conn.execute(
+            insert(User)
+            .values(username=name, email=f'{name}@bench.com', password='x')
+            .returning(User.id, User.email, User.token_version)
+        )
+        return user.one()
+
+
+async def sample(dependency, token, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            start = time.perf_counter()
+            await dependency(session, token)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main(args):
+    user = await seed()
+    token = security.create_access_token(security.token_claims(user))
+
+    try:
+        cases = (
+            (
+                'user lookup',
+                security.get_current_user,
+                security.principal_cache.clear,
+            ),
+            ('principal cache', security.get_current_user, None),
+            ('stateless', security.get_current_principal, None),
+        )
+        for label, dependency, before in cases:
+            security.settings.AUTH_STATELESS = label == 'stateless'
+            await sample(dependency, token, 1)
+            samples = await sample(dependency, token, args.repeat, before)
+            print(format_percentiles(label, samples))
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(delete(User).where(User.id == user.id))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
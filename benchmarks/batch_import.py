@@ -0,0 +1,76 @@
+"""Import N todos one request at a time versus through POST /todos/batch.
+
+python -m benchmarks.batch_import --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import create_account
+
+
+def payload(i):
+    return {'title': f'imported {i}', 'description': 'benchmark import'}
+
+
+async def single_inserts(client, headers, total, concurrency):
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            await client.post('/todos/', json=payload(i), headers=headers)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def batched_insert(client, headers, total, batch_size):
+    for start in range(0, total, batch_size):
+        await client.post(
+            '/todos/batch',
+            json={
+                'todos': [
+                    payload(i)
+                    for i in range(start, min(start + batch_size, total))
+                ]
+            },
+            headers=headers,
+        )
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        _, _, token = await create_account(client)
+        headers = {'authorization': f'Bearer {token}'}
+
+        for label, run in (
+            (
+                f'{args.total} single POSTs',
+                single_inserts(client, headers, args.total, args.concurrency),
+            ),
+            (
+                f'batches of {args.batch_size}',
+                batched_insert(client, headers, args.total, args.batch_size),
+            ),
+        ):
+            start = time.perf_counter()
+            await run
+            elapsed = time.perf_counter() - start
+            print(
+                f'{label:>28}: {elapsed:.2f}s '
+                f'({args.total / elapsed:,.0f} todos/s)'
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--total', type=int, default=10_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,36 @@
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def format_percentiles(label, samples):
+    stats = percentiles(samples)
+    return f'{label:>28}: ' + ' '.join(
+        f'{name}={value:.2f}ms' for name, value in stats.items()
+    )
+
+
+async def create_account(client: httpx.AsyncClient):
+    name = f'bench-{uuid.uuid4().hex[:12]}'
+    email = f'{name}@bench.com'
+    await client.post(
+        '/users/',
+        json={'username': name, 'email': email, 'password': name},
+    )
+    response = await client.post(
+        '/auth/token', data={'username': email, 'password': name}
+    )
+    return email, name, response.json()['token_access']
+
+
+async def timed_get(client: httpx.AsyncClient, url, **kwargs):
+    start = time.perf_counter()
+    response = await client.get(url, **kwargs)
+    return response, (time.perf_counter() - start) * 1000
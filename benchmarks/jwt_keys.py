@@ -0,0 +1,102 @@
+"""Sign and verify throughput of access tokens per algorithm, on one core.
+
+Each asymmetric algorithm runs twice: through a ``KeyRing`` holding
+parsed key objects, and with PEM strings, which PyJWT re-parses on every
+call:
+
+    python -m benchmarks.jwt_keys --seconds 1
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt import PyJWK, decode, encode
+from jwt.algorithms import get_default_algorithms
+
+from fast_async.keys import KeyRing, generate_jwk
+
+
+def rs256_jwk():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = get_default_algorithms()['RS256'].to_jwk(key, as_dict=True)
+    return {**jwk, 'kid': 'rs', 'alg': 'RS256'}
+
+
+def pem_pair(jwk):
+    key = PyJWK(jwk).key
+    private = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return private.decode(), public.decode()
+
+
+def per_second(func, seconds):
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        func()
+        calls += 1
+    return calls / seconds
+
+
+def report(label, sign, verify, seconds):
+    print(
+        f'{label:>20}: sign {per_second(sign, seconds):>9,.0f}/s '
+        f'verify {per_second(verify, seconds):>9,.0f}/s'
+    )
+
+
+def main(args):
+    claims = {
+        'sub': 'bench@bench.com',
+        'uid': 1,
+        'ver': 0,
+        'exp': datetime.now(tz=timezone.utc) + timedelta(hours=1),
+    }
+
+    ring = KeyRing.from_secret('x' * 32, 'HS256')
+    token = ring.sign(claims)
+    report(
+        'HS256',
+        lambda: ring.sign(claims),
+        lambda: ring.verify(token),
+        args.seconds,
+    )
+
+    for jwk in (
+        generate_jwk('EdDSA', 'ed'),
+        generate_jwk('ES256', 'es'),
+        rs256_jwk(),
+    ):
+        alg = jwk['alg']
+        ring = KeyRing.from_jwks({'keys': [jwk]})
+        token = ring.sign(claims)
+        report(
+            f'{alg} key ring',
+            lambda: ring.sign(claims),
+            lambda: ring.verify(token),
+            args.seconds,
+        )
+
+        private, public = pem_pair(jwk)
+        report(
+            f'{alg} PEM per call',
+            lambda: encode(claims, private, algorithm=alg),
+            lambda: decode(token, public, algorithms=[alg]),
+            args.seconds,
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=1)
+    main(parser.parse_args())
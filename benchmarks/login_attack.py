@@ -0,0 +1,113 @@
+"""Server CPU under a credential-stuffing run against /auth/token.
+
+Start the app and pass its pid (with ``fast_async.server`` the master's
+pid, whose workers are counted too):
+
+    LOGIN_RATE_LIMIT_ENABLED=false python -m fast_async.server &
+    python -m benchmarks.login_attack --pid $! --seconds 20
+
+Every attempt uses a wrong password for one of ``--accounts`` accounts,
+created up front so that each attempt that gets through costs a hash.
+With ``--ips`` above one, attempts are spread over that many addresses
+through ``X-Forwarded-For``, which the server trusts from localhost.
+Run it once with the limiter off and once on: with it on, CPU stays near
+what the allowed attempts cost however hard the run pushes, as rejected
+attempts skip the lookup and the hash.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+
+def process_tree(pid):
+    children = Path(f'/proc/{pid}/task/{pid}/children').read_text(
+        encoding='utf-8'
+    )
+    return [pid, *(p for c in children.split() for p in process_tree(c))]
+
+
+def cpu_seconds(pid):
+    total = 0
+    for process in process_tree(pid):
+        try:
+            stat = Path(f'/proc/{process}/stat').read_text(encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        utime, stime = stat.rsplit(')', 1)[1].split()[11:13]
+        total += int(utime) + int(stime)
+    return total / os.sysconf('SC_CLK_TCK')
+
+
+async def create_victims(client, accounts):
+    prefix = uuid.uuid4().hex[:8]
+    emails = []
+    for n in range(accounts):
+        name = f'victim-{prefix}-{n}'
+        await client.post(
+            '/users/',
+            json={
+                'username': name,
+                'email': f'{name}@bench.com',
+                'password': name,
+            },
+        )
+        emails.append(f'{name}@bench.com')
+    return emails
+
+
+async def attack(client, emails, args, deadline, statuses):
+    while time.monotonic() < deadline:
+        email = random.choice(emails)
+        n = random.randrange(args.ips)
+        ip = f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'
+        response = await client.post(
+            '/auth/token',
+            data={'username': email, 'password': 'wrong'},
+            headers={'x-forwarded-for': ip} if args.ips > 1 else None,
+        )
+        statuses[response.status_code] += 1
+
+
+async def main(args):
+    statuses = Counter()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=60
+    ) as client:
+        emails = await create_victims(client, args.accounts)
+        cpu_before = cpu_seconds(args.pid) if args.pid else None
+        start = time.monotonic()
+        deadline = start + args.seconds
+        await asyncio.gather(
+            *(
+                attack(client, emails, args, deadline, statuses)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.monotonic() - start
+
+    attempts = sum(statuses.values())
+    print(f'{"attempts/s":>12}: {attempts / elapsed:,.0f}')
+    print(f'{"responses":>12}: {dict(statuses)}')
+    if cpu_before is not None:
+        cpu = (cpu_seconds(args.pid) - cpu_before) / elapsed
+        print(f'{"server cpu":>12}: {cpu * 100:.0f}% of one core')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--pid', type=int)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--ips', type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Latency of GET /todos/ while /auth/token is flooded with logins.
+
+Start the app with the login limiter off, so that every login reaches the
+hash (``LOGIN_RATE_LIMIT_ENABLED=false fastapi run fast_async/app.py``),
+and run:
+
+    python -m benchmarks.login_flood --url http://localhost:8000
+
+Compare the numbers with the hashing pool enabled against a checkout
+where argon2 runs on the event loop.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import create_account, format_percentiles, timed_get
+
+
+async def measure_todos(client, token, requests, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            _, elapsed = await timed_get(
+                client, '/todos/', headers={'authorization': f'Bearer {token}'}
+            )
+            latencies.append(elapsed)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def flood_logins(client, email, password, stop, statuses):
+    while not stop.is_set():
+        response = await client.post(
+            '/auth/token', data={'username': email, 'password': password}
+        )
+        statuses[response.status_code] += 1
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.flood + args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=60
+    ) as client:
+        email, password, token = await create_account(client)
+
+        baseline = await measure_todos(
+            client, token, args.requests, args.concurrency
+        )
+
+        stop = asyncio.Event()
+        statuses = Counter()
+        flooders = [
+            asyncio.create_task(
+                flood_logins(client, email, password, stop, statuses)
+            )
+            for _ in range(args.flood)
+        ]
+        under_flood = await measure_todos(
+            client, token, args.requests, args.concurrency
+        )
+        stop.set()
+        await asyncio.gather(*flooders)
+
+    print(format_percentiles('idle', baseline))
+    print(format_percentiles(f'{args.flood} login flooders', under_flood))
+    print(f'{"login responses":>28}: {dict(statuses)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--flood', type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
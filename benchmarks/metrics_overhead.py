@@ -0,0 +1,63 @@
+"""Per-request cost of the metrics middleware, without a server.
+
+Calls ``GET /`` straight through the ASGI interface, with and without
+``MetricsMiddleware``, and reports latency percentiles:
+
+    python -m benchmarks.metrics_overhead --repeat 20000
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import format_percentiles
+from fast_async.app import app
+from fast_async.metrics import MetricsMiddleware
+
+SCOPE = {
+    'type': 'http',
+    'asgi': {'version': '3.0'},
+    'http_version': '1.1',
+    'method': 'GET',
+    'scheme': 'http',
+    'path': '/',
+    'raw_path': b'/',
+    'root_path': '',
+    'query_string': b'',
+    'headers': [],
+    'server': ('bench', 80),
+}
+
+
+async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+async def send(message):
+    pass
+
+
+async def sample(asgi_app, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await asgi_app(dict(SCOPE), receive, send)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main(args):
+    # The app's middleware stack is built on first call; compare the
+    # router alone against the router wrapped in the middleware.
+    for label, asgi_app in (
+        ('router', app.router),
+        ('MetricsMiddleware(router)', MetricsMiddleware(app.router)),
+    ):
+        await sample(asgi_app, 100)
+        print(format_percentiles(label, await sample(asgi_app, args.repeat)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""Latency of GET /todos/ at page 1 and at a deep page, offset vs cursor.
+
+Seeds one account with ``--pages * --limit`` todos directly in the
+database behind ``DATABASE_URL`` and times both paging modes against the
+running app. Start the app with ``TODO_LIST_CACHE_SIZE=0`` so repeated
+requests reach the database instead of the rendered page cache:
+
+    python -m benchmarks.pagination --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.common import create_account, format_percentiles, timed_get
+from fast_async.pagination import encode_cursor
+from fast_async.settings import Settings
+
+
+async def seed_todos(engine, email, total):
+    async with engine.begin() as conn:
+        user_id = await conn.scalar(
+            text('SELECT id FROM users WHERE email = :email'),
+            {'email': email},
+        )
+        await conn.execute(
+            text(
+                'INSERT INTO todos '
+                '(title, description, state, user_id, created_at) '
+                "SELECT 'todo ' || n, 'description ' || n, 'todo', :user_id, "
+                'now() - make_interval(secs => :total - n) '
+                'FROM generate_series(1, :total) AS n'
+            ),
+            {'user_id': user_id, 'total': total},
+        )
+    return user_id
+
+
+async def cursor_before(engine, user_id, offset):
+    async with engine.connect() as conn:
+        row = (
+            await conn.execute(
+                text(
+                    'SELECT created_at, id FROM todos WHERE user_id = :uid '
+                    'ORDER BY created_at, id OFFSET :offset LIMIT 1'
+                ),
+                {'uid': user_id, 'offset': offset - 1},
+            )
+        ).one()
+    return encode_cursor(list(row))
+
+
+async def sample(client, url, token, repeat):
+    headers = {'authorization': f'Bearer {token}'}
+    await client.get(url, headers=headers)
+    return [
+        (await timed_get(client, url, headers=headers))[1]
+        for _ in range(repeat)
+    ]
+
+
+async def main(args):
+    engine = create_async_engine(Settings().DATABASE_URL)
+    deep_offset = (args.pages - 1) * args.limit
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        email, _, token = await create_account(client)
+        user_id = await seed_todos(engine, email, args.pages * args.limit)
+        deep_cursor = await cursor_before(engine, user_id, deep_offset)
+
+        cases = {
+            'offset page 1': f'/todos/?limit={args.limit}',
+            f'offset page {args.pages}': (
+                f'/todos/?limit={args.limit}&offset={deep_offset}'
+            ),
+            'cursor page 1': f'/todos/?limit={args.limit}',
+            f'cursor page {args.pages}': (
+                f'/todos/?limit={args.limit}&cursor={deep_cursor}'
+            ),
+        }
+        for label, url in cases.items():
+            samples = await sample(client, url, token, args.repeat)
+            print(format_percentiles(label, samples))
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--pages', type=int, default=10_000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""Time and memory per 1k-row todo page: ORM entities vs column projection.
+
+Seeds one throwaway user with ``--rows`` todos in the database behind
+``DATABASE_URL``. It then loads the page repeatedly both ways through an
+``AsyncSession``, as the routers do, and reports latency percentiles and
+the peak traced allocation of one page:
+
+    python -m benchmarks.projection --rows 1000 --repeat 200
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from benchmarks.common import format_percentiles
+from fast_async.models import Todo, User
+from fast_async.responses import row_dicts
+from fast_async.routers.todos import PUBLIC_COLUMNS
+from fast_async.settings import Settings
+
+
+async def seed(engine, rows):
+    name = f'bench-{uuid.uuid4().hex[:12]}'
+    async with engine.begin() as conn:
+        user_id = await conn.scalar(
+            insert(User)
+            .values(username=name, email=f'{name}@bench.com', password='x')
+            .returning(User.id)
+        )
+        await conn.execute(
+            text(
+                'INSERT INTO todos (title, description, state, user_id) '
+                "SELECT 'todo ' || n, repeat('lorem ipsum ', 8), 'todo', "
+                ':user_id FROM generate_series(1, :rows) AS n'
+            ),
+            {'user_id': user_id, 'rows': rows},
+        )
+    return user_id
+
+
+async def load_entities(session, user_id, rows):
+    todos = await session.scalars(
+        select(Todo).where(Todo.user_id == user_id).limit(rows)
+    )
+    return todos.all()
+
+
+async def load_projection(session, user_id, rows):
+    todos = await session.execute(
+        select(*PUBLIC_COLUMNS).where(Todo.user_id == user_id).limit(rows)
+    )
+    return row_dicts(todos.all())
+
+
+async def measure(engine, load, user_id, rows, repeat):
+    samples = []
+    for _ in range(repeat):
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            start = time.perf_counter()
+            await load(session, user_id, rows)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        tracemalloc.start()
+        page = await load(session, user_id, rows)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    assert len(page) == rows
+
+    return samples, peak
+
+
+async def main(args):
+    engine = create_async_engine(Settings().DATABASE_URL)
+    user_id = await seed(engine, args.rows)
+
+    try:
+        for label, load in (
+            ('select(Todo)', load_entities),
+            ('select(*PUBLIC_COLUMNS)', load_projection),
+        ):
+            samples, peak = await measure(
+                engine, load, user_id, args.rows, args.repeat
+            )
+            print(
+                format_percentiles(label, samples),
+                f'peak={peak / 1024:.0f}KiB',
+            )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(delete(User).where(User.id == user_id))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
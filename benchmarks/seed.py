@@ -0,0 +1,113 @@
+"""Seed the database behind ``DATABASE_URL`` with a benchmark data set.
+
+Creates ``--users`` accounts (``bench-user-<n>@bench.com``, password
+``bench``) and ``--todos`` todos. Owners are drawn as
+``floor(users * random() ^ skew)``, so low-numbered users are power
+users: with the default skew of 3, the first 1% of accounts own about a
+fifth of all todos and most accounts own a handful. Todos are inserted
+in chunks, one transaction each, and the tables are analyzed at the end:
+
+    python -m benchmarks.seed --users 100000 --todos 10000000
+
+Done todos get a ``done_at`` between their creation and now, and the
+counters behind ``GET /todos/stats`` are filled by the todos triggers as
+the chunks go in. ``--reset`` empties ``users`` and ``todos`` first.
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from fast_async.hashing import get_password_hash
+from fast_async.settings import Settings
+
+PASSWORD = 'bench'
+USER_PREFIX = 'bench-user-'
+
+
+async def seed_users(conn, users, password_hash):
+    return await conn.scalar(
+        text(
+            'WITH inserted AS ('
+            ' INSERT INTO users (username, email, password)'
+            ' SELECT :prefix || n, :prefix || n || :domain, :password'
+            ' FROM generate_series(1, :users) AS n RETURNING id'
+            ') SELECT min(id) FROM inserted'
+        ),
+        {
+            'prefix': USER_PREFIX,
+            'domain': '@bench.com',
+            'password': password_hash,
+            'users': users,
+        },
+    )
+
+
+async def seed_todos(conn, first_user_id, users, todos, skew):
+    await conn.execute(
+        text(
+            'INSERT INTO todos '
+            '(title, description, state, user_id, created_at, done_at) '
+            'SELECT title, description, state, user_id, created_at, '
+            "CASE WHEN state = 'done' "
+            'THEN created_at + random() * (now() - created_at) END '
+            'FROM ('
+            " SELECT 'todo ' || n || ' ' || left(md5(n::text), 8) AS title,"
+            " 'description ' || md5(n::text) AS description,"
+            ' (enum_range(NULL::todostate))[1 + floor(random() * 5)::int]'
+            ' AS state,'
+            ' :first + floor(:users * power(random(), :skew))::int'
+            ' AS user_id,'
+            " now() - random() * interval '365 days' AS created_at"
+            ' FROM generate_series(1, :todos) AS n'
+            ') AS seeded'
+        ),
+        {
+            'first': first_user_id,
+            'users': users,
+            'skew': skew,
+            'todos': todos,
+        },
+    )
+
+
+async def main(args):
+    engine = create_async_engine(Settings().DATABASE_URL)
+    start = time.perf_counter()
+
+    async with engine.begin() as conn:
+        if args.reset:
+            await conn.execute(
+                text('TRUNCATE users, todos RESTART IDENTITY CASCADE')
+            )
+        first_user_id = await seed_users(
+            conn, args.users, get_password_hash(PASSWORD)
+        )
+    print(f'{args.users:,} users from id {first_user_id}')
+
+    for done in range(0, args.todos, args.chunk):
+        rows = min(args.chunk, args.todos - done)
+        async with engine.begin() as conn:
+            await seed_todos(conn, first_user_id, args.users, rows, args.skew)
+        print(
+            f'{done + rows:,} todos ({time.perf_counter() - start:.0f}s)',
+            flush=True,
+        )
+
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE users, todos'))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--todos', type=int, default=10_000_000)
+    parser.add_argument('--skew', type=float, default=3)
+    parser.add_argument('--chunk', type=int, default=500_000)
+    parser.add_argument('--reset', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""Per-core throughput of rendering a GET /todos/ page, old path vs new.
+
+The old path is what FastAPI does when an endpoint returns ORM objects:
+`serialize_response` validates them against the `TodoList` response
+model and dumps it, then `JSONResponse` runs `json.dumps`. The new path
+encodes `Row` dicts straight from the column projection with
+pydantic-core. Both run in this one process on one
+core, without the database, so the numbers are a ceiling on pages per
+second for the rendering step alone:
+
+    python -m benchmarks.serialization --rows 100 --seconds 3
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.engine import result_tuple
+
+from fast_async.models import Todo, TodoState
+from fast_async.responses import FastJSONResponse, row_dicts
+from fast_async.routers.todos import PUBLIC_COLUMNS
+from fast_async.schemas import TodoList
+
+
+def make_todos(rows):
+    now = datetime.now()
+    todos = []
+    for i in range(rows):
+        todo = Todo(
+            title=f'todo {i}',
+            description='lorem ipsum dolor sit amet ' * 4,
+            state=TodoState.todo,
+            user_id=1,
+        )
+        todo.id = i
+        todo.created_at = now - timedelta(seconds=i)
+        todo.updated_at = now
+        todos.append(todo)
+    return todos
+
+
+def make_rows(todos):
+    row = result_tuple([column.key for column in PUBLIC_COLUMNS])
+    # Shaped like the projection's rows, where the state is a string.
+    return [
+        row([
+            todo.title,
+            todo.description,
+            todo.state.value,
+            todo.id,
+            todo.created_at,
+            todo.updated_at,
+        ])
+        for todo in todos
+    ]
+
+
+RESPONSE_FIELD = create_model_field(
+    name='Response_list_todos', type_=TodoList, mode='serialization'
+)
+
+
+async def orm_response(todos):
+    content = await serialize_response(
+        field=RESPONSE_FIELD,
+        response_content={'todos': todos, 'next_cursor': None},
+    )
+    return JSONResponse(content).body
+
+
+async def row_response(rows):
+    return FastJSONResponse({
+        'todos': row_dicts(rows),
+        'next_cursor': None,
+    }).body
+
+
+async def pages_per_second(render, page, seconds):
+    pages = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        await render(page)
+        pages += 1
+    return pages / seconds
+
+
+async def main(args):
+    todos = make_todos(args.rows)
+    rows = make_rows(todos)
+    assert await orm_response(todos) == await row_response(rows)
+
+    before = await pages_per_second(orm_response, todos, args.seconds)
+    after = await pages_per_second(row_response, rows, args.seconds)
+
+    print(f'{args.rows} rows per page, one core')
+    print(f'{"ORM + response model":>28}: {before:,.0f} pages/s')
+    print(f'{"Row dicts + pydantic-core":>28}: {after:,.0f} pages/s')
+    print(f'{"speedup":>28}: {after / before:.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,478 @@
+"""Throughput and latency of every route, compared against a baseline.
+
+Needs the data set from ``benchmarks.seed`` in the database behind
+``DATABASE_URL`` and the app running against it with the same settings,
+since access tokens are minted here with the app's signing key rather
+than by logging in. Each route gets ``--requests`` requests, prepared up
+front, sent at ``--concurrency``, and reports RPS and p50/p95/p99:
+
+    python -m benchmarks.suite --url http://localhost:8000 \\
+        --save results.json --baseline baseline.json
+
+Requests are made as users picked with the same skew as the seeded
+todos, so power users show up as often as they would in traffic. Routes
+that change or delete an account use throwaway accounts, removed at the
+end. With ``--baseline``, a route whose RPS dropped or whose p95 rose by
+more than ``--tolerance`` fails the run, as does any unexpected status.
+A route missing from ``SCENARIOS`` fails it too.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http import HTTPStatus
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.common import percentiles
+from benchmarks.seed import PASSWORD, USER_PREFIX
+from fast_async.hashing import get_password_hash
+from fast_async.routers import auth, todos, users
+from fast_async.security import create_access_token, token_claims
+from fast_async.settings import Settings
+
+TMP_PREFIX = 'bench-tmp-'
+
+
+@dataclass
+class Request:
+    method: str
+    url: str
+    kwargs: dict
+
+
+class Context:
+    def __init__(self, engine, first_user_id, user_count, skew):
+        self.engine = engine
+        self.first_user_id = first_user_id
+        self.user_count = user_count
+        self.skew = skew
+        self.password_hash = get_password_hash(PASSWORD)
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def skewed_ids(self, n):
+        return [
+            self.first_user_id
+            + int(self.user_count * random.random() ** self.skew)
+            for _ in range(n)
+        ]
+
+    def uniform_ids(self, n):
+        return [
+            self.first_user_id + random.randrange(self.user_count)
+            for _ in range(n)
+        ]
+
+    async def users(self, ids):
+        async with self.engine.connect() as conn:
+            rows = await conn.execute(
+                text(
+                    'SELECT id, email, token_version FROM users '
+                    'WHERE id = ANY(:ids)'
+                ),
+                {'ids': list(set(ids))},
+            )
+            by_id = {row.id: row for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    async def throwaway_users(self, n):
+        prefix = f'{TMP_PREFIX}{self.run_id}-{uuid.uuid4().hex[:6]}-'
+        async with self.engine.begin() as conn:
+            rows = await conn.execute(
+                text(
+                    'INSERT INTO users (username, email, password) '
+                    "SELECT :prefix || n, :prefix || n || '@bench.com', :pw "
+                    'FROM generate_series(1, :n) AS n '
+                    'RETURNING id, email, token_version'
+                ),
+                {
+                    'prefix': prefix,
+                    'pw': self.password_hash,
+                    'n': n,
+                },
+            )
+            return rows.all()
+
+    async def insert_todos(self, user_id, n):
+        async with self.engine.begin() as conn:
+            ids = await conn.scalars(
+                text(
+                    'INSERT INTO todos (title, description, state, user_id) '
+                    "SELECT 'bench ' || n, 'bench', 'todo', :user_id "
+                    'FROM generate_series(1, :n) AS n RETURNING id'
+                ),
+                {'user_id': user_id, 'n': n},
+            )
+            return ids.all()
+
+    async def owned_todos(self, ids):
+        async with self.engine.connect() as conn:
+            rows = await conn.execute(
+                text(
+                    'SELECT DISTINCT ON (user_id) user_id, id FROM todos '
+                    'WHERE user_id = ANY(:ids) ORDER BY user_id, id'
+                ),
+                {'ids': list(set(ids))},
+            )
+            return dict(rows.all())
+
+    async def cleanup(self):
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text('DELETE FROM users WHERE username LIKE :pattern'),
+                {'pattern': f'{TMP_PREFIX}{self.run_id}-%'},
+            )
+
+
+def bearer(user):
+    token = create_access_token(token_claims(user))
+    return {'authorization': f'Bearer {token}'}
+
+
+def random_ip():
+    return f'10.{random.randrange(256)}.{random.randrange(256)}.1'
+
+
+async def login(ctx, n):
+    # Spread over addresses and accounts, as the login limiter would
+    # otherwise answer most of them with 429.
+    return [
+        Request(
+            'POST',
+            '/auth/token',
+            {
+                'data': {'username': user.email, 'password': PASSWORD},
+                'headers': {'x-forwarded-for': random_ip()},
+            },
+        )
+        for user in await ctx.users(ctx.uniform_ids(n))
+    ]
+
+
+async def authenticated(ctx, n, method, url, **kwargs):
+    return [
+        Request(method, url, {'headers': bearer(user), **kwargs})
+        for user in await ctx.users(ctx.skewed_ids(n))
+    ]
+
+
+async def jwks(ctx, n):
+    return [Request('GET', '/auth/jwks', {})] * n
+
+
+async def create_user(ctx, n):
+    prefix = f'{TMP_PREFIX}{ctx.run_id}-new-'
+    return [
+        Request(
+            'POST',
+            '/users/',
+            {
+                'json': {
+                    'username': f'{prefix}{i}',
+                    'email': f'{prefix}{i}@bench.com',
+                    'password': PASSWORD,
+                }
+            },
+        )
+        for i in range(n)
+    ]
+
+
+async def read_user(ctx, n):
+    return [
+        Request(
+            'GET',
+            f'/users/{user_id}',
+            {'headers': bearer(user)},
+        )
+        for user, user_id in zip(
+            await ctx.users(ctx.skewed_ids(n)), ctx.uniform_ids(n)
+        )
+    ]
+
+
+async def update_user(ctx, n):
+    return [
+        Request(
+            'PUT',
+            f'/users/{user.id}',
+            {
+                'headers': bearer(user),
+                'json': {
+                    'username': f'{user.email}-renamed',
+                    'email': user.email,
+                    'password': PASSWORD,
+                },
+            },
+        )
+        for user in await ctx.throwaway_users(n)
+    ]
+
+
+async def delete_user(ctx, n):
+    return [
+        Request('DELETE', f'/users/{user.id}', {'headers': bearer(user)})
+        for user in await ctx.throwaway_users(n)
+    ]
+
+
+async def export_todos(ctx, n):
+    # Uniform rather than skewed: a power user's export is the whole of
+    # a large share of the table.
+    return [
+        Request('GET', '/todos/export', {'headers': bearer(user)})
+        for user in await ctx.users(ctx.uniform_ids(n))
+    ]
+
+
+async def patch_todo(ctx, n):
+    ids = ctx.skewed_ids(n)
+    owned = await ctx.owned_todos(ids)
+    return [
+        Request(
+            'PATCH',
+            f'/todos/{owned[user.id]}',
+            {'headers': bearer(user), 'json': {'title': 'bench patched'}},
+        )
+        for user in await ctx.users(ids)
+        if user.id in owned
+    ]
+
+
+async def patch_todo_batch(ctx, n):
+    requests = []
+    for user in await ctx.users(ctx.skewed_ids(n)):
+        ids = await ctx.insert_todos(user.id, 20)
+        requests.append(
+            Request(
+                'PATCH',
+                '/todos/batch',
+                {
+                    'headers': bearer(user),
+                    'json': {'ids': ids, 'state': 'done'},
+                },
+            )
+        )
+    return requests
+
+
+async def delete_todo(ctx, n):
+    requests = []
+    for user in await ctx.users(ctx.skewed_ids(n)):
+        (todo_id,) = await ctx.insert_todos(user.id, 1)
+        requests.append(
+            Request('DELETE', f'/todos/{todo_id}', {'headers': bearer(user)})
+        )
+    return requests
+
+
+async def delete_todo_batch(ctx, n):
+    requests = []
+    for user in await ctx.users(ctx.skewed_ids(n)):
+        ids = await ctx.insert_todos(user.id, 20)
+        requests.append(
+            Request(
+                'DELETE',
+                '/todos/batch',
+                {'headers': bearer(user), 'json': {'ids': ids}},
+            )
+        )
+    return requests
+
+
+TODO = {'title': 'bench', 'description': 'bench', 'state': 'todo'}
+
+SCENARIOS = {
+    'POST /auth/token': login,
+    'POST /auth/refresh-token': lambda ctx, n: authenticated(
+        ctx, n, 'POST', '/auth/refresh-token'
+    ),
+    'GET /auth/jwks': jwks,
+    'POST /users/': create_user,
+    'GET /users/': lambda ctx, n: authenticated(ctx, n, 'GET', '/users/'),
+    'GET /users/{user_id}': read_user,
+    'PUT /users/{user_id}': update_user,
+    'DELETE /users/{user_id}': delete_user,
+    'POST /todos/': lambda ctx, n: authenticated(
+        ctx, n, 'POST', '/todos/', json=TODO
+    ),
+    'GET /todos/': lambda ctx, n: authenticated(ctx, n, 'GET', '/todos/'),
+    'GET /todos/?title=': lambda ctx, n: authenticated(
+        ctx, n, 'GET', '/todos/', params={'title': 'todo 1'}
+    ),
+    'GET /todos/export': export_todos,
+    'GET /todos/stats': lambda ctx, n: authenticated(
+        ctx, n, 'GET', '/todos/stats'
+    ),
+    'POST /todos/batch': lambda ctx, n: authenticated(
+        ctx, n, 'POST', '/todos/batch', json={'todos': [TODO] * 50}
+    ),
+    'PATCH /todos/batch': patch_todo_batch,
+    'DELETE /todos/batch': delete_todo_batch,
+    'DELETE /todos/{todo_id}': delete_todo,
+    'PATCH /todos/{todo_id}': patch_todo,
+}
+
+
+def unbenchmarked_routes():
+    routes = {
+        f'{method} {route.path}'
+        for router in (auth.router, users.router, todos.router)
+        for route in router.routes
+        for method in route.methods
+    }
+    return sorted(routes - SCENARIOS.keys())
+
+
+async def drive(client, requests, concurrency):
+    latencies = []
+    statuses = Counter()
+    queue = iter(requests)
+
+    async def worker():
+        for request in queue:
+            start = time.perf_counter()
+            response = await client.request(
+                request.method, request.url, **request.kwargs
+            )
+            await response.aread()
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    errors = sum(
+        n for status, n in statuses.items() if status >= HTTPStatus.BAD_REQUEST
+    )
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'rps': len(latencies) / elapsed,
+        **{k: round(v, 3) for k, v in percentiles(latencies).items()},
+    }
+
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for route, result in results.items():
+        if result['errors']:
+            failures.append(f'{route}: {result["statuses"]}')
+        before = baseline.get(route)
+        if before is None:
+            continue
+        if result['rps'] < before['rps'] * (1 - tolerance):
+            failures.append(
+                f'{route}: {result["rps"]:.0f} rps, was {before["rps"]:.0f}'
+            )
+        if result['p95'] > before['p95'] * (1 + tolerance):
+            failures.append(
+                f'{route}: p95 {result["p95"]:.1f}ms, '
+                f'was {before["p95"]:.1f}ms'
+            )
+    return failures
+
+
+async def seeded_users(engine):
+    async with engine.connect() as conn:
+        row = await conn.execute(
+            text(
+                'SELECT min(id), count(*) FROM users '
+                'WHERE username LIKE :pattern'
+            ),
+            {'pattern': f'{USER_PREFIX}%'},
+        )
+        return row.one()
+
+
+async def main(args):
+    missing = unbenchmarked_routes()
+    if missing:
+        print(f'No scenario for: {", ".join(missing)}')
+        return 1
+
+    engine = create_async_engine(Settings().DATABASE_URL)
+    first_user_id, user_count = await seeded_users(engine)
+    if not user_count:
+        print('No seeded users; run benchmarks.seed first')
+        return 1
+    ctx = Context(engine, first_user_id, user_count, args.skew)
+
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=args.url, limits=limits, timeout=60
+        ) as client:
+            for route, scenario in SCENARIOS.items():
+                if args.only and args.only not in route:
+                    continue
+                # The first few warm connections and caches up; they are
+                # separate requests since many can only be sent once.
+                requests = await scenario(
+                    ctx, args.requests + args.concurrency
+                )
+                await drive(client, requests[: args.concurrency], 1)
+                results[route] = result = await drive(
+                    client, requests[args.concurrency :], args.concurrency
+                )
+                print(
+                    f'{route:>26}: {result["rps"]:>8.1f} rps '
+                    f'p50={result["p50"]:.2f}ms p95={result["p95"]:.2f}ms '
+                    f'p99={result["p99"]:.2f}ms errors={result["errors"]}',
+                    flush=True,
+                )
+    finally:
+        await ctx.cleanup()
+        await engine.dispose()
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'meta': {
+                        'at': datetime.now(tz=timezone.utc).isoformat(),
+                        'url': args.url,
+                        'requests': args.requests,
+                        'concurrency': args.concurrency,
+                        'users': user_count,
+                    },
+                    'routes': results,
+                },
+                file,
+                indent=2,
+            )
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['routes']
+    failures = regressions(results, baseline, args.tolerance)
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--skew', type=float, default=3)
+    parser.add_argument('--only', help='run routes containing this text')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    sys.exit(asyncio.run(main(parser.parse_args())))
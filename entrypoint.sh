@@ -1,4 +1,4 @@
 #!/bin/sh
 poetry run alembic upgrade head
 
-poetry run uvicorn --host 0.0.0.0 --port 8000 fast_async.app:app
\ No newline at end of file
+exec poetry run python -m fast_async.server --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -1,16 +1,119 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from fast_async.audit import QueryAuditMiddleware, query_auditor
+from fast_async.database import (
+    engine,
+    pool_metrics,
+    replica_engine,
+    settings,
+    warm_up_pool,
+)
+from fast_async.hashing import configured_cost, hashing_pool, use_hash_cost
+from fast_async.metrics import (
+    Gauge,
+    MetricsMiddleware,
+    monitor_loop_lag,
+    registry,
+)
 from fast_async.routers import auth, todos, users
 from fast_async.schemas import Message
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.PASSWORD_HASH_TARGET_MS:
+        use_hash_cost(await hashing_pool.run(configured_cost, settings))
+    if settings.DATABASE_POOL_WARMUP:
+        await warm_up_pool(engine, settings.DATABASE_POOL_SIZE)
+        if replica_engine:
+            await warm_up_pool(replica_engine, settings.DATABASE_POOL_SIZE)
+    if settings.METRICS_ENABLED:
+        lag_monitor = asyncio.create_task(
+            monitor_loop_lag(settings.METRICS_LOOP_LAG_INTERVAL_SECONDS)
+        )
+
+    yield
+
+    if settings.METRICS_ENABLED:
+        lag_monitor.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await lag_monitor
+    await query_auditor.drain()
+    await engine.dispose()
+    if replica_engine:
+        await replica_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(todos.router)
 
+if settings.QUERY_AUDIT_ENABLED:
+    app.add_middleware(QueryAuditMiddleware, auditor=query_auditor)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    for name, help, read, kind in (
+        (
+            'db_pool_checked_out',
+            'Connections checked out of the primary pool.',
+            lambda: pool_metrics.snapshot()['checked_out'],
+            'gauge',
+        ),
+        (
+            'db_pool_overflow',
+            'Connections open beyond the primary pool size.',
+            lambda: pool_metrics.snapshot()['overflow'],
+            'gauge',
+        ),
+        (
+            'db_pool_connects_total',
+            'Connections opened by the primary pool.',
+            lambda: pool_metrics.connects,
+            'counter',
+        ),
+        (
+            'db_slow_queries_total',
+            'Statements slower than QUERY_AUDIT_SLOW_MS.',
+            lambda: query_auditor.slow,
+            'counter',
+        ),
+        (
+            'db_n_plus_one_total',
+            'Query shapes repeated within one request past the threshold.',
+            lambda: query_auditor.n_plus_one,
+            'counter',
+        ),
+        (
+            'password_hash_in_flight',
+            'Password hashes running or queued.',
+            lambda: hashing_pool.in_flight,
+            'gauge',
+        ),
+        (
+            'password_hash_rejected_total',
+            'Password hashes refused because the pool was full.',
+            lambda: hashing_pool.rejected,
+            'counter',
+        ),
+    ):
+        registry.register(Gauge(name, help, read, kind))
+
+    @app.get('/metrics', include_in_schema=False)
+    def read_metrics():
+        return PlainTextResponse(
+            registry.render(), media_type='text/plain; version=0.0.4'
+        )
+
 
 @app.get('/', status_code=HTTPStatus.OK, response_model=Message)
 def read_root():
@@ -0,0 +1,157 @@
+"""Query auditor.
+
+Statements are reduced to fingerprints: literals and placeholders become
+`?` and lists of them collapse, so `WHERE id IN (1, 2)` and
+`WHERE id IN (3)` are one query shape. A fingerprint run many times in
+one request is reported as an N+1. Statements slower than the threshold
+are logged, and a sample of the slow reads is explained with
+`EXPLAIN (ANALYZE, BUFFERS)` on a separate connection. EXPLAIN ANALYZE
+runs the query again, so only SELECTs are explained, inside a
+transaction that is rolled back.
+"""
+
+import asyncio
+import logging
+import random
+import re
+from collections import Counter
+from contextvars import Context, ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from fast_async.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+_NORMALIZE = (
+    (re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s|\$\d+'), '?'),
+    (re.compile(r'(?<![\w.])\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\s+'), ' '),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+)
+_READ = re.compile(r'^(?:SELECT|WITH)\b(?!.*\b(?:INSERT|UPDATE|DELETE)\b)')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+async def explain(engine: AsyncEngine, statement, parameters):
+    try:
+        async with engine.connect() as conn:
+            plan = await conn.exec_driver_sql(
+                f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters
+            )
+            lines = [row[0] for row in plan]
+            await conn.rollback()
+    except Exception:
+        logger.warning('EXPLAIN failed', exc_info=True)
+        return
+    logger.warning('Plan for %s\n%s', fingerprint(statement), '\n'.join(lines))
+
+
+class QueryAuditor:
+    def __init__(self, config: Settings = settings):
+        self.config = config
+        self.n_plus_one = 0
+        self.slow = 0
+        self._requests: ContextVar[Counter | None] = ContextVar(
+            'audited_request', default=None
+        )
+        self._explains = set()
+
+    def instrument(self, engine: AsyncEngine):
+        def before(conn, *args):
+            conn.info.setdefault('audit_start', []).append(perf_counter())
+
+        def after(conn, cursor, statement, parameters, *args):
+            elapsed = perf_counter() - conn.info['audit_start'].pop()
+            _context, executemany = args
+            # Plans are only taken for single executions.
+            self.record(
+                engine, statement, None if executemany else parameters, elapsed
+            )
+
+        def on_error(context):
+            if context.connection is not None:
+                starts = context.connection.info.get('audit_start')
+                if starts:
+                    starts.pop()
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', before)
+        event.listen(engine.sync_engine, 'after_cursor_execute', after)
+        event.listen(engine.sync_engine, 'handle_error', on_error)
+
+    def record(self, engine, statement, parameters, elapsed):
+        if statement.startswith('EXPLAIN'):
+            return
+        shape = fingerprint(statement)
+        seen = self._requests.get()
+        if seen is not None:
+            seen[shape] += 1
+
+        if elapsed * 1000 < self.config.QUERY_AUDIT_SLOW_MS:
+            return
+        self.slow += 1
+        logger.warning('Slow query (%.1fms): %s', elapsed * 1000, shape)
+
+        if (
+            _READ.match(shape)
+            and random.random() < self.config.QUERY_AUDIT_EXPLAIN_SAMPLE_RATE
+        ):
+            # A fresh context keeps the EXPLAIN out of the request's
+            # fingerprints.
+            task = asyncio.get_running_loop().create_task(
+                explain(engine, statement, parameters),
+                context=Context(),
+            )
+            self._explains.add(task)
+            task.add_done_callback(self._explains.discard)
+
+    async def drain(self):
+        await asyncio.gather(*self._explains)
+
+    def start_request(self):
+        return self._requests.set(Counter())
+
+    def finish_request(self, token, route: str):
+        seen = self._requests.get()
+        self._requests.reset(token)
+
+        for shape, count in seen.items():
+            if count >= self.config.QUERY_AUDIT_N_PLUS_ONE_THRESHOLD:
+                self.n_plus_one += 1
+                logger.warning(
+                    'Possible N+1 on %s: %d x %s', route, count, shape
+                )
+
+
+class QueryAuditMiddleware:
+    def __init__(self, app, auditor: QueryAuditor):
+        self.app = app
+        self.auditor = auditor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        token = self.auditor.start_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = getattr(scope.get('route'), 'path', scope['path'])
+            self.auditor.finish_request(token, route)
+
+
+query_auditor = QueryAuditor()
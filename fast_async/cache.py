@@ -0,0 +1,438 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from functools import cache
+from time import monotonic
+from urllib.parse import unquote, urlsplit
+from uuid import uuid4
+
+from fast_async.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float, timer=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._timer = timer
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+
+        if item is None or item[0] <= self._timer():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = self._timer() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class CacheError(Exception):
+    pass
+
+
+class MemoryBackend:
+    """Cache backend private to the current process."""
+
+    def __init__(self, maxsize: int, timer=monotonic):
+        self._lru = LRUCache(maxsize=maxsize, ttl=0, timer=timer)
+
+    async def get_many(self, keys: list[str]):
+        return [self._lru.get(key) for key in keys]
+
+    async def set_many(self, items: dict, ttl: float):
+        for key, value in items.items():
+            self._lru.set(key, value, ttl)
+
+    async def add(self, key: str, value, ttl: float):
+        if self._lru.get(key) is not None:
+            return False
+        self._lru.set(key, value, ttl)
+        return True
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._lru.invalidate(key)
+
+    def clear(self):
+        self._lru.clear()
+
+
+class RedisBackend:
+    """Cache backend shared by every process talking to one Redis server.
+
+    Speaks RESP directly over asyncio streams. Values are stored as JSON
+    and every batch of commands is written in a single pipeline. At most
+    `max_connections` are open at once; callers past that wait for one,
+    within `timeout`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = 10,
+        timeout: float = 0.5,
+    ):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+        # A forked worker must not share the parent's sockets.
+        os.register_at_fork(after_in_child=self._reset)
+
+    async def get_many(self, keys: list[str]):
+        replies = await self.execute([('GET', key) for key in keys])
+        return [None if r is None else json.loads(r) for r in replies]
+
+    async def set_many(self, items: dict, ttl: float):
+        px = str(max(int(ttl * 1000), 1))
+        await self.execute([
+            ('SET', key, json.dumps(value), 'PX', px)
+            for key, value in items.items()
+        ])
+
+    async def add(self, key: str, value, ttl: float):
+        px = str(max(int(ttl * 1000), 1))
+        (reply,) = await self.execute([
+            ('SET', key, json.dumps(value), 'PX', px, 'NX')
+        ])
+        return reply is not None
+
+    async def delete(self, *keys: str):
+        await self.execute([('DEL', *keys)])
+
+    async def execute(self, commands: list[tuple]):
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._slots.acquire()
+        except TimeoutError as exc:
+            raise CacheError('No free connection') from exc
+
+        try:
+            return await self._execute(commands)
+        finally:
+            self._slots.release()
+
+    async def _execute(self, commands: list[tuple]):
+        connection = await self._acquire()
+        try:
+            async with asyncio.timeout(self.timeout):
+                replies = await _pipeline(*connection, commands)
+        except (OSError, EOFError) as exc:
+            connection[1].close()
+            raise CacheError(str(exc) or type(exc).__name__) from exc
+        except BaseException:
+            connection[1].close()
+            raise
+
+        self._release(connection)
+
+        for reply in replies:
+            if isinstance(reply, CacheError):
+                raise reply
+        return replies
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    def clear(self):
+        """Keep the entries: every worker shares them, so they are left to
+        expire rather than flushed under the others."""
+
+    def _reset(self):
+        self._idle.clear()
+        self._slots = asyncio.Semaphore(self.max_connections)
+
+    async def _acquire(self):
+        if self._idle:
+            return self._idle.pop()
+
+        try:
+            async with asyncio.timeout(self.timeout):
+                return await self._connect()
+        except (OSError, EOFError) as exc:
+            raise CacheError(str(exc) or type(exc).__name__) from exc
+
+    async def _connect(self):
+        connection = await asyncio.open_connection(self.host, self.port)
+
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', str(self.db)))
+        if setup:
+            await _pipeline(*connection, setup)
+
+        return connection
+
+    def _release(self, connection):
+        self._idle.append(connection)
+
+
+async def _pipeline(reader, writer, commands):
+    buffer = bytearray()
+    for command in commands:
+        buffer += b'*%d\r\n' % len(command)
+        for arg in command:
+            data = arg.encode() if isinstance(arg, str) else arg
+            buffer += b'$%d\r\n%s\r\n' % (len(data), data)
+    writer.write(buffer)
+    await writer.drain()
+
+    return [await _read_reply(reader) for _ in commands]
+
+
+async def _read_reply(reader):
+    line = await reader.readline()
+    if not line:
+        raise CacheError('Connection closed by server')
+
+    kind, payload = line[:1], line[1:-2]
+    if kind in _SIMPLE_REPLIES:
+        return _SIMPLE_REPLIES[kind](payload)
+    if kind not in {b'$', b'*'}:
+        raise CacheError(f'Unexpected reply: {line!r}')
+
+    size = int(payload)
+    if size < 0:
+        return None
+    if kind == b'$':
+        return (await reader.readexactly(size + 2))[:-2].decode()
+    return [await _read_reply(reader) for _ in range(size)]
+
+
+_SIMPLE_REPLIES = {
+    b'+': bytes.decode,
+    b'-': lambda payload: CacheError(payload.decode()),
+    b':': int,
+}
+
+
+# Tells the callers waiting on a cancelled load to load themselves.
+_RELOAD = object()
+
+
+class Cache:
+    """Namespaced cache on top of a backend.
+
+    Entries are stored wrapped in a list: `[value]` for a hit and `[]`
+    for a cached miss. Backend failures are logged and treated as misses,
+    so the cache can only make a request slower, never fail it.
+    """
+
+    def __init__(
+        self,
+        backend,
+        namespace: str,
+        ttl: float,
+        negative_ttl: float = 0,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}
+
+    def _key(self, key):
+        return f'{self.namespace}:{key}'
+
+    async def _entries(self, keys: list):
+        try:
+            return await self.backend.get_many([self._key(k) for k in keys])
+        except CacheError:
+            logger.warning('cache get failed', exc_info=True)
+            return [None] * len(keys)
+
+    async def get(self, key, default=None):
+        return (await self.get_many([key])).get(key, default)
+
+    async def get_many(self, keys: list):
+        found = {}
+        for key, entry in zip(keys, await self._entries(keys)):
+            if entry:
+                self.hits += 1
+                found[key] = entry[0]
+            else:
+                self.misses += 1
+        return found
+
+    async def set(self, key, value, ttl: float | None = None):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: dict, ttl: float | None = None):
+        await self._store(
+            {self._key(k): [v] for k, v in items.items()},
+            self.ttl if ttl is None else ttl,
+        )
+
+    async def add(self, key, value, ttl: float | None = None):
+        try:
+            return await self.backend.add(
+                self._key(key), [value], self.ttl if ttl is None else ttl
+            )
+        except CacheError:
+            logger.warning('cache add failed', exc_info=True)
+            return False
+
+    async def invalidate(self, *keys):
+        try:
+            await self.backend.delete(*(self._key(k) for k in keys))
+        except CacheError:
+            logger.warning('cache delete failed', exc_info=True)
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for `key`, calling `loader` on a miss.
+
+        Concurrent misses for the same key in this process share a single
+        call to `loader`. A `None` result is cached for `negative_ttl`.
+        If the caller running `loader` is cancelled, e.g. because its
+        client went away, the others are not: one of them loads instead.
+        """
+        (entry,) = await self._entries([key])
+        if entry is not None:
+            self.hits += 1
+            return entry[0] if entry else None
+
+        self.misses += 1
+        while (inflight := self._inflight.get(key)) is not None:
+            value = await asyncio.shield(inflight)
+            if value is not _RELOAD:
+                return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.set_result(_RELOAD)
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(value)
+        if value is not None:
+            await self._store({self._key(key): [value]}, self.ttl)
+        elif self.negative_ttl:
+            await self._store({self._key(key): []}, self.negative_ttl)
+        return value
+
+    async def _store(self, items: dict, ttl: float):
+        try:
+            await self.backend.set_many(items, ttl)
+        except CacheError:
+            logger.warning('cache set failed', exc_info=True)
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class VersionMap:
+    """Opaque per-key versions, e.g. for ETags.
+
+    A version is a random token rather than a counter, so losing one to
+    eviction or a restart only causes a miss: an old token never comes
+    back for different data.
+    """
+
+    def __init__(self, cache: Cache):
+        self._cache = cache
+
+    async def get(self, key) -> str:
+        version = await self._cache.get(key)
+        if version is None:
+            version = uuid4().hex[:16]
+            if not await self._cache.add(key, version):
+                version = await self._cache.get(key, version)
+        return version
+
+    async def bump(self, key):
+        """Give `key` a new version.
+
+        Unlike `Cache.set`, a failure here is not just a miss: readers
+        would keep validating against the old version. If the write
+        fails the key is deleted instead, so the next `get` starts a new
+        version, and the error is raised if that fails twice as well.
+        """
+        cache = self._cache
+        try:
+            await cache.backend.set_many(
+                {cache._key(key): [uuid4().hex[:16]]}, cache.ttl
+            )
+            return
+        except CacheError:
+            logger.warning('version bump failed', exc_info=True)
+
+        try:
+            await cache.backend.delete(cache._key(key))
+        except CacheError:
+            logger.warning('version delete failed, retrying', exc_info=True)
+            await cache.backend.delete(cache._key(key))
+
+    def clear(self):
+        self._cache.clear()
+
+
+@cache
+def redis_backend(url: str):
+    return RedisBackend(
+        url,
+        max_connections=settings.CACHE_MAX_CONNECTIONS,
+        timeout=settings.CACHE_TIMEOUT_SECONDS,
+    )
+
+
+def build_cache(
+    namespace: str,
+    maxsize: int,
+    ttl: float,
+    negative_ttl: float = 0,
+    url: str | None = settings.CACHE_URL,
+):
+    """In-process cache of `maxsize` entries, or the shared Redis cache
+    when `url` (`CACHE_URL` by default) is set."""
+    backend = MemoryBackend(maxsize) if url is None else redis_backend(url)
+    return Cache(backend, namespace, ttl, negative_ttl)
@@ -1,10 +1,253 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import os
+from contextlib import AsyncExitStack
+from time import perf_counter
 
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.util import await_only
+
+from fast_async.audit import query_auditor
+from fast_async.cache import Cache, build_cache
+from fast_async.metrics import instrument_engine, observe_pool_wait
 from fast_async.settings import Settings
 
-engine = create_async_engine(Settings().DATABASE_URL)
+settings = Settings()
+
+
+class PoolMetrics:
+    def __init__(self, engine: AsyncEngine):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self._pool = engine.sync_engine.pool
+
+        event.listen(engine.sync_engine, 'connect', self._on_connect)
+        event.listen(engine.sync_engine, 'checkout', self._on_checkout)
+        event.listen(engine.sync_engine, 'checkin', self._on_checkin)
+
+    def _on_connect(self, *args):
+        self.connects += 1
+
+    def _on_checkout(self, *args):
+        self.checkouts += 1
+
+    def _on_checkin(self, *args):
+        self.checkins += 1
+
+    def snapshot(self):
+        return {
+            'size': self._pool.size(),
+            'checked_out': self._pool.checkedout(),
+            'checked_in': self._pool.checkedin(),
+            'overflow': max(self._pool.overflow(), 0),
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Includes waiting for a free connection, opening a new one and the
+    # pre-ping, all of which a request waits on before its first query.
+    def connect(self):
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            observe_pool_wait(perf_counter() - start)
+
+
+def build_engine(url, config: Settings = settings):
+    connect_args = {}
+    if config.DATABASE_STATEMENT_TIMEOUT_MS:
+        connect_args['options'] = (
+            f'-c statement_timeout={config.DATABASE_STATEMENT_TIMEOUT_MS}'
+        )
+
+    engine = create_async_engine(
+        url,
+        pool_size=config.DATABASE_POOL_SIZE,
+        max_overflow=config.DATABASE_MAX_OVERFLOW,
+        pool_timeout=config.DATABASE_POOL_TIMEOUT,
+        pool_recycle=config.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=config.DATABASE_POOL_PRE_PING,
+        poolclass=(
+            TimedQueuePool if config.METRICS_ENABLED else AsyncAdaptedQueuePool
+        ),
+        connect_args=connect_args,
+    )
+    if config.METRICS_ENABLED:
+        instrument_engine(engine)
+    if config.QUERY_AUDIT_ENABLED:
+        query_auditor.instrument(engine)
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def set_prepared_statement_cache(dbapi_connection, connection_record):
+        dbapi_connection.driver_connection.prepared_max = (
+            config.DATABASE_PREPARED_STATEMENT_CACHE_SIZE
+        )
+
+    return engine
+
+
+async def warm_up_pool(engine: AsyncEngine, connections: int):
+    # Hold all connections at once so the pool really opens `connections`
+    # of them instead of reusing the first one.
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            await stack.enter_async_context(engine.connect())
+
+
+class ReadYourWrites:
+    # Principals that wrote recently read from the primary until the
+    # window closes or, when LSN checks are on, the replica has replayed
+    # past the primary's WAL position at commit time. Pins live in the
+    # shared CACHE_URL store when it is set, so the follow-up read can
+    # land on any worker. Both methods are called from session events,
+    # i.e. inside the greenlet of an AsyncSession.
+    def __init__(self, window: float, cache: Cache | None = None):
+        self.window = window
+        self._pins = cache or build_cache(
+            'replica-pin',
+            maxsize=settings.DATABASE_REPLICA_PIN_CACHE_SIZE,
+            ttl=window,
+        )
+
+    def mark(self, principals, lsn: str | None = None):
+        if self.window > 0:
+            await_only(self._pins.set_many(dict.fromkeys(principals, lsn)))
+
+    def pinned(self, principals, replica_caught_up=None):
+        if self.window <= 0 or not principals:
+            return False
+
+        pins = await_only(self._pins.get_many(list(principals)))
+        for principal, lsn in pins.items():
+            if lsn and replica_caught_up and replica_caught_up(lsn):
+                await_only(self._pins.invalidate(principal))
+                continue
+
+            return True
+
+        return False
+
+
+class RoutingSession(Session):
+    def __init__(
+        self,
+        *args,
+        primary: AsyncEngine,
+        replica: AsyncEngine | None = None,
+        read_your_writes: ReadYourWrites | None = None,
+        lsn_check: bool = False,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.primary = primary.sync_engine
+        self.replica = replica.sync_engine if replica else None
+        self.read_your_writes = read_your_writes
+        self.lsn_check = lsn_check
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['wrote'] = True
+            return self.primary
+
+        if (
+            self.replica is None
+            or not self.info.get('read_only')
+            or self.info.get('wrote')
+            or (
+                self.read_your_writes is not None
+                and self.read_your_writes.pinned(
+                    self.info.get('principals', ()),
+                    self._replica_caught_up if self.lsn_check else None,
+                )
+            )
+        ):
+            return self.primary
+
+        return self.replica
+
+    def _replica_caught_up(self, lsn: str):
+        with self.replica.connect() as conn:
+            # NULL means the "replica" is not in recovery, i.e. it is the
+            # primary itself.
+            replayed = conn.scalar(
+                text(
+                    'SELECT coalesce('
+                    'pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), true)'
+                ),
+                {'lsn': lsn},
+            )
+        return bool(replayed)
+
+    def _primary_lsn(self):
+        with self.primary.connect() as conn:
+            return conn.scalar(text('SELECT pg_current_wal_lsn()::text'))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_writers_to_primary(session: RoutingSession):
+    if not session.info.pop('wrote', False):
+        return
+
+    principals = session.info.get('principals')
+    if (
+        principals
+        and session.replica is not None
+        and session.read_your_writes is not None
+    ):
+        lsn = session._primary_lsn() if session.lsn_check else None
+        session.read_your_writes.mark(principals, lsn)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_writes(session: RoutingSession):
+    session.info.pop('wrote', None)
+
+
+def track_principal(session: AsyncSession, principal: str):
+    session.info.setdefault('principals', set()).add(principal)
+
+
+engine = build_engine(settings.DATABASE_URL)
+pool_metrics = PoolMetrics(engine)
+replica_engine = (
+    build_engine(settings.DATABASE_REPLICA_URL)
+    if settings.DATABASE_REPLICA_URL
+    else None
+)
+read_your_writes = ReadYourWrites(settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def dispose_after_fork():
+    # Connections inherited from the parent belong to its sockets; the
+    # child drops them without closing so the parent keeps working.
+    for pool_engine in (engine, replica_engine):
+        if pool_engine is not None:
+            pool_engine.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_after_fork)
 
 
-async def get_session():  # pragma: no cover
-    async with AsyncSession(engine, expire_on_commit=False) as session:
+async def get_session(request: Request):  # pragma: no cover
+    async with AsyncSession(
+        expire_on_commit=False,
+        sync_session_class=RoutingSession,
+        primary=engine,
+        replica=replica_engine,
+        read_your_writes=read_your_writes,
+        lsn_check=settings.DATABASE_REPLICA_LSN_CHECK,
+        info={'read_only': request.method in {'GET', 'HEAD'}},
+    ) as session:
         yield session
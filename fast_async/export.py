@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_async.models import Todo
+from fast_async.settings import Settings
+
+settings = Settings()
+
+EXPORT_COLUMNS = (
+    Todo.id,
+    Todo.title,
+    Todo.description,
+    Todo.state,
+    Todo.created_at,
+    Todo.updated_at,
+)
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _ndjson(partition, header):
+    return ''.join(
+        json.dumps(dict(zip(header, row)), default=datetime.isoformat) + '\n'
+        for row in partition
+    )
+
+
+def _csv(partition, header):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(partition)
+    return buffer.getvalue()
+
+
+async def export_todos(session: AsyncSession, user_id: int, fmt: str):
+    header = [column.key for column in EXPORT_COLUMNS]
+    encode = _ndjson if fmt == 'ndjson' else _csv
+
+    try:
+        if fmt == 'csv':
+            yield ','.join(header) + '\r\n'
+
+        # stream() runs on a server-side cursor, so only one partition of
+        # rows is held in memory at a time.
+        result = await session.stream(
+            select(*EXPORT_COLUMNS)
+            .where(Todo.user_id == user_id)
+            .order_by(Todo.id)
+            .execution_options(yield_per=settings.EXPORT_CHUNK_SIZE)
+        )
+        async for partition in result.partitions():
+            yield encode(partition, header)
+    finally:
+        # The response body is produced after the request's dependencies
+        # have exited, so the stream owns closing the session.
+        await session.close()
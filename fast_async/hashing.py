@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from http import HTTPStatus
+from time import perf_counter
+
+from argon2 import extract_parameters
+from argon2.exceptions import InvalidHashError
+from fastapi import HTTPException
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from fast_async.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HashCost:
+    time_cost: int
+    memory_cost: int  # KiB
+    parallelism: int
+
+
+def calibrate_time_cost(
+    target_ms: float, memory_cost: int, parallelism: int, samples: int = 3
+):
+    """Largest argon2 time cost whose hash takes at most `target_ms` here.
+
+    Memory and parallelism stay as configured; each extra pass costs
+    about as much as the first, so one timed pass is enough.
+    """
+    probe = Argon2Hasher(
+        time_cost=1, memory_cost=memory_cost, parallelism=parallelism
+    )
+    timings = []
+    for _ in range(samples):
+        start = perf_counter()
+        probe.hash('calibration')
+        timings.append(perf_counter() - start)
+    return max(1, int(target_ms / 1000 / min(timings)))
+
+
+def configured_cost(config: Settings = settings) -> HashCost:
+    time_cost = config.PASSWORD_HASH_TIME_COST
+    if config.PASSWORD_HASH_TARGET_MS:
+        time_cost = calibrate_time_cost(
+            config.PASSWORD_HASH_TARGET_MS,
+            config.PASSWORD_HASH_MEMORY_COST,
+            config.PASSWORD_HASH_PARALLELISM,
+        )
+        logger.info(
+            'Calibrated argon2 time cost to %d for %.0fms',
+            time_cost,
+            config.PASSWORD_HASH_TARGET_MS,
+        )
+    return HashCost(
+        time_cost,
+        config.PASSWORD_HASH_MEMORY_COST,
+        config.PASSWORD_HASH_PARALLELISM,
+    )
+
+
+def use_hash_cost(cost: HashCost):
+    global pwd_context, hash_cost  # noqa: PLW0603
+    pwd_context = PasswordHash((Argon2Hasher(**asdict(cost)),))
+    hash_cost = cost
+
+
+pwd_context: PasswordHash
+hash_cost: HashCost
+use_hash_cost(
+    HashCost(
+        settings.PASSWORD_HASH_TIME_COST,
+        settings.PASSWORD_HASH_MEMORY_COST,
+        settings.PASSWORD_HASH_PARALLELISM,
+    )
+)
+
+
+class HashingPool:
+    # argon2-cffi releases the GIL while hashing, so a small thread pool
+    # keeps the event loop free without the cost of a process pool.
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hash'
+        )
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Server busy, try again later',
+                headers={'Retry-After': '1'},
+            )
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+
+hashing_pool = HashingPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+def get_password_hash(password: str):
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def needs_rehash(hashed_password: str):
+    # Only weaker hashes are replaced, so a calibration that lands one
+    # pass lower on a busy boot does not rehash every user.
+    try:
+        stored = extract_parameters(hashed_password)
+    except InvalidHashError:
+        return True
+    return (
+        stored.time_cost < hash_cost.time_cost
+        or stored.memory_cost < hash_cost.memory_cost
+    )
+
+
+async def get_password_hash_async(password: str):
+    return await hashing_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await hashing_pool.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def hash_if_changed_async(plain_password: str, hashed_password: str):
+    """A new hash for `plain_password`, or None when `hashed_password`
+    already holds it at the current cost."""
+    if await verify_password_async(
+        plain_password, hashed_password
+    ) and not needs_rehash(hashed_password):
+        return None
+    return await get_password_hash_async(plain_password)
@@ -0,0 +1,112 @@
+"""JWT signing keys.
+
+Keys are parsed once into key objects; PyJWT would otherwise parse a PEM
+or JWK on every `encode`/`decode`. With `JWT_KEYS_FILE` set, the ring is
+read from a JWK Set of private keys, each with `kid` and `alg`. The
+active key signs and every key in the set verifies, so keys rotate in
+three steps: add the new key, make it active once verifiers have picked
+up the public set, and remove the old one after the longest token
+lifetime. Without it, `SECRET_KEY`/`ALGORITHM` sign as before.
+
+Generate a key to add to the set with:
+
+    python -m fast_async.keys --alg EdDSA --kid 2026-10
+"""
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jwt import InvalidTokenError, PyJWK, decode, encode, get_unverified_header
+from jwt.algorithms import get_default_algorithms
+
+from fast_async.settings import Settings
+
+settings = Settings()
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str | None
+    algorithm: str
+    key: object
+    verify_key: object
+    public_jwk: dict | None = None
+
+
+class KeyRing:
+    def __init__(self, keys: list[SigningKey], active_kid: str | None):
+        self.keys = {key.kid: key for key in keys}
+        self.active = self.keys[active_kid]
+
+    @classmethod
+    def from_secret(cls, secret: str, algorithm: str):
+        key = SigningKey(None, algorithm, secret, secret)
+        return cls([key], None)
+
+    @classmethod
+    def from_jwks(cls, jwks: dict, active_kid: str | None = None):
+        keys = []
+        for jwk in jwks['keys']:
+            parsed = PyJWK(jwk)
+            public_key = parsed.key.public_key()
+            public_jwk = parsed.Algorithm.to_jwk(public_key, as_dict=True)
+            public_jwk.update(kid=jwk['kid'], alg=jwk['alg'], use='sig')
+            keys.append(
+                SigningKey(
+                    jwk['kid'], jwk['alg'], parsed.key, public_key, public_jwk
+                )
+            )
+        return cls(keys, active_kid or keys[0].kid)
+
+    def sign(self, claims: dict) -> str:
+        headers = {'kid': self.active.kid} if self.active.kid else None
+        return encode(
+            claims,
+            self.active.key,
+            algorithm=self.active.algorithm,
+            headers=headers,
+        )
+
+    def verify(self, token: str) -> dict:
+        key = self.keys.get(get_unverified_header(token).get('kid'))
+        if key is None:
+            raise InvalidTokenError('Unknown key id')
+        return decode(token, key.verify_key, algorithms=[key.algorithm])
+
+    def public_jwks(self) -> dict:
+        return {
+            'keys': [
+                key.public_jwk for key in self.keys.values() if key.public_jwk
+            ]
+        }
+
+
+def load_key_ring(config: Settings = settings) -> KeyRing:
+    if not config.JWT_KEYS_FILE:
+        return KeyRing.from_secret(config.SECRET_KEY, config.ALGORITHM)
+
+    jwks = json.loads(Path(config.JWT_KEYS_FILE).read_text(encoding='utf-8'))
+    return KeyRing.from_jwks(jwks, config.JWT_ACTIVE_KID)
+
+
+def generate_jwk(algorithm: str, kid: str) -> dict:
+    if algorithm == 'EdDSA':
+        key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == 'ES256':
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise ValueError(f'Unsupported algorithm: {algorithm}')
+
+    jwk = get_default_algorithms()[algorithm].to_jwk(key, as_dict=True)
+    return {**jwk, 'kid': kid, 'alg': algorithm}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--alg', choices=['EdDSA', 'ES256'], default='EdDSA')
+    parser.add_argument('--kid', required=True)
+    args = parser.parse_args()
+    print(json.dumps(generate_jwk(args.alg, args.kid)))
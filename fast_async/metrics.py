@@ -0,0 +1,267 @@
+"""Request metrics in the Prometheus text format.
+
+The middleware times every request by route template and, through the
+engine events, counts the SQL statements it ran and the time they and
+the pool checkouts took. A background task samples event loop lag.
+Metrics live in the process that recorded them; each pre-fork worker
+reports its own.
+"""
+
+import asyncio
+import bisect
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _labels(names, values, extra=''):
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, buckets=LATENCY_BUCKETS, labels=()
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [per-bucket counts with +Inf last, sum]
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def clear(self):
+        self._series.clear()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for values, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = _labels(self.labels, values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _labels(self.labels, values)
+            lines.extend((
+                f'{self.name}_sum{labels} {total}',
+                f'{self.name}_count{labels} {cumulative}',
+            ))
+        return lines
+
+
+class Gauge:
+    """A value read when scraped, e.g. from a pool's own counters."""
+
+    def __init__(self, name: str, help: str, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        return [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.kind}',
+            f'{self.name} {self.read()}',
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = [line for metric in self.metrics for line in metric.render()]
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            if isinstance(metric, Histogram):
+                metric.clear()
+
+
+registry = Registry()
+request_duration = registry.register(
+    Histogram(
+        'http_request_duration_seconds',
+        'Time until the response is sent, by route template.',
+        labels=('method', 'route', 'status'),
+    )
+)
+request_statements = registry.register(
+    Histogram(
+        'http_request_sql_statements',
+        'SQL statements run per request.',
+        COUNT_BUCKETS,
+        labels=('route',),
+    )
+)
+request_sql_duration = registry.register(
+    Histogram(
+        'http_request_sql_duration_seconds',
+        'Time per request spent executing SQL.',
+        labels=('route',),
+    )
+)
+request_pool_wait = registry.register(
+    Histogram(
+        'http_request_db_pool_wait_seconds',
+        'Time per request spent checking out pooled connections.',
+        labels=('route',),
+    )
+)
+statement_duration = registry.register(
+    Histogram('db_statement_duration_seconds', 'SQL statement duration.')
+)
+pool_wait = registry.register(
+    Histogram(
+        'db_pool_wait_seconds', 'Time to check a connection out of the pool.'
+    )
+)
+loop_lag = registry.register(
+    Histogram(
+        'event_loop_lag_seconds',
+        'How late the event loop ran a timer.',
+        (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    sql_seconds: float = 0
+    pool_wait_seconds: float = 0
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar(
+    'current_request', default=None
+)
+
+
+def _before_cursor_execute(conn, *args):
+    conn.info.setdefault('query_start', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, *args):
+    elapsed = perf_counter() - conn.info['query_start'].pop()
+    statement_duration.observe(elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def instrument_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
+
+
+def observe_pool_wait(seconds: float):
+    pool_wait.observe(seconds)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = perf_counter()
+        status = 500
+        done = None
+
+        async def send_and_time(message):
+            nonlocal status, done
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif not message.get('more_body'):
+                # Background tasks run after the last body message and
+                # are left out.
+                done = perf_counter() - start, replace(stats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_time)
+        finally:
+            current_request.reset(token)
+            elapsed, totals = done or (perf_counter() - start, stats)
+            route = getattr(scope.get('route'), 'path', '<unmatched>')
+            request_duration.observe(elapsed, scope['method'], route, status)
+            request_statements.observe(totals.statements, route)
+            request_sql_duration.observe(totals.sql_seconds, route)
+            request_pool_wait.observe(totals.pool_wait_seconds, route)
+
+
+async def monitor_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(loop.time() - start - interval, 0))
@@ -1,7 +1,16 @@
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import (
+    DDL,
+    Computed,
+    FetchedValue,
+    ForeignKey,
+    Index,
+    event,
+    func,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import (
     Mapped,
     mapped_column,
@@ -11,6 +20,15 @@ from sqlalchemy.orm import (
 
 table_registry = registry()
 
+# Substring filters on todos are served by pg_trgm GIN indexes.
+event.listen(
+    table_registry.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'),
+)
+
+SEARCH_CONFIG = 'simple'
+
 
 class TodoState(str, Enum):
     draft = 'draft'  # rascunho
@@ -34,22 +52,49 @@ class User:
     updated_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now(), onupdate=func.now()
     )
+    # Bumped to revoke every access token issued to the user so far.
+    token_version: Mapped[int] = mapped_column(
+        init=False, default=0, server_default='0'
+    )
     todos: Mapped[list['Todo']] = relationship(
         init=False,
         cascade='all, delete-orphan',
-        lazy='selectin',
+        lazy='raise',
+        passive_deletes=True,
     )
 
 
 @table_registry.mapped_as_dataclass
 class Todo:
     __tablename__ = 'todos'
+    __table_args__ = (
+        Index('ix_todos_user_id_state', 'user_id', 'state'),
+        Index('ix_todos_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_todos_user_id_id', 'user_id', 'id'),
+        Index(
+            'ix_todos_title_trgm',
+            'title',
+            postgresql_using='gin',
+            postgresql_ops={'title': 'gin_trgm_ops'},
+        ),
+        Index(
+            'ix_todos_description_trgm',
+            'description',
+            postgresql_using='gin',
+            postgresql_ops={'description': 'gin_trgm_ops'},
+        ),
+        Index(
+            'ix_todos_search_vector', 'search_vector', postgresql_using='gin'
+        ),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     title: Mapped[str]
     description: Mapped[str]
     state: Mapped[TodoState]
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE')
+    )
 
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
@@ -57,3 +102,138 @@ class Todo:
     updated_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now(), onupdate=func.now()
     )
+    # Set by the todos_done_at trigger when the state becomes done.
+    done_at: Mapped[datetime | None] = mapped_column(
+        init=False,
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+    )
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{SEARCH_CONFIG}', title || ' ' || description)",
+            persisted=True,
+        ),
+        init=False,
+        deferred=True,
+        repr=False,
+    )
+
+
+@table_registry.mapped_as_dataclass
+class TodoStateCount:
+    __tablename__ = 'todo_state_counts'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
+    )
+    state: Mapped[TodoState] = mapped_column(primary_key=True)
+    todos: Mapped[int]
+
+
+@table_registry.mapped_as_dataclass
+class TodoDailyCount:
+    __tablename__ = 'todo_daily_counts'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(primary_key=True)
+    created: Mapped[int]
+    done: Mapped[int]
+
+
+# The counters are kept by triggers on todos, so every write path,
+# including bulk ones, updates them in the same statement. Statement
+# triggers see all changed rows at once and upsert one row per key;
+# updates that leave state and days alone add nothing. Counts for a user
+# being deleted are skipped, since the cascade removes them anyway.
+TODO_COUNTER_DDL = (
+    """
+    CREATE FUNCTION set_todo_done_at() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NEW.state <> 'done' THEN
+            NEW.done_at := NULL;
+        ELSIF TG_OP = 'INSERT' THEN
+            NEW.done_at := coalesce(NEW.done_at, now());
+        ELSIF OLD.state <> 'done' THEN
+            NEW.done_at := now();
+        END IF;
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER todos_done_at
+    BEFORE INSERT OR UPDATE OF state ON todos
+    FOR EACH ROW EXECUTE FUNCTION set_todo_done_at()
+    """,
+    """
+    CREATE FUNCTION count_todo_changes() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        added text := 'SELECT user_id, state, created_at, done_at, 1 AS n
+            FROM new_rows';
+        removed text := 'SELECT user_id, state, created_at, done_at, -1 AS n
+            FROM old_rows';
+    BEGIN
+        EXECUTE 'WITH changes AS (' || CASE TG_OP
+            WHEN 'INSERT' THEN added
+            WHEN 'DELETE' THEN removed
+            ELSE added || ' UNION ALL ' || removed
+        END || ')' || $sql$,
+        states AS (
+            INSERT INTO todo_state_counts AS c (user_id, state, todos)
+            SELECT user_id, state, todos FROM (
+                SELECT user_id, state, sum(n) AS todos
+                FROM changes GROUP BY user_id, state
+            ) AS s
+            WHERE todos <> 0
+            AND EXISTS (SELECT FROM users WHERE id = s.user_id)
+            ORDER BY user_id, state
+            ON CONFLICT (user_id, state)
+            DO UPDATE SET todos = c.todos + excluded.todos
+        )
+        INSERT INTO todo_daily_counts AS c (user_id, day, created, done)
+        SELECT user_id, day, created, done FROM (
+            SELECT user_id, day, sum(created) AS created, sum(done) AS done
+            FROM (
+                SELECT user_id, created_at::date AS day, n AS created,
+                0 AS done FROM changes
+                UNION ALL
+                SELECT user_id, done_at::date, 0, n
+                FROM changes WHERE done_at IS NOT NULL
+            ) AS days
+            GROUP BY user_id, day
+        ) AS d
+        WHERE (created <> 0 OR done <> 0)
+        AND EXISTS (SELECT FROM users WHERE id = d.user_id)
+        ORDER BY user_id, day
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            created = c.created + excluded.created,
+            done = c.done + excluded.done
+        $sql$;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER todos_count_inserts
+    AFTER INSERT ON todos REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_todo_changes()
+    """,
+    """
+    CREATE TRIGGER todos_count_updates
+    AFTER UPDATE ON todos
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_todo_changes()
+    """,
+    """
+    CREATE TRIGGER todos_count_deletes
+    AFTER DELETE ON todos REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_todo_changes()
+    """,
+)
+for statement in TODO_COUNTER_DDL:
+    event.listen(table_registry.metadata, 'after_create', DDL(statement))
@@ -0,0 +1,75 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, Integer, SmallInteger, tuple_
+
+from fast_async.schemas import FilterPage
+
+# Most specific first: BigInteger and SmallInteger are Integers too.
+INTEGER_BITS = ((BigInteger, 64), (SmallInteger, 16), (Integer, 32))
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=datetime.isoformat).encode()
+    return urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+
+        return [
+            _decode_value(column.type, value)
+            for column, value in zip(columns, values)
+        ]
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail='Invalid cursor',
+        )
+
+
+def _decode_value(column_type, value):
+    if column_type.python_type is datetime:
+        return datetime.fromisoformat(value)
+
+    value = column_type.python_type(value)
+    if isinstance(column_type, Integer):
+        # Out of range for the column, Postgres would fail the query.
+        bits = next(
+            bits
+            for kind, bits in INTEGER_BITS
+            if isinstance(column_type, kind)
+        )
+        if not -(2 ** (bits - 1)) <= value < 2 ** (bits - 1):
+            raise ValueError(value)
+    return value
+
+
+def paginate(query, page: FilterPage, *columns):
+    query = query.order_by(*columns)
+
+    if page.cursor:
+        values = decode_cursor(page.cursor, columns)
+        query = query.where(tuple_(*columns) > tuple_(*values))
+    else:
+        query = query.offset(page.offset)
+
+    # One extra row tells us whether there is a next page.
+    return query.limit(page.limit + 1)
+
+
+def next_page(rows: list, page: FilterPage, *columns):
+    if len(rows) <= page.limit or not page.limit or not columns:
+        return rows[: page.limit], None
+
+    rows = rows[: page.limit]
+    return rows, encode_cursor([
+        getattr(rows[-1], column.key) for column in columns
+    ])
@@ -0,0 +1,247 @@
+"""Login rate limiting.
+
+Every attempt takes a token from a bucket for the client IP and one for
+the account. An account with too many failed attempts inside a sliding
+window is locked until enough of them age out. All of it is decided
+before the user lookup and the password hash, so rejected attempts cost
+neither database nor CPU time.
+"""
+
+import hashlib
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+
+from fast_async.cache import CacheError, LRUCache, redis_backend
+from fast_async.settings import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Bucket:
+    key: str
+    rate: float  # tokens per second
+    burst: int
+
+
+class MemoryLimitStore:
+    def __init__(self, maxsize: int, timer=time.monotonic):
+        self._timer = timer
+        self._buckets = LRUCache(maxsize=maxsize, ttl=0, timer=timer)
+        self._failures = LRUCache(maxsize=maxsize, ttl=0, timer=timer)
+
+    async def check(self, buckets: list[Bucket], failures_key, limit, window):
+        now = self._timer()
+        retry_after = 0
+
+        failures = self._recent_failures(failures_key, window, now)
+        if len(failures) >= limit:
+            retry_after = failures[-limit] + window - now
+
+        tokens = []
+        for bucket in buckets:
+            level, updated_at = self._buckets.get(
+                bucket.key, (bucket.burst, now)
+            )
+            level = min(bucket.burst, level + (now - updated_at) * bucket.rate)
+            if level < 1:
+                retry_after = max(retry_after, (1 - level) / bucket.rate)
+            tokens.append(level)
+
+        # A rejected attempt takes nothing, so it cannot drain the other
+        # bucket.
+        taken = 1 if retry_after <= 0 else 0
+        for bucket, level in zip(buckets, tokens):
+            self._buckets.set(
+                bucket.key, (level - taken, now), bucket.burst / bucket.rate
+            )
+
+        return retry_after
+
+    def _recent_failures(self, key, window, now):
+        failures = self._failures.get(key, deque())
+        while failures and failures[0] <= now - window:
+            failures.popleft()
+        return failures
+
+    async def record_failure(self, key, window):
+        now = self._timer()
+        failures = self._recent_failures(key, window, now)
+        failures.append(now)
+        self._failures.set(key, failures, window)
+
+    async def reset(self, key):
+        self._failures.invalidate(key)
+
+    def clear(self):
+        self._buckets.clear()
+        self._failures.clear()
+
+
+# KEYS: the buckets, then the failures sorted set. ARGV: lockout limit and
+# window, then rate and burst of each bucket. Timestamps come from the
+# server clock so every worker agrees on them.
+CHECK_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1e6
+local limit, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local failures = KEYS[#KEYS]
+local retry_after = 0
+
+redis.call('ZREMRANGEBYSCORE', failures, '-inf', now - window)
+if redis.call('ZCARD', failures) >= limit then
+  local oldest = redis.call('ZRANGE', failures, -limit, -limit, 'WITHSCORES')
+  retry_after = tonumber(oldest[2]) + window - now
+end
+
+local tokens = {}
+for i = 1, #KEYS - 1 do
+  local rate, burst = tonumber(ARGV[2 * i + 1]), tonumber(ARGV[2 * i + 2])
+  local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local level = tonumber(state[1]) or burst
+  local updated_at = tonumber(state[2]) or now
+  level = math.min(burst, level + math.max(0, now - updated_at) * rate)
+  if level < 1 then
+    retry_after = math.max(retry_after, (1 - level) / rate)
+  end
+  tokens[i] = level
+end
+
+local taken = retry_after > 0 and 0 or 1
+for i = 1, #KEYS - 1 do
+  local rate, burst = tonumber(ARGV[2 * i + 1]), tonumber(ARGV[2 * i + 2])
+  redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i] - taken),
+             'ts', tostring(now))
+  redis.call('PEXPIRE', KEYS[i], math.ceil(burst / rate * 1000))
+end
+return tostring(retry_after)
+"""
+
+# KEYS: the failures sorted set. ARGV: window, a unique member.
+RECORD_FAILURE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1e6
+redis.call('ZADD', KEYS[1], string.format('%.6f', now), ARGV[2])
+redis.call('PEXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1]) * 1000))
+return 1
+"""
+
+# Scripts are sent by digest; the server only needs the body once.
+SCRIPT_SHAS = {
+    script: hashlib.sha1(script.encode()).hexdigest()
+    for script in (CHECK_SCRIPT, RECORD_FAILURE_SCRIPT)
+}
+
+
+class RedisLimitStore:
+    """Limits shared by every worker, each check one atomic script.
+    Failures are a sorted set of timestamps."""
+
+    def __init__(self, backend, namespace='login'):
+        self.backend = backend
+        self.namespace = namespace
+
+    def _key(self, key):
+        return f'{self.namespace}:{key}'
+
+    async def check(self, buckets: list[Bucket], failures_key, limit, window):
+        keys = [self._key(bucket.key) for bucket in buckets]
+        args = [str(limit), str(window)]
+        for bucket in buckets:
+            args += [str(bucket.rate), str(bucket.burst)]
+
+        retry_after = await self._eval(
+            CHECK_SCRIPT,
+            str(len(keys) + 1),
+            *keys,
+            self._key(failures_key),
+            *args,
+        )
+        return float(retry_after)
+
+    async def record_failure(self, key, window):
+        await self._eval(
+            RECORD_FAILURE_SCRIPT,
+            '1',
+            self._key(key),
+            str(window),
+            uuid.uuid4().hex,
+        )
+
+    async def reset(self, key):
+        await self.backend.delete(self._key(key))
+
+    async def _eval(self, script, *args):
+        try:
+            (reply,) = await self.backend.execute([
+                ('EVALSHA', SCRIPT_SHAS[script], *args)
+            ])
+        except CacheError as exc:
+            # Not loaded yet, or flushed by a restart: EVAL caches it.
+            if not str(exc).startswith('NOSCRIPT'):
+                raise
+            (reply,) = await self.backend.execute([('EVAL', script, *args)])
+        return reply
+
+
+class LoginLimiter:
+    def __init__(self, store, config: Settings = settings):
+        self.store = store
+        self.config = config
+
+    def _buckets(self, ip, account):
+        return [
+            Bucket(
+                f'ip:{ip}',
+                self.config.LOGIN_IP_RATE_PER_MINUTE / 60,
+                self.config.LOGIN_IP_BURST,
+            ),
+            Bucket(
+                f'account:{account}',
+                self.config.LOGIN_ACCOUNT_RATE_PER_MINUTE / 60,
+                self.config.LOGIN_ACCOUNT_BURST,
+            ),
+        ]
+
+    async def check(self, ip: str, account: str) -> float:
+        """Seconds until this attempt would be allowed; 0 if it is."""
+        if not self.config.LOGIN_RATE_LIMIT_ENABLED:
+            return 0
+        try:
+            return await self.store.check(
+                self._buckets(ip, account.lower()),
+                f'failures:{account.lower()}',
+                self.config.LOGIN_LOCKOUT_FAILURES,
+                self.config.LOGIN_LOCKOUT_WINDOW_SECONDS,
+            )
+        except CacheError:
+            # Fail open: the hashing pool still bounds the CPU spent.
+            logger.warning('login rate limit check failed', exc_info=True)
+            return 0
+
+    async def failed(self, account: str):
+        try:
+            await self.store.record_failure(
+                f'failures:{account.lower()}',
+                self.config.LOGIN_LOCKOUT_WINDOW_SECONDS,
+            )
+        except CacheError:
+            logger.warning('login failure not recorded', exc_info=True)
+
+    async def succeeded(self, account: str):
+        try:
+            await self.store.reset(f'failures:{account.lower()}')
+        except CacheError:
+            logger.warning('login failures not reset', exc_info=True)
+
+
+def build_login_limiter(config: Settings = settings):
+    if config.CACHE_URL is None:
+        store = MemoryLimitStore(config.LOGIN_RATE_LIMIT_MAX_KEYS)
+    else:
+        store = RedisLimitStore(redis_backend(config.CACHE_URL))
+    return LoginLimiter(store, config)
@@ -0,0 +1,29 @@
+from typing import override
+
+from pydantic_core import to_json
+from starlette.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for content the endpoint already shaped to match its
+    response model, e.g. row dicts from a column projection.
+
+    FastAPI does not validate a returned `Response`, and pydantic-core
+    encodes datetimes and enums exactly as the response model would.
+    """
+
+    @override
+    def render(self, content) -> bytes:
+        return to_json(content)
+
+
+def row_dicts(rows) -> list[dict]:
+    """Rows as dicts keyed by column label; cheaper than `Row._asdict`."""
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def render_json(content) -> str:
+    return to_json(content).decode()
@@ -1,55 +1,119 @@
+import math
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+)
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from fast_async.database import get_session
+from fast_async.hashing import (
+    get_password_hash_async,
+    needs_rehash,
+    verify_password_async,
+)
 from fast_async.models import User
+from fast_async.ratelimit import build_login_limiter
 from fast_async.schemas import Token
 from fast_async.security import (
+    Principal,
     create_access_token,
-    get_current_user,
-    verify_password,
+    get_current_principal,
+    key_ring,
+    principal_cache,
+    token_claims,
 )
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 T_Session = Annotated[AsyncSession, Depends(get_session)]
 OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentPrincipal = Annotated[User | Principal, Depends(get_current_principal)]
+
+login_limiter = build_login_limiter()
 
 
 @router.post('/token', status_code=HTTPStatus.OK, response_model=Token)
 async def login_for_access_token(
+    request: Request,
     session: T_Session,
     form_data: OAuth2Form,
+    background_tasks: BackgroundTasks,
 ):
-    user = await session.scalar(
-        select(User).where(User.email == form_data.username)
+    # Decided before the lookup and the hash, which is what an attacker
+    # would otherwise make us spend.
+    retry_after = await login_limiter.check(
+        request.client.host if request.client else '', form_data.username
     )
-
-    if not user:
+    if retry_after > 0:
         raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED,
-            detail='Incorrect email or username',
+            status_code=HTTPStatus.TOO_MANY_REQUESTS,
+            detail='Too many login attempts',
+            headers={'Retry-After': str(math.ceil(retry_after))},
+        )
+
+    user = await session.execute(
+        select(User.id, User.email, User.password, User.token_version).where(
+            User.email == form_data.username
         )
+    )
+    user = user.first()
 
-    if not verify_password(form_data.password, user.password):
+    if not user or not await verify_password_async(
+        form_data.password, user.password
+    ):
+        await login_limiter.failed(form_data.username)
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail='Incorrect email or username',
         )
-    data = {'sub': user.email}
 
-    token_access = create_access_token(data)
+    await login_limiter.succeeded(form_data.username)
+    if needs_rehash(user.password):
+        background_tasks.add_task(
+            _rehash_password, session, user, form_data.password
+        )
+    token_access = create_access_token(token_claims(user))
 
     return {'token_access': token_access, 'token_type': 'Bearer'}
 
 
+async def _rehash_password(session: AsyncSession, user, password: str):
+    try:
+        password_hash = await get_password_hash_async(password)
+    except HTTPException:
+        return  # Hashing pool busy; the next login tries again.
+
+    # The request has closed the session by now; it reopens on use and
+    # is closed again here. Matching the old hash keeps a password
+    # changed in the meantime.
+    async with session:
+        await session.execute(
+            update(User)
+            .where(User.id == user.id, User.password == user.password)
+            .values(password=password_hash)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    await principal_cache.invalidate(user.email)
+
+
 @router.post('/refresh-token', status_code=HTTPStatus.OK, response_model=Token)
-async def refresh_access_token(user: CurrentUser):
-    new_access_token = create_access_token(data={'sub': user.email})
+async def refresh_access_token(user: CurrentPrincipal):
+    new_access_token = create_access_token(token_claims(user))
 
     return {'token_access': new_access_token, 'token_type': 'Bearer'}
+
+
+@router.get('/jwks', status_code=HTTPStatus.OK)
+def read_jwks(response: Response):
+    # Public keys only, for services that verify our tokens themselves.
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return key_ring.public_jwks()
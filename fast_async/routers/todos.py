@@ -1,31 +1,88 @@
+from hashlib import sha256
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Literal
 
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
     Query,
+    Request,
+    Response,
 )
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    String,
+    delete,
+    func,
+    insert,
+    select,
+    type_coerce,
+    update,
+)
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from fast_async.cache import VersionMap, build_cache
 from fast_async.database import get_session
-from fast_async.models import Todo, User
+from fast_async.export import MEDIA_TYPES, export_todos
+from fast_async.models import (
+    Todo,
+    TodoDailyCount,
+    TodoState,
+    TodoStateCount,
+    User,
+)
+from fast_async.pagination import next_page, paginate
+from fast_async.responses import render_json, row_dicts
 from fast_async.schemas import (
+    BatchResult,
+    FilterStats,
     FilterTodo,
     Message,
+    TodoBatchCreate,
+    TodoBatchDelete,
+    TodoBatchUpdate,
     TodoList,
     TodoPublic,
     TodoSchema,
+    TodoStats,
     UpdateTodo,
 )
-from fast_async.security import get_current_user
+from fast_async.search import filter_substrings, rank_by_relevance
+from fast_async.security import Principal, get_current_principal
+from fast_async.settings import Settings
 
 T_Session = Annotated[AsyncSession, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[User | Principal, Depends(get_current_principal)]
 
 router = APIRouter(prefix='/todos', tags=['todos'])
+settings = Settings()
+# Field order of TodoPublic. The state comes back as the plain string
+# stored in the database, which encodes much faster than the enum.
+PUBLIC_COLUMNS = (
+    Todo.title,
+    Todo.description,
+    type_coerce(Todo.state, String).label('state'),
+    Todo.id,
+    Todo.created_at,
+    Todo.updated_at,
+)
+# Both live in the shared CACHE_URL store when it is set, so a bump on
+# one worker changes the ETag and page key on all of them; without it
+# the server runs a single worker.
+todo_list_versions = VersionMap(
+    build_cache(
+        'todo-list-version',
+        maxsize=settings.TODO_LIST_CACHE_SIZE,
+        ttl=settings.TODO_LIST_CACHE_TTL_SECONDS,
+    )
+)
+todo_list_pages = build_cache(
+    'todo-list-page',
+    maxsize=settings.TODO_LIST_CACHE_SIZE,
+    ttl=settings.TODO_LIST_CACHE_TTL_SECONDS,
+)
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=TodoPublic)
@@ -34,44 +91,249 @@ async def create_todo(
     session: T_Session,
     current_user: CurrentUser,
 ):
-    db_todo = Todo(
-        title=todo.title,
-        description=todo.description,
-        state=todo.state,
-        user_id=current_user.id,
+    db_todo = await session.scalar(
+        insert(Todo)
+        .values(
+            title=todo.title,
+            description=todo.description,
+            state=todo.state,
+            user_id=current_user.id,
+        )
+        .returning(Todo)
     )
-
-    session.add(db_todo)
     await session.commit()
-    await session.refresh(db_todo)
+    await todo_list_versions.bump(current_user.id)
 
     return db_todo
 
 
+def _etag_matches(etag: str, if_none_match: str | None):
+    if not if_none_match:
+        return False
+
+    candidates = {
+        tag.strip().removeprefix('W/') for tag in if_none_match.split(',')
+    }
+    return '*' in candidates or etag in candidates
+
+
 @router.get('/', status_code=HTTPStatus.OK, response_model=TodoList)
 async def list_todos(
+    request: Request,
     user: CurrentUser,
     session: T_Session,
     todo_filter: Annotated[FilterTodo, Query()],
 ):
-    query = select(Todo).where(Todo.user_id == user.id)
+    version = await todo_list_versions.get(user.id)
+    filter_key = todo_filter.model_dump_json(exclude_defaults=True)
+    digest = sha256(f'{user.id}:{version}:{filter_key}'.encode()).hexdigest()
+    headers = {'ETag': f'"{digest[:32]}"'}
 
-    if todo_filter.title:
-        query = query.filter(Todo.title.contains(todo_filter.title))
+    if _etag_matches(headers['ETag'], request.headers.get('if-none-match')):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
 
-    if todo_filter.description:
-        query = query.filter(
-            Todo.description.contains(todo_filter.description)
-        )
+    body = await todo_list_pages.get_or_load(
+        f'{user.id}:{version}:{filter_key}',
+        lambda: _render_todo_list(session, user, todo_filter),
+    )
+
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def _render_todo_list(session, user, todo_filter: FilterTodo):
+    query = select(*PUBLIC_COLUMNS).where(Todo.user_id == user.id)
+    query = filter_substrings(query, todo_filter)
 
     if todo_filter.state:
         query = query.filter(Todo.state == todo_filter.state)
 
+    # Search results come back by relevance and page with offset only.
+    order = (Todo.created_at, Todo.id)
+    if todo_filter.search:
+        query = rank_by_relevance(query, todo_filter.search)
+        order = ()
+
+    rows = await session.execute(paginate(query, todo_filter, *order))
+    rows, next_cursor = next_page(rows.all(), todo_filter, *order)
+
+    # Rows already have the TodoPublic shape; no need to validate them.
+    return render_json({
+        'todos': row_dicts(rows),
+        'next_cursor': next_cursor,
+    })
+
+
+@router.get('/export', status_code=HTTPStatus.OK)
+async def export_todos_stream(
+    user: CurrentUser,
+    session: T_Session,
+    export_format: Annotated[
+        Literal['ndjson', 'csv'], Query(alias='format')
+    ] = 'ndjson',
+):
+    return StreamingResponse(
+        export_todos(session, user.id, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename="todos.{export_format}"'
+            )
+        },
+    )
+
+
+@router.get('/stats', status_code=HTTPStatus.OK, response_model=TodoStats)
+async def todo_stats(
+    user: CurrentUser,
+    session: T_Session,
+    stats_filter: Annotated[FilterStats, Query()],
+):
+    # Read from the counters the todos triggers keep, not from todos.
+    counts = await session.execute(
+        select(TodoStateCount.state, TodoStateCount.todos).where(
+            TodoStateCount.user_id == user.id
+        )
+    )
+    daily = await session.execute(
+        select(TodoDailyCount.day, TodoDailyCount.created, TodoDailyCount.done)
+        .where(
+            TodoDailyCount.user_id == user.id,
+            TodoDailyCount.day > func.current_date() - stats_filter.days,
+            (TodoDailyCount.created != 0) | (TodoDailyCount.done != 0),
+        )
+        .order_by(TodoDailyCount.day)
+    )
+
+    return {
+        'states': {state: 0 for state in TodoState} | dict(counts.all()),
+        'daily': daily.mappings().all(),
+    }
+
+
+@router.post(
+    '/batch', status_code=HTTPStatus.CREATED, response_model=BatchResult
+)
+async def create_todos_batch(
+    batch: TodoBatchCreate,
+    session: T_Session,
+    user: CurrentUser,
+):
+    rows = [{**todo.model_dump(), 'user_id': user.id} for todo in batch.todos]
+    statement = insert(Todo).returning(Todo, sort_by_parameter_order=True)
+
+    if batch.atomic:
+        todos = (await session.scalars(statement, rows)).all()
+        await session.commit()
+        await todo_list_versions.bump(user.id)
+
+        return {
+            'results': [
+                {'index': i, 'id': t.id, 'status': 'created', 'todo': t}
+                for i, t in enumerate(todos)
+            ]
+        }
+
+    # Without atomic, each chunk gets its own savepoint so one bad chunk
+    # does not discard the rest of the import.
+    results = []
+    size = settings.TODO_BATCH_CHUNK_SIZE
+    for start in range(0, len(rows), size):
+        chunk = rows[start : start + size]
+        try:
+            async with session.begin_nested():
+                todos = (await session.scalars(statement, chunk)).all()
+        except SQLAlchemyError:
+            results += [
+                {'index': start + i, 'status': 'failed'}
+                for i in range(len(chunk))
+            ]
+            continue
+
+        results += [
+            {'index': start + i, 'id': t.id, 'status': 'created', 'todo': t}
+            for i, t in enumerate(todos)
+        ]
+
+    await session.commit()
+    await todo_list_versions.bump(user.id)
+
+    return {'results': results}
+
+
+@router.patch('/batch', status_code=HTTPStatus.OK, response_model=BatchResult)
+async def patch_todos_batch(
+    batch: TodoBatchUpdate,
+    session: T_Session,
+    user: CurrentUser,
+):
+    ids = list(dict.fromkeys(batch.ids))
     todos = await session.scalars(
-        query.limit(todo_filter.limit).offset(todo_filter.offset)
+        update(Todo)
+        .where(Todo.user_id == user.id, Todo.id.in_(ids))
+        .values(state=batch.state)
+        .returning(Todo)
+        .execution_options(populate_existing=True)
+    )
+    updated = {todo.id: todo for todo in todos}
+
+    await _finish_batch(session, user.id, ids, updated, batch.atomic)
+
+    return {
+        'results': [
+            {
+                'index': i,
+                'id': todo_id,
+                'status': 'updated',
+                'todo': updated[todo_id],
+            }
+            if todo_id in updated
+            else {'index': i, 'id': todo_id, 'status': 'not_found'}
+            for i, todo_id in enumerate(ids)
+        ]
+    }
+
+
+@router.delete('/batch', status_code=HTTPStatus.OK, response_model=BatchResult)
+async def delete_todos_batch(
+    batch: TodoBatchDelete,
+    session: T_Session,
+    user: CurrentUser,
+):
+    ids = list(dict.fromkeys(batch.ids))
+    deleted = set(
+        await session.scalars(
+            delete(Todo)
+            .where(Todo.user_id == user.id, Todo.id.in_(ids))
+            .returning(Todo.id)
+        )
     )
 
-    return {'todos': todos.all()}
+    await _finish_batch(session, user.id, ids, deleted, batch.atomic)
+
+    return {
+        'results': [
+            {
+                'index': i,
+                'id': todo_id,
+                'status': 'deleted' if todo_id in deleted else 'not_found',
+            }
+            for i, todo_id in enumerate(ids)
+        ]
+    }
+
+
+async def _finish_batch(session, user_id, ids, found, atomic):
+    missing = [todo_id for todo_id in ids if todo_id not in found]
+
+    if missing and atomic:
+        await session.rollback()
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail={'message': 'Task not found.', 'ids': missing},
+        )
+
+    await session.commit()
+    await todo_list_versions.bump(user_id)
 
 
 @router.delete('/{todo_id}', status_code=HTTPStatus.OK, response_model=Message)
@@ -80,17 +342,19 @@ async def delete_todo(
     session: T_Session,
     user: CurrentUser,
 ):
-    todo = await session.scalar(
-        select(Todo).where(Todo.user_id == user.id, Todo.id == todo_id)
+    deleted_id = await session.scalar(
+        delete(Todo)
+        .where(Todo.user_id == user.id, Todo.id == todo_id)
+        .returning(Todo.id)
     )
 
-    if not todo:
+    if deleted_id is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Task not found.'
         )
 
-    await session.delete(todo)
     await session.commit()
+    await todo_list_versions.bump(user.id)
 
     return {'message': 'Task has been deleted successfully.'}
 
@@ -107,7 +371,11 @@ async def patch_todo(
     todo: UpdateTodo,
 ):
     db_todo = await session.scalar(
-        select(Todo).where(Todo.user_id == user.id, Todo.id == todo_id)
+        update(Todo)
+        .where(Todo.user_id == user.id, Todo.id == todo_id)
+        .values(**todo.model_dump(exclude_unset=True))
+        .returning(Todo)
+        .execution_options(populate_existing=True)
     )
 
     if not db_todo:
@@ -116,11 +384,7 @@ async def patch_todo(
             detail='Task not found.',
         )
 
-    for chave, valor in todo.model_dump(exclude_unset=True).items():
-        setattr(db_todo, chave, valor)
-
-    session.add(db_todo)
     await session.commit()
-    await session.refresh(db_todo)
+    await todo_list_versions.bump(user.id)
 
     return db_todo
@@ -2,12 +2,16 @@ from http import HTTPStatus
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fast_async.database import get_session
+from fast_async.database import get_session, track_principal
+from fast_async.hashing import get_password_hash_async, hash_if_changed_async
 from fast_async.models import User
+from fast_async.pagination import next_page, paginate
+from fast_async.responses import FastJSONResponse, row_dicts
 from fast_async.schemas import (
     CreatedUser,
     FilterPage,
@@ -16,42 +20,50 @@ from fast_async.schemas import (
     UserPublic,
 )
 from fast_async.security import (
-    get_current_user,
-    get_password_hash,
+    Principal,
+    get_current_principal,
+    principal_cache,
+    token_versions,
 )
 
 router = APIRouter(prefix='/users', tags=['users'])
 T_Session = Annotated[AsyncSession, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[User | Principal, Depends(get_current_principal)]
+
+# Field order of UserPublic; the password hash is never read for output.
+PUBLIC_COLUMNS = (User.username, User.email, User.id)
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
 async def created_user(user: CreatedUser, session: T_Session):
+    track_principal(session, user.email)
     db_user = await session.scalar(
-        select(User).where(
-            (User.username == user.username) | (User.email == user.email)
+        insert(User)
+        .values(
+            username=user.username,
+            email=user.email,
+            password=await get_password_hash_async(user.password),
         )
+        .on_conflict_do_nothing()
+        .returning(User)
     )
-    if db_user:
-        if db_user.username == user.username:
+
+    if not db_user:
+        # Only the conflict path pays for a second query.
+        if await session.scalar(
+            select(exists().where(User.username == user.username))
+        ):
             raise HTTPException(
                 status_code=HTTPStatus.CONFLICT,
                 detail='Username already exists',
             )
-        elif db_user.email == user.email:
-            raise HTTPException(
-                status_code=HTTPStatus.CONFLICT, detail='Email already exists'
-            )
-
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        password=get_password_hash(user.password),
-    )
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT, detail='Email already exists'
+        )
 
-    session.add(db_user)
     await session.commit()
-    await session.refresh(db_user)
+    # A token for this email may have cached a miss before it existed.
+    await principal_cache.invalidate(db_user.email)
 
     return db_user
 
@@ -62,11 +74,15 @@ async def read_users(
     current_user: CurrentUser,
     filter_user: Annotated[FilterPage, Query()],
 ):
-    users = await session.scalars(
-        select(User).limit(filter_user.limit).offset(filter_user.offset)
+    users = await session.execute(
+        paginate(select(*PUBLIC_COLUMNS), filter_user, User.id)
     )
+    users, next_cursor = next_page(users.all(), filter_user, User.id)
 
-    return {'users': users}
+    return FastJSONResponse({
+        'users': row_dicts(users),
+        'next_cursor': next_cursor,
+    })
 
 
 @router.get(
@@ -79,14 +95,17 @@ async def read_user(
     session: T_Session,
     current_user: CurrentUser,
 ):
-    db_user = await session.scalar(select(User).where(User.id == user_id))
+    db_user = await session.execute(
+        select(*PUBLIC_COLUMNS).where(User.id == user_id)
+    )
+    db_user = db_user.first()
 
     if not db_user:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='User not found'
         )
 
-    return db_user
+    return FastJSONResponse(db_user._asdict())
 
 
 @router.put('/{user_id}', status_code=HTTPStatus.OK, response_model=UserPublic)
@@ -101,22 +120,40 @@ async def update_user(
             status_code=HTTPStatus.FORBIDDEN, detail=('Not enough permissions')
         )
 
-    try:
-        current_user.username = user.username
-        current_user.email = user.email
-        current_user.password = get_password_hash(user.password)
+    old_email = current_user.email
+    values = {'username': user.username, 'email': user.email}
+    # A primary key lookup is far cheaper than the argon2 hash it can save.
+    stored_password = await session.scalar(
+        select(User.password).where(User.id == current_user.id)
+    )
+    if password := await hash_if_changed_async(user.password, stored_password):
+        values['password'] = password
+    # Only a new password or email revokes the tokens issued so far; a
+    # username change leaves the caller's token valid.
+    if 'password' in values or user.email != old_email:
+        values['token_version'] = User.token_version + 1
+    track_principal(session, user.email)
 
-        session.add(current_user)
+    try:
+        db_user = await session.scalar(
+            update(User)
+            .where(User.id == current_user.id)
+            .values(**values)
+            .returning(User)
+            .execution_options(populate_existing=True)
+        )
         await session.commit()
-        await session.refresh(current_user)
-
-        return current_user
     except IntegrityError:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Username or Email already exists',
         )
 
+    await principal_cache.invalidate(old_email, user.email)
+    await token_versions.set(db_user.id, db_user.token_version)
+
+    return db_user
+
 
 @router.delete('/{user_id}', status_code=HTTPStatus.OK, response_model=Message)
 async def delete_user(
@@ -129,7 +166,9 @@ async def delete_user(
             status_code=HTTPStatus.FORBIDDEN, detail=('Not enough permissions')
         )
 
-    await session.delete(current_user)
+    await session.execute(delete(User).where(User.id == current_user.id))
     await session.commit()
+    await principal_cache.invalidate(current_user.email)
+    await token_versions.invalidate(current_user.id)
 
     return {'message': 'User deleted'}
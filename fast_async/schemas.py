@@ -1,6 +1,13 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import Literal
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    model_validator,
+)
 
 from fast_async.models import TodoState
 
@@ -28,6 +35,7 @@ class UserID(CreatedUser):
 
 class ListUsers(BaseModel):
     users: list[UserPublic]
+    next_cursor: str | None = None
 
 
 class Token(BaseModel):
@@ -38,12 +46,20 @@ class Token(BaseModel):
 class FilterPage(BaseModel):
     offset: int = Field(ge=0, default=0)
     limit: int = Field(ge=0, default=10)
+    cursor: str | None = None
 
 
 class FilterTodo(FilterPage):
     title: str | None = Field(default=None, min_length=3, max_length=22)
     description: str | None = None
     state: TodoState | None = None
+    search: str | None = Field(default=None, min_length=1, max_length=200)
+
+    @model_validator(mode='after')
+    def search_uses_offset_paging(self):
+        if self.search and self.cursor:
+            raise ValueError('cursor cannot be combined with search')
+        return self
 
 
 class UpdateTodo(BaseModel):
@@ -66,3 +82,46 @@ class TodoPublic(TodoSchema):
 
 class TodoList(BaseModel):
     todos: list[TodoPublic]
+    next_cursor: str | None = None
+
+
+class TodoBatchCreate(BaseModel):
+    todos: list[TodoSchema] = Field(min_length=1, max_length=1000)
+    atomic: bool = True
+
+
+class TodoBatchUpdate(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=1000)
+    state: TodoState
+    atomic: bool = True
+
+
+class TodoBatchDelete(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=1000)
+    atomic: bool = True
+
+
+class FilterStats(BaseModel):
+    days: int = Field(ge=1, le=366, default=30)
+
+
+class TodoDayStats(BaseModel):
+    day: date
+    created: int
+    done: int
+
+
+class TodoStats(BaseModel):
+    states: dict[TodoState, int]
+    daily: list[TodoDayStats]
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: int | None = None
+    status: Literal['created', 'updated', 'deleted', 'not_found', 'failed']
+    todo: TodoPublic | None = None
+
+
+class BatchResult(BaseModel):
+    results: list[BatchItemResult]
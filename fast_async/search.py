@@ -0,0 +1,23 @@
+from sqlalchemy import func
+
+from fast_async.models import SEARCH_CONFIG, Todo
+from fast_async.schemas import FilterTodo
+
+
+def filter_substrings(query, todo_filter: FilterTodo):
+    # LIKE '%term%' is answered by the pg_trgm GIN indexes on todos.
+    if todo_filter.title:
+        query = query.where(Todo.title.contains(todo_filter.title))
+
+    if todo_filter.description:
+        query = query.where(Todo.description.contains(todo_filter.description))
+
+    return query
+
+
+def rank_by_relevance(query, terms: str):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, terms)
+
+    return query.where(Todo.search_vector.op('@@')(tsquery)).order_by(
+        func.ts_rank(Todo.search_vector, tsquery).desc(), Todo.id
+    )
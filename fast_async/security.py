@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from http import HTTPStatus
 from typing import Annotated
@@ -5,27 +6,46 @@ from zoneinfo import ZoneInfo
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jwt import DecodeError, ExpiredSignatureError, decode, encode
-from pwdlib import PasswordHash
+from jwt import InvalidTokenError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
-from fast_async.database import get_session
+from fast_async.cache import build_cache
+from fast_async.database import get_session, track_principal
+from fast_async.keys import load_key_ring
 from fast_async.models import User
 from fast_async.settings import Settings
 
-pwd_context = PasswordHash.recommended()
 settings = Settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
+key_ring = load_key_ring(settings)
 T_Session = Annotated[AsyncSession, Depends(get_session)]
+principal_cache = build_cache(
+    'principal',
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    negative_ttl=settings.PRINCIPAL_CACHE_NEGATIVE_TTL_SECONDS,
+)
+# How stale a token version may be is how long a revoked token can
+# still pass the stateless check on another worker.
+token_versions = build_cache(
+    'token-version',
+    maxsize=settings.TOKEN_VERSION_CACHE_SIZE,
+    ttl=settings.TOKEN_VERSION_CACHE_TTL_SECONDS,
+    negative_ttl=settings.TOKEN_VERSION_CACHE_TTL_SECONDS,
+)
 
 
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    token_version: int
 
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+def token_claims(user) -> dict:
+    return {'sub': user.email, 'uid': user.id, 'ver': user.token_version}
 
 
 def create_access_token(data: dict):
@@ -36,31 +56,101 @@ def create_access_token(data: dict):
     )
     to_encode.update({'exp': expire})
 
-    encoded_jwt = encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
-    )
+    encoded_jwt = key_ring.sign(to_encode)
     return encoded_jwt
 
 
-async def get_current_user(
-    session: T_Session,
-    token: str = Depends(oauth2_scheme),
-):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=HTTPStatus.UNAUTHORIZED,
         detail='Could not validate credentials',
         headers={'WWW-Authenticate': 'Bearer'},
     )
 
+
+def _decode_token(token: str) -> dict:
     try:
-        payload = decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        return key_ring.verify(token)
+    except InvalidTokenError:
+        raise _credentials_exception()
+
+
+async def get_current_user(
+    session: T_Session,
+    token: str = Depends(oauth2_scheme),
+):
+    payload = _decode_token(token)
+    sub = payload.get('sub')
+
+    track_principal(session, sub)
+
+    # The snapshot may be shared through CACHE_URL, so it leaves out the
+    # password hash; update_user reads it when it needs it.
+    async def load_snapshot():
+        user = await session.execute(
+            select(
+                User.id,
+                User.username,
+                User.email,
+                User.token_version,
+            ).where(User.email == sub)
         )
-        sub = payload.get('sub')
-    except DecodeError:
-        raise credentials_exception
-    except ExpiredSignatureError:
-        raise credentials_exception
-    user = await session.scalar(select(User).where(User.email == sub))
+        user = user.first()
+        return None if user is None else user._asdict()
+
+    snapshot = await principal_cache.get_or_load(sub, load_snapshot)
+    if snapshot is None:
+        raise _credentials_exception()
+    if (
+        payload.get('ver', snapshot['token_version'])
+        != (snapshot['token_version'])
+    ):
+        raise _credentials_exception()
+
+    return await session.merge(_user_from_snapshot(snapshot), load=False)
+
+
+async def get_current_principal(
+    session: T_Session,
+    token: str = Depends(oauth2_scheme),
+):
+    """The caller's id and email, for endpoints that need nothing else.
+
+    With `AUTH_STATELESS` on, tokens carrying `uid` and `ver` are trusted
+    on their signature alone; only the user's token version is looked up,
+    through `token_versions`. Otherwise this is `get_current_user`.
+    """
+    if not settings.AUTH_STATELESS:
+        return await get_current_user(session, token)
+
+    payload = _decode_token(token)
+    uid, version = payload.get('uid'), payload.get('ver')
+    if uid is None or version is None:
+        return await get_current_user(session, token)
+
+    track_principal(session, payload['sub'])
+
+    async def load_version():
+        return await session.scalar(
+            select(User.token_version).where(User.id == uid)
+        )
+
+    if await token_versions.get_or_load(uid, load_version) != version:
+        raise _credentials_exception()
+
+    return Principal(id=uid, email=payload['sub'], token_version=version)
+
+
+def _user_from_snapshot(snapshot: dict):
+    user = User(
+        username=snapshot['username'],
+        email=snapshot['email'],
+        password=None,
+    )
+    # Left unloaded rather than None, so merging never overwrites it.
+    del user.password
+    user.id = snapshot['id']
+    user.token_version = snapshot['token_version']
+    make_transient_to_detached(user)
 
     return user
@@ -0,0 +1,258 @@
+"""Pre-fork production server.
+
+The master binds the listening socket, forks one uvicorn worker per CPU
+and keeps that many alive. Several workers need the shared CACHE_URL
+store; without it the server runs one. Workers exit after a jittered number of
+requests and are replaced. SIGHUP replaces every worker one at a time,
+starting the new one before stopping the old; SIGTERM/SIGINT stop them
+all gracefully.
+
+    python -m fast_async.server --host 0.0.0.0 --port 8000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+
+import uvicorn
+
+from fast_async.hashing import configured_cost, use_hash_cost
+from fast_async.settings import Settings
+
+logger = logging.getLogger('fast_async.server')
+ACCEPT_GRACE_SECONDS = 0.5
+
+
+class Worker(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, ready_fd: int | None):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets)
+        if self.ready_fd is not None:
+            os.write(self.ready_fd, b'1')
+            os.close(self.ready_fd)
+
+    async def shutdown(self, sockets=None):
+        # uvicorn closes connections that have not sent a request yet.
+        # Stop accepting first and give the ones that raced the shutdown
+        # a moment to send theirs, so their clients are not reset.
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPT_GRACE_SECONDS)
+        await super().shutdown(sockets)
+
+
+class Arbiter:
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        app: str,
+        sock: socket.socket,
+        workers: int,
+        max_requests: int,
+        max_requests_jitter: int,
+        graceful_timeout: int,
+    ):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.pids = set()
+        self.signals = []
+        self._wakeup_r, self._wakeup_w = os.pipe()
+
+    def run(self):
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._on_signal)
+        signal.signal(signal.SIGCHLD, lambda *args: None)
+
+        logger.info('Starting %d workers on %s', self.workers, self.address)
+        while True:
+            self.reap()
+            while len(self.pids) < self.workers:
+                self.spawn()
+
+            if select.select([self._wakeup_r], [], [], 1)[0]:
+                os.read(self._wakeup_r, 4096)
+
+            while self.signals:
+                sig = self.signals.pop(0)
+                if sig == signal.SIGHUP:
+                    self.reload()
+                else:
+                    self.stop()
+                    return
+
+    @property
+    def address(self):
+        return '%s:%d' % self.sock.getsockname()[:2]
+
+    def _on_signal(self, sig, frame):
+        self.signals.append(sig)
+
+    def spawn(self, notify_ready=False):
+        # Only a reload waits for the new worker, so only it gets a
+        # readiness pipe; its caller closes the read end.
+        ready_r, ready_w = os.pipe() if notify_ready else (None, None)
+        max_requests = self.max_requests
+        if max_requests:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid == 0:
+            if notify_ready:
+                os.close(ready_r)
+            os._exit(self._serve(ready_w, max_requests))
+
+        if notify_ready:
+            os.close(ready_w)
+        self.pids.add(pid)
+        logger.info('Booted worker %d', pid)
+        return pid, ready_r
+
+    def _serve(self, ready_fd, max_requests):
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+        config = uvicorn.Config(
+            self.app,
+            limit_max_requests=max_requests or None,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            proxy_headers=True,
+        )
+        try:
+            Worker(config, ready_fd).run(sockets=[self.sock])
+        except SystemExit as exc:
+            return exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            logger.exception('Worker crashed')
+            return 1
+        return 0
+
+    def reap(self):
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.pids.clear()
+                return
+            if pid == 0:
+                return
+            self.pids.discard(pid)
+            logger.info(
+                'Worker %d exited with %d',
+                pid,
+                os.waitstatus_to_exitcode(status),
+            )
+
+    def reload(self):
+        logger.info('Reloading %d workers', len(self.pids))
+        for old_pid in list(self.pids):
+            new_pid, ready_fd = self.spawn(notify_ready=True)
+            ready = select.select([ready_fd], [], [], self.graceful_timeout)
+            started = ready[0] and os.read(ready_fd, 1) == b'1'
+            os.close(ready_fd)
+
+            if not started:
+                logger.error(
+                    'Worker %d failed to boot, reload aborted', new_pid
+                )
+                return
+            self._kill(old_pid, signal.SIGTERM)
+
+    def stop(self):
+        logger.info('Shutting down %d workers', len(self.pids))
+        for pid in self.pids:
+            self._kill(pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGALRM, self._kill_remaining)
+        signal.alarm(self.graceful_timeout + 5)
+        while self.pids:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.pids.discard(pid)
+        signal.alarm(0)
+
+    def _kill_remaining(self, *args):
+        for pid in self.pids:
+            self._kill(pid, signal.SIGKILL)
+
+    @staticmethod
+    def _kill(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def bind(host: str, port: int):
+    sock = socket.create_server(
+        (host, port), family=socket.AF_INET, backlog=2048
+    )
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    settings = Settings()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app', default='fast_async.app:app')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument(
+        '--max-requests', type=int, default=settings.SERVER_MAX_REQUESTS
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format='[%(process)d] %(levelname)s %(message)s'
+    )
+
+    if settings.PASSWORD_HASH_TARGET_MS:
+        # Calibrate once, before the workers compete for the CPU. Workers
+        # inherit the hashing module from the master, so apply the cost
+        # here too; the settings carry it into anything they import anew.
+        cost = configured_cost(settings)
+        use_hash_cost(cost)
+        os.environ['PASSWORD_HASH_TIME_COST'] = str(cost.time_cost)
+        os.environ['PASSWORD_HASH_TARGET_MS'] = '0'
+
+    # Caches, list versions, read-your-writes pins and login limits are
+    # per process unless they live in the shared CACHE_URL store.
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and settings.CACHE_URL is None:
+        if args.workers:
+            parser.error('more than one worker needs CACHE_URL')
+        logger.warning('CACHE_URL is not set, running a single worker')
+        workers = 1
+
+    Arbiter(
+        app=args.app,
+        sock=bind(args.host, args.port),
+        workers=workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+        graceful_timeout=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+    ).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
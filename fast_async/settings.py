@@ -10,3 +10,65 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPITE_MINUTES: int
+    JWT_KEYS_FILE: str | None = None
+    JWT_ACTIVE_KID: str | None = None
+
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_POOL_WARMUP: bool = True
+    DATABASE_STATEMENT_TIMEOUT_MS: int = 0
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DATABASE_REPLICA_URL: str | None = None
+    DATABASE_REPLICA_STICKY_SECONDS: float = 5
+    DATABASE_REPLICA_LSN_CHECK: bool = False
+    DATABASE_REPLICA_PIN_CACHE_SIZE: int = 10_000
+
+    CACHE_URL: str | None = None
+    CACHE_MAX_CONNECTIONS: int = 10
+    CACHE_TIMEOUT_SECONDS: float = 0.5
+
+    PRINCIPAL_CACHE_SIZE: int = 10_000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+    PRINCIPAL_CACHE_NEGATIVE_TTL_SECONDS: float = 5
+
+    AUTH_STATELESS: bool = False
+    TOKEN_VERSION_CACHE_SIZE: int = 10_000
+    TOKEN_VERSION_CACHE_TTL_SECONDS: float = 30
+
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_RATE_LIMIT_MAX_KEYS: int = 100_000
+    LOGIN_IP_RATE_PER_MINUTE: float = 30
+    LOGIN_IP_BURST: int = 10
+    LOGIN_ACCOUNT_RATE_PER_MINUTE: float = 10
+    LOGIN_ACCOUNT_BURST: int = 5
+    LOGIN_LOCKOUT_FAILURES: int = 10
+    LOGIN_LOCKOUT_WINDOW_SECONDS: float = 900
+
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_TIME_COST: int = 3
+    PASSWORD_HASH_MEMORY_COST: int = 65_536
+    PASSWORD_HASH_PARALLELISM: int = 4
+    PASSWORD_HASH_TARGET_MS: float = 0
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    TODO_BATCH_CHUNK_SIZE: int = 100
+    TODO_LIST_CACHE_SIZE: int = 2048
+    TODO_LIST_CACHE_TTL_SECONDS: float = 300
+
+    EXPORT_CHUNK_SIZE: int = 1000
+
+    METRICS_ENABLED: bool = True
+    METRICS_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+
+    QUERY_AUDIT_ENABLED: bool = True
+    QUERY_AUDIT_N_PLUS_ONE_THRESHOLD: int = 5
+    QUERY_AUDIT_SLOW_MS: float = 200
+    QUERY_AUDIT_EXPLAIN_SAMPLE_RATE: float = 0.01
+
+    SERVER_WORKERS: int = 0
+    SERVER_MAX_REQUESTS: int = 10_000
+    SERVER_MAX_REQUESTS_JITTER: int = 1_000
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
@@ -0,0 +1,129 @@
+"""Reconciliation of the todo counters.
+
+The triggers on todos keep `todo_state_counts` and `todo_daily_counts`
+current, so this normally finds nothing. It recounts a range of users at
+a time from todos and rewrites the counter rows that drifted, e.g. after
+a restore or a load with triggers disabled. Each range is reconciled in
+a REPEATABLE READ transaction: a writer that changes the same counters
+meanwhile makes it fail with a serialization error rather than have its
+change overwritten, and the range is retried. Run it from cron:
+
+    python -m fast_async.stats
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from fast_async import database
+
+logger = logging.getLogger(__name__)
+
+# serialization_failure and deadlock_detected
+RETRY_SQLSTATES = {'40001', '40P01'}
+
+REPAIR_STATES = text("""
+    WITH expected AS (
+        SELECT user_id, state, count(*) AS todos
+        FROM todos WHERE user_id BETWEEN :low AND :high
+        GROUP BY user_id, state
+    ), actual AS (
+        SELECT user_id, state, todos
+        FROM todo_state_counts WHERE user_id BETWEEN :low AND :high
+    )
+    INSERT INTO todo_state_counts AS c (user_id, state, todos)
+    SELECT user_id, state, coalesce(e.todos, 0)
+    FROM expected AS e FULL JOIN actual AS a USING (user_id, state)
+    WHERE coalesce(e.todos, 0) <> coalesce(a.todos, 0)
+    ORDER BY user_id, state
+    ON CONFLICT (user_id, state) DO UPDATE SET todos = excluded.todos
+    RETURNING user_id
+""")
+
+REPAIR_DAYS = text("""
+    WITH expected AS (
+        SELECT user_id, day, sum(created) AS created, sum(done) AS done
+        FROM (
+            SELECT user_id, created_at::date AS day, 1 AS created, 0 AS done
+            FROM todos WHERE user_id BETWEEN :low AND :high
+            UNION ALL
+            SELECT user_id, done_at::date, 0, 1
+            FROM todos WHERE user_id BETWEEN :low AND :high
+            AND done_at IS NOT NULL
+        ) AS days
+        GROUP BY user_id, day
+    ), actual AS (
+        SELECT user_id, day, created, done
+        FROM todo_daily_counts WHERE user_id BETWEEN :low AND :high
+    )
+    INSERT INTO todo_daily_counts AS c (user_id, day, created, done)
+    SELECT user_id, day, coalesce(e.created, 0), coalesce(e.done, 0)
+    FROM expected AS e FULL JOIN actual AS a USING (user_id, day)
+    WHERE coalesce(e.created, 0) <> coalesce(a.created, 0)
+    OR coalesce(e.done, 0) <> coalesce(a.done, 0)
+    ORDER BY user_id, day
+    ON CONFLICT (user_id, day) DO UPDATE
+    SET created = excluded.created, done = excluded.done
+    RETURNING user_id
+""")
+
+
+async def reconcile_users(engine: AsyncEngine, low: int, high: int) -> int:
+    """Repair the counters of users `low` to `high`; returns the number
+    of rows rewritten."""
+    params = {'low': low, 'high': high}
+    while True:
+        try:
+            async with engine.connect() as conn:
+                await conn.execution_options(isolation_level='REPEATABLE READ')
+                async with conn.begin():
+                    states = await conn.execute(REPAIR_STATES, params)
+                    days = await conn.execute(REPAIR_DAYS, params)
+                    return len(states.all()) + len(days.all())
+        except DBAPIError as exc:
+            if getattr(exc.orig, 'sqlstate', None) not in RETRY_SQLSTATES:
+                raise
+            logger.info('Retrying todo counters of users %d-%d', low, high)
+
+
+async def reconcile(engine: AsyncEngine, batch: int = 1000) -> int:
+    async with engine.connect() as conn:
+        first, last = (
+            await conn.execute(text('SELECT min(id), max(id) FROM users'))
+        ).one()
+
+    repaired = 0
+    for low in range(first or 0, (last or -1) + 1, batch):
+        high = low + batch - 1
+        rows = await reconcile_users(engine, low, high)
+        if rows:
+            logger.warning(
+                'Repaired %d todo counter rows for users %d-%d',
+                rows,
+                low,
+                high,
+            )
+        repaired += rows
+    return repaired
+
+
+async def _main(batch: int):
+    try:
+        repaired = await reconcile(database.engine, batch)
+    finally:
+        await database.engine.dispose()
+    logger.info('Reconciled todo counters, %d rows repaired', repaired)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    sys.exit(asyncio.run(_main(args.batch)))
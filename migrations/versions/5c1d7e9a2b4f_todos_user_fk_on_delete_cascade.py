@@ -0,0 +1,39 @@
+"""todos user fk on delete cascade
+
+Revision ID: 5c1d7e9a2b4f
+Revises: b0e2f779b49c
+Create Date: 2026-10-18 10:02:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d7e9a2b4f'
+down_revision: Union[str, Sequence[str], None] = 'b0e2f779b49c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('todos_user_id_fkey', 'todos', type_='foreignkey')
+    op.create_foreign_key(
+        'todos_user_id_fkey',
+        'todos',
+        'users',
+        ['user_id'],
+        ['id'],
+        ondelete='CASCADE',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('todos_user_id_fkey', 'todos', type_='foreignkey')
+    op.create_foreign_key(
+        'todos_user_id_fkey', 'todos', 'users', ['user_id'], ['id']
+    )
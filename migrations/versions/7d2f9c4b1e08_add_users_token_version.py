@@ -0,0 +1,34 @@
+"""add users token version
+
+Revision ID: 7d2f9c4b1e08
+Revises: e3b8f0a61c25
+Create Date: 2026-10-18 15:12:08.731164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f9c4b1e08'
+down_revision: Union[str, Sequence[str], None] = 'e3b8f0a61c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default is stored in the catalog; no table rewrite.
+    op.add_column(
+        'users',
+        sa.Column(
+            'token_version', sa.Integer(), server_default='0', nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
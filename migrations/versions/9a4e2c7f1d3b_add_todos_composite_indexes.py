@@ -0,0 +1,51 @@
+"""add todos composite indexes
+
+Revision ID: 9a4e2c7f1d3b
+Revises: 5c1d7e9a2b4f
+Create Date: 2026-10-18 11:24:09.551873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e2c7f1d3b'
+down_revision: Union[str, Sequence[str], None] = '5c1d7e9a2b4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_todos_user_id_state': ['user_id', 'state'],
+    'ix_todos_user_id_created_at_id': ['user_id', 'created_at', 'id'],
+    'ix_todos_user_id_id': ['user_id', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps writes flowing while the indexes build, but it
+    # cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(
+                name,
+                'todos',
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(
+                name,
+                table_name='todos',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
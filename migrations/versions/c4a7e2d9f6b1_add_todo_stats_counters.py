@@ -0,0 +1,170 @@
+"""add todo stats counters
+
+Revision ID: c4a7e2d9f6b1
+Revises: 7d2f9c4b1e08
+Create Date: 2026-10-18 19:03:44.512907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2d9f6b1'
+down_revision: Union[str, Sequence[str], None] = '7d2f9c4b1e08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTER_DDL = (
+    """
+    CREATE FUNCTION set_todo_done_at() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NEW.state <> 'done' THEN
+            NEW.done_at := NULL;
+        ELSIF TG_OP = 'INSERT' THEN
+            NEW.done_at := coalesce(NEW.done_at, now());
+        ELSIF OLD.state <> 'done' THEN
+            NEW.done_at := now();
+        END IF;
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER todos_done_at
+    BEFORE INSERT OR UPDATE OF state ON todos
+    FOR EACH ROW EXECUTE FUNCTION set_todo_done_at()
+    """,
+    """
+    CREATE FUNCTION count_todo_changes() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        added text := 'SELECT user_id, state, created_at, done_at, 1 AS n
+            FROM new_rows';
+        removed text := 'SELECT user_id, state, created_at, done_at, -1 AS n
+            FROM old_rows';
+    BEGIN
+        EXECUTE 'WITH changes AS (' || CASE TG_OP
+            WHEN 'INSERT' THEN added
+            WHEN 'DELETE' THEN removed
+            ELSE added || ' UNION ALL ' || removed
+        END || ')' || $sql$,
+        states AS (
+            INSERT INTO todo_state_counts AS c (user_id, state, todos)
+            SELECT user_id, state, todos FROM (
+                SELECT user_id, state, sum(n) AS todos
+                FROM changes GROUP BY user_id, state
+            ) AS s
+            WHERE todos <> 0
+            AND EXISTS (SELECT FROM users WHERE id = s.user_id)
+            ORDER BY user_id, state
+            ON CONFLICT (user_id, state)
+            DO UPDATE SET todos = c.todos + excluded.todos
+        )
+        INSERT INTO todo_daily_counts AS c (user_id, day, created, done)
+        SELECT user_id, day, created, done FROM (
+            SELECT user_id, day, sum(created) AS created, sum(done) AS done
+            FROM (
+                SELECT user_id, created_at::date AS day, n AS created,
+                0 AS done FROM changes
+                UNION ALL
+                SELECT user_id, done_at::date, 0, n
+                FROM changes WHERE done_at IS NOT NULL
+            ) AS days
+            GROUP BY user_id, day
+        ) AS d
+        WHERE (created <> 0 OR done <> 0)
+        AND EXISTS (SELECT FROM users WHERE id = d.user_id)
+        ORDER BY user_id, day
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            created = c.created + excluded.created,
+            done = c.done + excluded.done
+        $sql$;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER todos_count_inserts
+    AFTER INSERT ON todos REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_todo_changes()
+    """,
+    """
+    CREATE TRIGGER todos_count_updates
+    AFTER UPDATE ON todos
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_todo_changes()
+    """,
+    """
+    CREATE TRIGGER todos_count_deletes
+    AFTER DELETE ON todos REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION count_todo_changes()
+    """,
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('todos', sa.Column('done_at', sa.DateTime(), nullable=True))
+    # The best guess for todos that were done before done_at existed.
+    op.execute("UPDATE todos SET done_at = updated_at WHERE state = 'done'")
+
+    state = postgresql.ENUM(name='todostate', create_type=False)
+    op.create_table(
+        'todo_state_counts',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('state', state, nullable=False),
+        sa.Column('todos', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'state'),
+    )
+    op.create_table(
+        'todo_daily_counts',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('created', sa.Integer(), nullable=False),
+        sa.Column('done', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day'),
+    )
+
+    for statement in COUNTER_DDL:
+        op.execute(statement)
+
+    # The triggers lock out writes to todos until this transaction
+    # commits, so the counters start out exact.
+    op.execute("""
+        INSERT INTO todo_state_counts (user_id, state, todos)
+        SELECT user_id, state, count(*) FROM todos GROUP BY user_id, state
+    """)
+    op.execute("""
+        INSERT INTO todo_daily_counts (user_id, day, created, done)
+        SELECT user_id, day, sum(created), sum(done) FROM (
+            SELECT user_id, created_at::date AS day, 1 AS created, 0 AS done
+            FROM todos
+            UNION ALL
+            SELECT user_id, done_at::date, 0, 1
+            FROM todos WHERE done_at IS NOT NULL
+        ) AS days
+        GROUP BY user_id, day
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in (
+        'todos_count_deletes',
+        'todos_count_updates',
+        'todos_count_inserts',
+        'todos_done_at',
+    ):
+        op.execute(f'DROP TRIGGER {trigger} ON todos')
+    op.execute('DROP FUNCTION count_todo_changes()')
+    op.execute('DROP FUNCTION set_todo_done_at()')
+    op.drop_table('todo_daily_counts')
+    op.drop_table('todo_state_counts')
+    op.drop_column('todos', 'done_at')
@@ -0,0 +1,82 @@
+"""add todos search indexes
+
+Revision ID: e3b8f0a61c25
+Revises: 9a4e2c7f1d3b
+Create Date: 2026-10-18 12:41:57.204316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b8f0a61c25'
+down_revision: Union[str, Sequence[str], None] = '9a4e2c7f1d3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Adding a stored generated column rewrites the table once.
+    op.add_column(
+        'todos',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('simple', title || ' ' || description)",
+                persisted=True,
+            ),
+            nullable=False,
+        ),
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_todos_title_trgm',
+            'todos',
+            ['title'],
+            postgresql_using='gin',
+            postgresql_ops={'title': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_todos_description_trgm',
+            'todos',
+            ['description'],
+            postgresql_using='gin',
+            postgresql_ops={'description': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_todos_search_vector',
+            'todos',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in (
+            'ix_todos_search_vector',
+            'ix_todos_description_trgm',
+            'ix_todos_title_trgm',
+        ):
+            op.drop_index(
+                name,
+                table_name='todos',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    op.drop_column('todos', 'search_vector')
@@ -1,26 +1,39 @@
-from contextlib import contextmanager
+import os
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 
 import factory
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import event
+from sqlalchemy import create_engine, event, make_url, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
 from testcontainers.postgres import PostgresContainer
 
+from fast_async import database
 from fast_async.app import app
+from fast_async.audit import query_auditor
 from fast_async.database import get_session
+from fast_async.hashing import get_password_hash
+from fast_async.metrics import instrument_engine
 from fast_async.models import User, table_registry
-from fast_async.security import get_password_hash
+from fast_async.routers.auth import login_limiter
+from fast_async.routers.todos import todo_list_pages, todo_list_versions
+from fast_async.security import principal_cache, token_versions
 from fast_async.settings import Settings
 
+TEMPLATE_DATABASE = 'fast_async_template'
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
 
 @pytest.fixture
-def client(session):
+def client(session, monkeypatch):
     def get_session_override():
         return session
 
+    monkeypatch.setattr(database.settings, 'DATABASE_POOL_WARMUP', False)
+
     with TestClient(app) as client:
         app.dependency_overrides[get_session] = get_session_override
         yield client
@@ -28,22 +41,127 @@ def client(session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    principal_cache.clear()
+    token_versions.clear()
+    todo_list_versions.clear()
+    todo_list_pages.clear()
+    login_limiter.store.clear()
+
+
+def pytest_sessionstart(session):
+    config = session.config
+    if hasattr(config, 'workerinput'):
+        config.database_url = config.workerinput['database_url']
+        return
+
+    # TEST_DATABASE_URL points at a running server, e.g. a local
+    # Postgres where there is no container runtime; the database in it is
+    # only used to create the others.
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        stack = ExitStack()
+        config.add_cleanup(stack.close)
+        postgres = stack.enter_context(
+            PostgresContainer('postgres:17', driver='psycopg')
+        )
+        url = postgres.get_connection_url()
+
+    _create_database(url, TEMPLATE_DATABASE)
+    template = create_engine(make_url(url).set(database=TEMPLATE_DATABASE))
+    with template.begin() as conn:
+        table_registry.metadata.create_all(conn)
+    template.dispose()
+    config.database_url = url
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    node.workerinput['database_url'] = node.config.database_url
+
+
+def _create_database(url, name, template=None):
+    admin = create_engine(url, isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+        if template:
+            conn.exec_driver_sql(f'CREATE DATABASE {name} TEMPLATE {template}')
+        else:
+            conn.exec_driver_sql(f'CREATE DATABASE {name}')
+    admin.dispose()
+
+
+@pytest.fixture(scope='session')
+def database_url(pytestconfig):
+    """A copy of the template for this xdist worker, cloned at the file
+    level instead of running the DDL again."""
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    name = f'fast_async_test_{worker}'
+    _create_database(pytestconfig.database_url, name, TEMPLATE_DATABASE)
+    return make_url(pytestconfig.database_url).set(database=name)
+
+
 @pytest.fixture(scope='session')
-def engine():
-    with PostgresContainer('postgres:17', driver='psycopg') as postgres:
-        yield create_async_engine(postgres.get_connection_url())
+def engine(database_url):
+    engine = create_async_engine(database_url)
+    instrument_engine(engine)
+    query_auditor.instrument(engine)
+    return engine
+
+
+@pytest.fixture(scope='session')
+def sequences(database_url):
+    sync_engine = create_engine(database_url)
+    with sync_engine.connect() as conn:
+        sequences = conn.execute(
+            text(
+                "SELECT format('%I.%I', schemaname, sequencename) "
+                'FROM pg_sequences'
+            )
+        ).scalars()
+        sequences = sequences.all()
+    sync_engine.dispose()
+    return sequences
 
 
 @pytest_asyncio.fixture
-async def session(engine):
-    async with engine.begin() as conn:
-        await conn.run_sync(table_registry.metadata.create_all)
+async def session(engine, sequences):
+    """Each test runs inside a transaction that is rolled back at the end.
+
+    Commits and rollbacks made by the test or the app only release or roll
+    back a savepoint in it. Sequences are restarted inside it too, which
+    Postgres rolls back along with everything else, so ids start at 1;
+    it also locks them until then, so tests that insert through other
+    connections use `truncate` instead.
+    """
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        for sequence in sequences:
+            await conn.exec_driver_sql(f'ALTER SEQUENCE {sequence} RESTART')
+
+        async with AsyncSession(
+            bind=conn,
+            expire_on_commit=False,
+            join_transaction_mode='create_savepoint',
+        ) as session:
+            yield session
+
+        await transaction.rollback()
 
-    async with AsyncSession(engine, expire_on_commit=False) as session:
-        yield session
 
+@pytest_asyncio.fixture
+async def truncate(engine):
+    """For tests that commit through connections of their own, which the
+    session fixture's rollback does not cover."""
+    yield
+    tables = ', '.join(
+        table.name for table in table_registry.metadata.sorted_tables
+    )
     async with engine.begin() as conn:
-        await conn.run_sync(table_registry.metadata.drop_all)
+        await conn.exec_driver_sql(
+            f'TRUNCATE {tables} RESTART IDENTITY CASCADE'
+        )
 
 
 @contextmanager
@@ -54,11 +172,23 @@ def _mock_db_time(*, model, time=datetime.now()):
         if hasattr(target, 'updated_at'):
             target.updated_at = time
 
+    def fake_time_statement(orm_execute_state):
+        statement = orm_execute_state.statement
+        if (
+            orm_execute_state.is_insert
+            and statement.table.name == model.__tablename__
+        ):
+            orm_execute_state.statement = statement.values(
+                created_at=time, updated_at=time
+            )
+
     event.listen(model, 'before_insert', fake_time_hook)
+    event.listen(Session, 'do_orm_execute', fake_time_statement)
 
     yield time
 
     event.remove(model, 'before_insert', fake_time_hook)
+    event.remove(Session, 'do_orm_execute', fake_time_statement)
 
 
 @pytest.fixture
@@ -66,6 +196,31 @@ def mock_db_time():
     return _mock_db_time
 
 
+@contextmanager
+def _capture_sql(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        # Savepoints come from the session fixture, not from the app.
+        if not statement.startswith(SAVEPOINT_STATEMENTS):
+            statements.append((statement, parameters))
+
+    event.listen(
+        engine.sync_engine, 'before_cursor_execute', before_cursor_execute
+    )
+
+    yield statements
+
+    event.remove(
+        engine.sync_engine, 'before_cursor_execute', before_cursor_execute
+    )
+
+
+@pytest.fixture
+def capture_sql(engine):
+    return lambda: _capture_sql(engine)
+
+
 @pytest_asyncio.fixture
 async def user(session):
     password = 'test'
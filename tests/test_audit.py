@@ -0,0 +1,125 @@
+import logging
+from http import HTTPStatus
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from fast_async.audit import QueryAuditor, fingerprint, query_auditor
+from fast_async.models import User
+from tests.test_todos import TodoFactory
+
+
+@pytest.mark.parametrize(
+    ('statement', 'expected'),
+    [
+        (
+            'SELECT users.id FROM users\n  WHERE users.id = %(id_1)s',
+            'SELECT users.id FROM users WHERE users.id = ?',
+        ),
+        (
+            "SELECT * FROM todos WHERE title = 'it''s' AND id > 10",
+            'SELECT * FROM todos WHERE title = ? AND id > ?',
+        ),
+        (
+            'SELECT * FROM todos WHERE id IN (%(id_1_1)s, %(id_1_2)s)',
+            'SELECT * FROM todos WHERE id IN (...)',
+        ),
+        (
+            'SELECT * FROM todos WHERE id IN (1)',
+            'SELECT * FROM todos WHERE id IN (...)',
+        ),
+        (
+            'INSERT INTO todos (title, state) VALUES (%s, %s), (%s, %s)',
+            'INSERT INTO todos (title, state) VALUES (...)',
+        ),
+        (
+            'SELECT todos_1.id /* hint */ FROM todos AS todos_1 -- note',
+            'SELECT todos_1.id FROM todos AS todos_1',
+        ),
+    ],
+)
+def test_fingerprint(statement, expected):
+    assert fingerprint(statement) == expected
+
+
+@pytest_asyncio.fixture
+async def audited(engine, settings):
+    config = settings.model_copy(
+        update={
+            'QUERY_AUDIT_N_PLUS_ONE_THRESHOLD': 3,
+            'QUERY_AUDIT_SLOW_MS': 1000,
+            'QUERY_AUDIT_EXPLAIN_SAMPLE_RATE': 1,
+        }
+    )
+    auditor = QueryAuditor(config)
+    audited_engine = create_async_engine(engine.url)
+    auditor.instrument(audited_engine)
+
+    yield auditor, audited_engine
+
+    await auditor.drain()
+    await audited_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_shape_is_reported(audited, caplog):
+    auditor, audited_engine = audited
+
+    token = auditor.start_request()
+    async with audited_engine.connect() as conn:
+        for n in range(3):
+            await conn.execute(select(text('1')).where(text(f'{n} = {n}')))
+        await conn.execute(text('SELECT 2'))
+    auditor.finish_request(token, '/todos/')
+
+    assert auditor.n_plus_one == 1
+    assert 'Possible N+1 on /todos/: 3 x SELECT ? WHERE ? = ?' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_slow_read_is_explained(audited, caplog):
+    auditor, audited_engine = audited
+    auditor.config.QUERY_AUDIT_SLOW_MS = 0
+    caplog.set_level(logging.WARNING, 'fast_async.audit')
+
+    async with audited_engine.connect() as conn:
+        await conn.execute(text('SELECT :n'), {'n': 1})
+    await auditor.drain()
+
+    assert auditor.slow == 1
+    assert 'Slow query' in caplog.text
+    assert 'Plan for SELECT ?' in caplog.text
+    assert 'actual time' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_slow_write_is_not_explained(audited, caplog):
+    auditor, audited_engine = audited
+    auditor.config.QUERY_AUDIT_SLOW_MS = 0
+
+    # Rows written by the session fixture are not visible from here,
+    # so this matches nothing, but it is still a write.
+    async with audited_engine.begin() as conn:
+        await conn.execute(
+            update(User).where(User.id == 0).values(username='x')
+        )
+    await auditor.drain()
+
+    assert auditor.slow == 1
+    assert 'Slow query' in caplog.text
+    assert 'Plan for' not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_routes_have_no_n_plus_one(session, user, token, client):
+    session.add_all(TodoFactory.create_batch(20, user_id=user.id))
+    await session.commit()
+    before = query_auditor.n_plus_one
+    headers = {'authorization': f'Bearer {token}'}
+
+    for url in ('/users/', f'/users/{user.id}', '/todos/', '/todos/export'):
+        assert client.get(url, headers=headers).status_code == HTTPStatus.OK
+
+    assert query_auditor.n_plus_one == before
@@ -1,7 +1,14 @@
 from datetime import datetime, timedelta
 from http import HTTPStatus
 
+import pytest
 from freezegun import freeze_time
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from sqlalchemy import select, update
+
+from fast_async.hashing import needs_rehash, verify_password
+from fast_async.models import User
 
 
 def test_get_token(client, user):
@@ -100,3 +107,38 @@ def test_token_expired_after_time_refresh(client, user):
 
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_password(client, session, user):
+    weak = PasswordHash((Argon2Hasher(time_cost=1),)).hash('test')
+    await session.execute(
+        update(User).where(User.id == user.id).values(password=weak)
+    )
+    await session.commit()
+
+    resultado = client.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+
+    stored = await session.scalar(
+        select(User.password).where(User.id == user.id)
+    )
+    assert resultado.status_code == HTTPStatus.OK
+    assert stored != weak
+    assert not needs_rehash(stored)
+    assert verify_password('test', stored)
+
+
+@pytest.mark.asyncio
+async def test_login_keeps_current_hash(client, session, user):
+    client.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+
+    stored = await session.scalar(
+        select(User.password).where(User.id == user.id)
+    )
+    assert stored == user.password
@@ -0,0 +1,425 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+
+from fast_async.cache import (
+    Cache,
+    CacheError,
+    LRUCache,
+    MemoryBackend,
+    RedisBackend,
+    VersionMap,
+)
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_hit_and_miss_counters():
+    cache = LRUCache(maxsize=2, ttl=10)
+
+    assert cache.get('a') is None
+    cache.set('a', 1)
+
+    assert cache.get('a') == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+
+    expected = 3
+    cache.set('c', expected)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == expected
+
+
+def test_lru_cache_expires_after_ttl():
+    timer = FakeTimer()
+    cache = LRUCache(maxsize=2, ttl=10, timer=timer)
+    cache.set('a', 1)
+
+    timer.now = 9.9
+    assert cache.get('a') == 1
+
+    timer.now = 10
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_invalidate():
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+
+    cache.invalidate('a')
+    cache.invalidate('missing')
+
+    assert cache.get('a') is None
+
+
+def memory_cache(**kwargs):
+    return Cache(MemoryBackend(maxsize=16), 'test', ttl=10, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_cache_get_many_and_invalidate():
+    cache = memory_cache()
+    await cache.set_many({'a': 1, 'b': {'x': [1]}})
+
+    assert await cache.get_many(['a', 'b', 'c']) == {'a': 1, 'b': {'x': [1]}}
+
+    await cache.invalidate('a', 'c')
+
+    assert await cache.get('a') is None
+    assert cache.hits == 2  # noqa: PLR2004
+    assert cache.misses == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_cache_get_or_load_caches_misses_for_negative_ttl():
+    cache = memory_cache(negative_ttl=5)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+
+    assert await cache.get_or_load('a', loader) is None
+    assert await cache.get_or_load('a', loader) is None
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_get_or_load_without_negative_ttl_retries():
+    cache = memory_cache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+
+    await cache.get_or_load('a', loader)
+    await cache.get_or_load('a', loader)
+
+    assert len(calls) == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_cache_get_or_load_single_flight():
+    cache = memory_cache()
+    release = asyncio.Event()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await release.wait()
+        return 'value'
+
+    waiters = [
+        asyncio.create_task(cache.get_or_load('a', loader)) for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ['value'] * 5
+    assert len(calls) == 1
+    assert await cache.get('a') == 'value'
+
+
+@pytest.mark.asyncio
+async def test_cache_get_or_load_shares_loader_errors():
+    cache = memory_cache()
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        raise ValueError('boom')
+
+    waiters = [
+        asyncio.create_task(cache.get_or_load('a', loader)) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert 'a' not in cache._inflight
+
+
+@pytest.mark.asyncio
+async def test_cache_get_or_load_survives_cancelled_loader():
+    cache = memory_cache()
+    release = asyncio.Event()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await release.wait()
+        return 'value'
+
+    first = asyncio.create_task(cache.get_or_load('a', loader))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.create_task(cache.get_or_load('a', loader)) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    first.cancel()
+    async with asyncio.timeout(1):
+        while len(calls) < 2:  # noqa: PLR2004
+            await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ['value'] * 2
+    assert first.cancelled()
+    assert len(calls) == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_version_map_bump():
+    versions = VersionMap(memory_cache())
+    first = await versions.get(1)
+
+    assert await versions.get(1) == first
+
+    await versions.bump(1)
+
+    assert await versions.get(1) != first
+    assert await versions.get(2) not in {first, await versions.get(1)}
+
+
+class FlakyBackend(MemoryBackend):
+    """Fails the next `failures` writes, then behaves."""
+
+    def __init__(self, failures):
+        super().__init__(maxsize=16)
+        self.failures = failures
+
+    def _maybe_fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise CacheError('down')
+
+    async def set_many(self, items, ttl):
+        self._maybe_fail()
+        await super().set_many(items, ttl)
+
+    async def delete(self, *keys):
+        self._maybe_fail()
+        await super().delete(*keys)
+
+
+@pytest.mark.parametrize('failures', [1, 2])
+@pytest.mark.asyncio
+async def test_version_map_failed_bump_drops_the_version(failures):
+    backend = FlakyBackend(0)
+    versions = VersionMap(Cache(backend, 'version', ttl=10))
+    old = await versions.get('todo:1')
+
+    backend.failures = failures
+    await versions.bump('todo:1')
+
+    assert await versions.get('todo:1') != old
+
+
+@pytest.mark.asyncio
+async def test_version_map_bump_raises_when_the_key_cannot_be_dropped():
+    backend = FlakyBackend(0)
+    versions = VersionMap(Cache(backend, 'version', ttl=10))
+    await versions.get('todo:1')
+
+    backend.failures = 3
+    with pytest.raises(CacheError):
+        await versions.bump('todo:1')
+
+
+@pytest.mark.asyncio
+async def test_version_map_never_reuses_a_lost_version():
+    versions = VersionMap(memory_cache())
+    first = await versions.get(1)
+
+    versions.clear()
+
+    assert await versions.get(1) != first
+
+
+class FakeRedis:
+    """Just enough of a Redis server for RedisBackend: GET, SET with
+    PX/NX, DEL, AUTH and SELECT. Each read from a client is recorded as
+    one batch of commands."""
+
+    def __init__(self):
+        self.data = {}
+        self.batches = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        buffer = b''
+        while chunk := await reader.read(65536):
+            buffer += chunk
+            commands, buffer = self.parse(buffer)
+            self.batches.append(commands)
+            writer.write(b''.join(self.run(*c) for c in commands))
+            await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def parse(buffer):
+        commands = []
+        while buffer.startswith(b'*') and b'\r\n' in buffer:
+            lines = buffer.split(b'\r\n')
+            count = int(lines[0][1:])
+            if len(lines) < 2 * count + 2:
+                break
+            commands.append([lines[2 + 2 * i].decode() for i in range(count)])
+            buffer = b'\r\n'.join(lines[2 * count + 1 :])
+        return commands, buffer
+
+    def run(self, name, *args):
+        command = getattr(self, f'cmd_{name.lower()}', None)
+        if command is None:
+            return b'-ERR unknown command\r\n'
+        return command(*args)
+
+    @staticmethod
+    def cmd_auth(*args):
+        return b'+OK\r\n'
+
+    cmd_select = cmd_auth
+
+    def cmd_get(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        if value is None or expires_at <= time.monotonic():
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value.encode())
+
+    def cmd_del(self, *keys):
+        removed = sum(self.data.pop(k, None) is not None for k in keys)
+        return b':%d\r\n' % removed
+
+    def cmd_set(self, key, value, _, px, *flags):
+        if flags == ('NX',) and self.cmd_get(key) != b'$-1\r\n':
+            return b'$-1\r\n'
+        self.data[key] = (value, time.monotonic() + int(px) / 1000)
+        return b'+OK\r\n'
+
+
+@pytest_asyncio.fixture
+async def redis_backend():
+    fake = FakeRedis()
+    port = await fake.start()
+    backend = RedisBackend(f'redis://:secret@127.0.0.1:{port}/1')
+    backend.fake = fake
+
+    yield backend
+
+    await backend.close()
+    fake.server.close()
+    await fake.server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_pipelines_multi_get(redis_backend):
+    cache = Cache(redis_backend, 'test', ttl=10)
+    await cache.set_many({'a': 1, 'b': 'two'})
+
+    found = await cache.get_many(['a', 'b', 'c'])
+
+    assert found == {'a': 1, 'b': 'two'}
+    assert redis_backend.fake.batches[-1] == [
+        ['GET', 'test:a'],
+        ['GET', 'test:b'],
+        ['GET', 'test:c'],
+    ]
+    assert redis_backend.fake.batches[0] == [
+        ['AUTH', 'secret'],
+        ['SELECT', '1'],
+    ]
+    assert redis_backend.fake.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_negative_caching_and_add(redis_backend):
+    cache = Cache(redis_backend, 'test', ttl=10, negative_ttl=5)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+
+    await cache.get_or_load('missing', loader)
+    await cache.get_or_load('missing', loader)
+
+    assert len(calls) == 1
+    assert await cache.add('k', 'first')
+    assert not await cache.add('k', 'second')
+    assert await cache.get('k') == 'first'
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_down_degrades_to_misses(redis_backend, caplog):
+    redis_backend.fake.server.close()
+    await redis_backend.fake.server.wait_closed()
+    cache = Cache(redis_backend, 'test', ttl=10)
+
+    async def loader():
+        return 'fresh'
+
+    assert await cache.get_or_load('a', loader) == 'fresh'
+    assert 'cache get failed' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_version_map_bump_is_seen_by_other_workers(redis_backend):
+    port = redis_backend.fake.server.sockets[0].getsockname()[1]
+    other_backend = RedisBackend(f'redis://:secret@127.0.0.1:{port}/1')
+    versions = VersionMap(Cache(redis_backend, 'version', ttl=10))
+    other_versions = VersionMap(Cache(other_backend, 'version', ttl=10))
+    first = await versions.get(1)
+
+    assert await other_versions.get(1) == first
+
+    await other_versions.bump(1)
+
+    assert await versions.get(1) == await other_versions.get(1) != first
+    await other_backend.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_caps_open_connections(redis_backend):
+    port = redis_backend.fake.server.sockets[0].getsockname()[1]
+    backend = RedisBackend(f'redis://127.0.0.1:{port}', max_connections=2)
+    cache = Cache(backend, 'test', ttl=10)
+
+    await asyncio.gather(*(cache.get(n) for n in range(20)))
+    await backend.close()
+
+    assert redis_backend.fake.connections == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_clear_keeps_shared_entries(redis_backend):
+    cache = Cache(redis_backend, 'test', ttl=10)
+    await cache.set('a', 1)
+    await cache.get('a')
+
+    cache.clear()
+
+    assert cache.hits == 0
+    assert await cache.get('a') == 1
@@ -0,0 +1,230 @@
+from time import monotonic
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.util import greenlet_spawn
+
+from fast_async.cache import Cache, MemoryBackend
+from fast_async.database import (
+    PoolMetrics,
+    ReadYourWrites,
+    RoutingSession,
+    build_engine,
+    dispose_after_fork,
+    track_principal,
+    warm_up_pool,
+)
+from fast_async.models import User
+
+
+@pytest.fixture
+def pool_settings(settings):
+    return settings.model_copy(
+        update={
+            'DATABASE_POOL_SIZE': 3,
+            'DATABASE_MAX_OVERFLOW': 1,
+            'DATABASE_STATEMENT_TIMEOUT_MS': 1500,
+            'DATABASE_PREPARED_STATEMENT_CACHE_SIZE': 7,
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_build_engine_applies_settings(engine, pool_settings):
+    tuned = build_engine(engine.url, pool_settings)
+
+    async with tuned.connect() as conn:
+        timeout = await conn.scalar(text('SHOW statement_timeout'))
+        raw = await conn.get_raw_connection()
+        prepared_max = raw.driver_connection.prepared_max
+
+    await tuned.dispose()
+
+    assert tuned.pool.size() == pool_settings.DATABASE_POOL_SIZE
+    assert timeout == '1500ms'
+    assert prepared_max == pool_settings.DATABASE_PREPARED_STATEMENT_CACHE_SIZE
+
+
+@pytest.mark.asyncio
+async def test_warm_up_pool_opens_connections(engine, pool_settings):
+    tuned = build_engine(engine.url, pool_settings)
+    metrics = PoolMetrics(tuned)
+
+    await warm_up_pool(tuned, pool_settings.DATABASE_POOL_SIZE)
+    snapshot = metrics.snapshot()
+    await tuned.dispose()
+
+    assert snapshot['connects'] == pool_settings.DATABASE_POOL_SIZE
+    assert snapshot['checked_in'] == pool_settings.DATABASE_POOL_SIZE
+    assert snapshot['checked_out'] == 0
+
+
+@pytest.mark.asyncio
+async def test_dispose_after_fork_keeps_parent_connections_open(
+    engine, pool_settings, monkeypatch
+):
+    tuned = build_engine(engine.url, pool_settings)
+    async with tuned.connect() as conn:
+        raw = await conn.get_raw_connection()
+        inherited = raw.driver_connection
+    monkeypatch.setattr('fast_async.database.engine', tuned)
+
+    dispose_after_fork()
+
+    assert tuned.pool.checkedin() == 0
+    assert not inherited.closed
+
+    await inherited.close()
+    await tuned.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_track_overflow(engine, pool_settings):
+    tuned = build_engine(engine.url, pool_settings)
+    metrics = PoolMetrics(tuned)
+
+    connections = [
+        await tuned.connect()
+        for _ in range(pool_settings.DATABASE_POOL_SIZE + 1)
+    ]
+    snapshot = metrics.snapshot()
+    for conn in connections:
+        await conn.close()
+    await tuned.dispose()
+
+    assert snapshot['overflow'] == 1
+    assert snapshot['checkouts'] == pool_settings.DATABASE_POOL_SIZE + 1
+    assert metrics.checkins == pool_settings.DATABASE_POOL_SIZE + 1
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest_asyncio.fixture
+async def replica(engine, settings):
+    # One Postgres instance plays both roles through a second engine.
+    replica = build_engine(engine.url, settings)
+    yield replica
+    await replica.dispose()
+
+
+def routing_session(engine, replica, read_your_writes, **kwargs):
+    return AsyncSession(
+        sync_session_class=RoutingSession,
+        primary=engine,
+        replica=replica,
+        read_your_writes=read_your_writes,
+        **kwargs,
+    )
+
+
+def read_bind(routed, clause):
+    # Pins are looked up through the async cache, from the greenlet.
+    return routed.run_sync(lambda sync: sync.get_bind(clause=clause))
+
+
+def pin_cache(window, timer=monotonic):
+    return Cache(MemoryBackend(100, timer=timer), 'replica-pin', ttl=window)
+
+
+@pytest.mark.asyncio
+async def test_read_only_session_reads_from_replica(engine, replica):
+    async with routing_session(
+        engine, replica, ReadYourWrites(5), info={'read_only': True}
+    ) as routed:
+        track_principal(routed, 'alice@test.com')
+
+        assert await read_bind(routed, select(User)) is replica.sync_engine
+        assert (
+            await read_bind(routed, update(User).values(username='a'))
+            is engine.sync_engine
+        )
+        assert await read_bind(routed, select(User)) is engine.sync_engine
+
+
+@pytest.mark.usefixtures('truncate')
+@pytest.mark.asyncio
+async def test_write_session_uses_primary_and_pins_principal(engine, replica):
+    read_your_writes = ReadYourWrites(5, pin_cache(5))
+
+    async with routing_session(engine, replica, read_your_writes) as routed:
+        track_principal(routed, 'alice@test.com')
+        assert await read_bind(routed, select(User)) is engine.sync_engine
+
+        await routed.execute(
+            insert(User).values(username='a', email='a@a.com', password='a')
+        )
+        await routed.commit()
+
+    assert await greenlet_spawn(read_your_writes.pinned, {'alice@test.com'})
+    assert not await greenlet_spawn(read_your_writes.pinned, {'bob@test.com'})
+
+
+@pytest.mark.asyncio
+async def test_pinned_principal_reads_from_primary_until_window_ends(
+    engine, replica
+):
+    timer = FakeTimer()
+    read_your_writes = ReadYourWrites(5, pin_cache(5, timer=timer))
+    await greenlet_spawn(read_your_writes.mark, {'alice@test.com'})
+
+    async with routing_session(
+        engine, replica, read_your_writes, info={'read_only': True}
+    ) as routed:
+        track_principal(routed, 'alice@test.com')
+        assert await read_bind(routed, select(User)) is engine.sync_engine
+
+        timer.now = 5
+        assert await read_bind(routed, select(User)) is replica.sync_engine
+
+
+@pytest.mark.asyncio
+async def test_pins_are_bounded_and_shared_between_workers():
+    backend = MemoryBackend(2)
+    worker = ReadYourWrites(5, Cache(backend, 'replica-pin', ttl=5))
+    other_worker = ReadYourWrites(5, Cache(backend, 'replica-pin', ttl=5))
+
+    for principal in ('alice@test.com', 'bob@test.com', 'carol@test.com'):
+        await greenlet_spawn(worker.mark, {principal})
+
+    assert await greenlet_spawn(other_worker.pinned, {'carol@test.com'})
+    assert not await greenlet_spawn(other_worker.pinned, {'alice@test.com'})
+
+
+@pytest.mark.usefixtures('truncate')
+@pytest.mark.asyncio
+async def test_lsn_check_releases_pin_once_replica_caught_up(engine, replica):
+    read_your_writes = ReadYourWrites(60, pin_cache(60))
+
+    async with routing_session(
+        engine, replica, read_your_writes, lsn_check=True
+    ) as routed:
+        track_principal(routed, 'alice@test.com')
+        await routed.execute(
+            insert(User).values(username='a', email='a@a.com', password='a')
+        )
+        await routed.commit()
+
+    assert await greenlet_spawn(read_your_writes.pinned, {'alice@test.com'})
+
+    async with routing_session(
+        engine,
+        replica,
+        read_your_writes,
+        lsn_check=True,
+        info={'read_only': True},
+    ) as routed:
+        track_principal(routed, 'alice@test.com')
+        bind = await read_bind(routed, select(User))
+
+    assert bind is replica.sync_engine
+    assert not await greenlet_spawn(
+        read_your_writes.pinned, {'alice@test.com'}
+    )
@@ -2,7 +2,9 @@ from dataclasses import asdict
 
 import pytest
 from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from fast_async.models import User
 
@@ -18,7 +20,9 @@ async def test_add_db(session: AsyncSession, mock_db_time):
         await session.commit()
 
         user = await session.scalar(
-            select(User).where(User.username == 'Luiz')
+            select(User)
+            .where(User.username == 'Luiz')
+            .options(selectinload(User.todos))
         )
 
     assert asdict(user) == {
@@ -28,5 +32,18 @@ async def test_add_db(session: AsyncSession, mock_db_time):
         'password': 'LuizTeste',
         'created_at': time,
         'updated_at': time,
+        'token_version': 0,
         'todos': [],
     }
+
+
+@pytest.mark.asyncio
+async def test_user_todos_is_not_loaded_implicitly(session, user):
+    db_user = await session.scalar(
+        select(User)
+        .where(User.id == user.id)
+        .execution_options(populate_existing=True)
+    )
+
+    with pytest.raises(InvalidRequestError):
+        db_user.todos
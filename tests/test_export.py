@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import tracemalloc
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import text
+
+from fast_async.export import export_todos
+from tests.test_todos import TodoFactory
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson(session, client, user, token):
+    session.add_all(TodoFactory.create_batch(3, user_id=user.id))
+    await session.commit()
+
+    response = client.get(
+        '/todos/export', headers={'authorization': f'Bearer {token}'}
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [row['id'] for row in rows] == [1, 2, 3]
+    assert set(rows[0]) == {
+        'id',
+        'title',
+        'description',
+        'state',
+        'created_at',
+        'updated_at',
+    }
+
+
+@pytest.mark.asyncio
+async def test_export_csv(session, client, user, other_user, token):
+    session.add_all(TodoFactory.create_batch(2, user_id=user.id))
+    session.add(TodoFactory(user_id=other_user.id))
+    await session.commit()
+
+    response = client.get(
+        '/todos/export?format=csv',
+        headers={'authorization': f'Bearer {token}'},
+    )
+    header, *rows = csv.reader(io.StringIO(response.text))
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/csv')
+    assert header == [
+        'id',
+        'title',
+        'description',
+        'state',
+        'created_at',
+        'updated_at',
+    ]
+    assert [row[0] for row in rows] == ['1', '2']
+
+
+@pytest.mark.asyncio
+async def test_export_streams_in_constant_memory(session, user):
+    total = 100_000
+    # The whole export is ~15 MiB of NDJSON and several times that as
+    # ORM objects; a stream only ever holds a chunk of it.
+    memory_ceiling = 4 * 1024 * 1024
+    await session.execute(
+        text(
+            'INSERT INTO todos (title, description, state, user_id) '
+            "SELECT 'todo ' || n, 'description ' || n, 'todo', :user_id "
+            'FROM generate_series(1, :total) AS n'
+        ),
+        {'user_id': user.id, 'total': total},
+    )
+    await session.commit()
+
+    exported_rows = 0
+    tracemalloc.start()
+    try:
+        async for chunk in export_todos(session, user.id, 'ndjson'):
+            exported_rows += chunk.count('\n')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert exported_rows == total
+    assert peak < memory_ceiling
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from dataclasses import asdict
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from fast_async import database, hashing
+from fast_async.app import app
+from fast_async.hashing import (
+    HashCost,
+    HashingPool,
+    calibrate_time_cost,
+    get_password_hash,
+    get_password_hash_async,
+    hash_cost,
+    hash_if_changed_async,
+    needs_rehash,
+    verify_password,
+    verify_password_async,
+)
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_on_the_pool():
+    hashed = await get_password_hash_async('secret')
+
+    assert await verify_password_async('secret', hashed)
+    assert not await verify_password_async('other', hashed)
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_rejects_when_saturated():
+    pool = HashingPool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc:
+        await pool.run(release.wait)
+
+    release.set()
+    await asyncio.gather(*running)
+
+    assert exc.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert pool.rejected == 1
+    assert pool.in_flight == 0
+
+
+def test_calibrate_time_cost_stays_within_target():
+    slow = calibrate_time_cost(1000, memory_cost=1024, parallelism=1)
+    fast = calibrate_time_cost(0.001, memory_cost=1024, parallelism=1)
+
+    assert slow > 1
+    assert fast == 1
+
+
+def test_only_weaker_hashes_need_rehash():
+    weaker = HashCost(1, hash_cost.memory_cost, hash_cost.parallelism)
+    stronger = HashCost(
+        hash_cost.time_cost + 1, hash_cost.memory_cost, hash_cost.parallelism
+    )
+
+    def hash_with(cost):
+        return PasswordHash((Argon2Hasher(**asdict(cost)),)).hash('secret')
+
+    assert needs_rehash(hash_with(weaker))
+    assert not needs_rehash(get_password_hash('secret'))
+    assert not needs_rehash(hash_with(stronger))
+
+
+@pytest.mark.asyncio
+async def test_hash_if_changed():
+    hashed = get_password_hash('secret')
+
+    assert await hash_if_changed_async('secret', hashed) is None
+    assert verify_password(
+        'other', await hash_if_changed_async('other', hashed)
+    )
+
+
+def test_startup_calibrates_hash_cost(monkeypatch):
+    monkeypatch.setattr(database.settings, 'DATABASE_POOL_WARMUP', False)
+    monkeypatch.setattr(database.settings, 'PASSWORD_HASH_TARGET_MS', 0.001)
+    original = hashing.hash_cost
+
+    with TestClient(app):
+        calibrated = hashing.hash_cost
+    hashing.use_hash_cost(original)
+
+    assert calibrated.time_cost == 1
+    assert calibrated.memory_cost == original.memory_cost
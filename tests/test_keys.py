@@ -0,0 +1,100 @@
+import json
+from http import HTTPStatus
+
+import pytest
+from jwt import InvalidTokenError, PyJWK, decode, get_unverified_header
+
+from fast_async.keys import KeyRing, generate_jwk, load_key_ring
+
+
+@pytest.fixture
+def jwks():
+    return {
+        'keys': [generate_jwk('EdDSA', 'old'), generate_jwk('ES256', 'new')]
+    }
+
+
+def test_secret_key_ring_signs_without_kid(settings):
+    ring = KeyRing.from_secret(settings.SECRET_KEY, settings.ALGORITHM)
+
+    token = ring.sign({'sub': 'a'})
+
+    assert 'kid' not in get_unverified_header(token)
+    assert ring.verify(token) == {'sub': 'a'}
+    assert ring.public_jwks() == {'keys': []}
+
+
+@pytest.mark.parametrize('active', ['old', 'new'])
+def test_jwks_key_ring_signs_with_active_kid(jwks, active):
+    ring = KeyRing.from_jwks(jwks, active)
+
+    token = ring.sign({'sub': 'a'})
+
+    assert get_unverified_header(token)['kid'] == active
+    assert ring.verify(token) == {'sub': 'a'}
+
+
+def test_key_ring_rotation_keeps_old_tokens_valid(jwks):
+    before = KeyRing.from_jwks({'keys': jwks['keys'][:1]})
+    token = before.sign({'sub': 'a'})
+
+    after = KeyRing.from_jwks(jwks, 'new')
+
+    assert after.verify(token) == {'sub': 'a'}
+
+
+def test_key_ring_rejects_unknown_kid(jwks):
+    token = KeyRing.from_jwks(jwks, 'new').sign({'sub': 'a'})
+    retired = KeyRing.from_jwks({'keys': jwks['keys'][:1]})
+
+    with pytest.raises(InvalidTokenError):
+        retired.verify(token)
+
+
+def test_public_jwks_verifies_without_private_keys(jwks):
+    ring = KeyRing.from_jwks(jwks, 'new')
+    token = ring.sign({'sub': 'a'})
+
+    public = {jwk['kid']: jwk for jwk in ring.public_jwks()['keys']}
+    key = PyJWK(public[get_unverified_header(token)['kid']])
+
+    assert all('d' not in jwk for jwk in public.values())
+    assert decode(token, key.key, algorithms=[key.algorithm_name]) == {
+        'sub': 'a'
+    }
+
+
+def test_load_key_ring_from_file(jwks, settings, tmp_path):
+    keys_file = tmp_path / 'jwks.json'
+    keys_file.write_text(json.dumps(jwks), encoding='utf-8')
+
+    ring = load_key_ring(
+        settings.model_copy(
+            update={'JWT_KEYS_FILE': str(keys_file), 'JWT_ACTIVE_KID': 'new'}
+        )
+    )
+
+    assert ring.active.kid == 'new'
+    assert ring.active.algorithm == 'ES256'
+
+
+def test_jwks_endpoint_and_login_with_asymmetric_keys(
+    client, user, jwks, monkeypatch
+):
+    ring = KeyRing.from_jwks(jwks, 'new')
+    monkeypatch.setattr('fast_async.security.key_ring', ring)
+    monkeypatch.setattr('fast_async.routers.auth.key_ring', ring)
+
+    published = client.get('/auth/jwks')
+    token = client.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    ).json()['token_access']
+    resultado = client.get(
+        '/todos/', headers={'authorization': f'Bearer {token}'}
+    )
+
+    assert published.json() == ring.public_jwks()
+    assert 'max-age' in published.headers['cache-control']
+    assert get_unverified_header(token)['alg'] == 'ES256'
+    assert resultado.status_code == HTTPStatus.OK
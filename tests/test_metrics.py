@@ -0,0 +1,133 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import StatementError
+
+from fast_async import metrics
+from fast_async.database import build_engine
+from fast_async.metrics import Histogram, monitor_loop_lag, registry
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    registry.clear()
+
+
+def _sample(text, line_start):
+    (line,) = [
+        line for line in text.splitlines() if line.startswith(line_start)
+    ]
+    return float(line.rsplit(' ', 1)[1])
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('latency', 'Help.', (0.1, 1), labels=('route',))
+
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, '/a"b')
+
+    assert histogram.render() == [
+        '# HELP latency Help.',
+        '# TYPE latency histogram',
+        'latency_bucket{route="/a\\"b",le="0.1"} 2',
+        'latency_bucket{route="/a\\"b",le="1"} 3',
+        'latency_bucket{route="/a\\"b",le="+Inf"} 4',
+        'latency_sum{route="/a\\"b"} 3.65',
+        'latency_count{route="/a\\"b"} 4',
+    ]
+
+
+def test_request_metrics_by_route_template(client, user, token):
+    client.get(
+        f'/users/{user.id}', headers={'authorization': f'Bearer {token}'}
+    )
+
+    response = client.get('/metrics')
+    text = response.text
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/plain')
+    assert (
+        _sample(
+            text,
+            'http_request_duration_seconds_count'
+            '{method="GET",route="/users/{user_id}",status="200"}',
+        )
+        == 1
+    )
+    assert (
+        _sample(
+            text,
+            'http_request_sql_statements_sum{route="/users/{user_id}"}',
+        )
+        >= 1
+    )
+    assert (
+        _sample(
+            text,
+            'http_request_sql_duration_seconds_sum{route="/users/{user_id}"}',
+        )
+        > 0
+    )
+    assert 'password_hash_in_flight 0' in text
+
+
+def test_unmatched_routes_share_one_label(client):
+    expected_requests = 2
+    client.get('/nao-existe/1')
+    client.get('/nao-existe/2')
+
+    text = client.get('/metrics').text
+
+    assert (
+        _sample(
+            text,
+            'http_request_duration_seconds_count'
+            '{method="GET",route="<unmatched>",status="404"}',
+        )
+        == expected_requests
+    )
+
+
+@pytest.mark.asyncio
+async def test_pool_wait_is_recorded(engine, settings):
+    tuned = build_engine(engine.url, settings)
+    stats = metrics.RequestStats()
+    token = metrics.current_request.set(stats)
+
+    async with tuned.connect():
+        pass
+
+    metrics.current_request.reset(token)
+    await tuned.dispose()
+
+    assert metrics.pool_wait.render()[-1] == 'db_pool_wait_seconds_count 1'
+    assert stats.pool_wait_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_error_before_execute_keeps_original_exception(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text('SELECT 1'))
+
+        # Fails building the statement, before any cursor execute.
+        with pytest.raises(StatementError, match='bind parameter'):
+            await conn.execute(text('SELECT :missing'))
+
+        assert await conn.scalar(text('SELECT 1')) == 1
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_is_sampled():
+    blocked = 0.1
+    monitor = asyncio.create_task(monitor_loop_lag(0.01))
+    await asyncio.sleep(0.02)
+    time.sleep(blocked)
+    await asyncio.sleep(0.02)
+    monitor.cancel()
+
+    total = float(metrics.loop_lag.render()[-2].rsplit(' ', 1)[1])
+    assert total >= blocked / 2
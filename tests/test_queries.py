@@ -0,0 +1,214 @@
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import func, select
+
+from fast_async.models import Todo
+from tests.test_todos import TodoFactory
+
+
+@pytest.mark.asyncio
+async def test_list_todos_statements(
+    session, user, token, client, capture_sql
+):
+    session.add_all(TodoFactory.create_batch(20, user_id=user.id))
+    await session.commit()
+
+    expected_statements = 2
+
+    with capture_sql() as statements:
+        response = client.get(
+            '/todos/', headers={'authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == expected_statements
+
+
+@pytest.mark.asyncio
+async def test_read_users_statements(
+    session, user, token, client, capture_sql
+):
+    session.add_all(TodoFactory.create_batch(20, user_id=user.id))
+    await session.commit()
+
+    expected_statements = 2
+
+    with capture_sql() as statements:
+        response = client.get(
+            '/users/', headers={'authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == expected_statements
+
+
+def test_read_user_statements(user, token, client, capture_sql):
+    expected_statements = 2
+
+    with capture_sql() as statements:
+        response = client.get(
+            f'/users/{user.id}', headers={'authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == expected_statements
+
+
+def test_statements_do_not_touch_todos(user, token, client, capture_sql):
+    with capture_sql() as statements:
+        client.get('/users/', headers={'authorization': f'Bearer {token}'})
+        client.get('/todos/', headers={'authorization': f'Bearer {token}'})
+
+    assert not any(
+        'FROM todos' in statement and 'todos.user_id IN' in statement
+        for statement, _ in statements
+    )
+
+
+@pytest.mark.asyncio
+async def test_delete_user_with_todos(session, user, token, client):
+    session.add_all(TodoFactory.create_batch(3, user_id=user.id))
+    await session.commit()
+
+    response = client.delete(
+        f'/users/{user.id}', headers={'authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert not await session.scalar(select(func.count()).select_from(Todo))
+
+
+def test_created_user_single_statement(client, capture_sql):
+    with capture_sql() as statements:
+        response = client.post(
+            '/users/',
+            json={'username': 'a', 'email': 'a@a.com', 'password': 'a'},
+        )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'case',
+    [
+        ('POST', '/todos/', {'title': 't', 'description': 'd'}, 201),
+        ('PATCH', '/todos/1', {'title': 'new'}, 200),
+        ('PATCH', '/todos/99', {'title': 'new'}, 404),
+        ('DELETE', '/todos/1', None, 200),
+        ('DELETE', '/todos/99', None, 404),
+        (
+            'POST',
+            '/todos/batch',
+            {'todos': [{'title': 't', 'description': 'd'}] * 50},
+            201,
+        ),
+        ('PATCH', '/todos/batch', {'ids': [1], 'state': 'done'}, 200),
+        ('DELETE', '/todos/batch', {'ids': [1]}, 200),
+        ('DELETE', '/users/1', None, 200),
+    ],
+)
+async def test_write_endpoints_single_statement(
+    session, token, client, capture_sql, case
+):
+    method, url, body, status = case
+    session.add(TodoFactory())
+    await session.commit()
+    headers = {'authorization': f'Bearer {token}'}
+    client.get('/users/1', headers=headers)
+
+    with capture_sql() as statements:
+        response = client.request(method, url, json=body, headers=headers)
+
+    assert response.status_code == status
+    assert len(statements) == 1
+
+
+def test_update_user_reads_hash_then_updates(client, user, token, capture_sql):
+    headers = {'authorization': f'Bearer {token}'}
+    client.get('/users/1', headers=headers)
+
+    with capture_sql() as statements:
+        response = client.put(
+            f'/users/{user.id}',
+            json={'username': 'b', 'email': 'b@b.com', 'password': 'b'},
+            headers=headers,
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [sql.split()[0] for sql, _ in statements] == ['SELECT', 'UPDATE']
+    assert 'WHERE users.id =' in statements[0][0]
+
+
+async def _explain(engine, statement, parameters):
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql('SET enable_seqscan = off')
+        plan = await conn.exec_driver_sql(f'EXPLAIN {statement}', parameters)
+        return '\n'.join(row[0] for row in plan)
+
+
+@pytest.mark.asyncio
+async def test_todo_router_queries_use_indexes(
+    session, user, token, client, capture_sql
+):
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+    headers = {'authorization': f'Bearer {token}'}
+
+    with capture_sql() as statements:
+        next_cursor = client.get('/todos/?limit=2', headers=headers).json()[
+            'next_cursor'
+        ]
+        client.get(f'/todos/?limit=2&cursor={next_cursor}', headers=headers)
+        client.get('/todos/?state=todo&offset=1', headers=headers)
+        client.get('/todos/?title=test&description=test', headers=headers)
+        client.get('/todos/?search=test', headers=headers)
+        client.patch('/todos/1', json={'title': 'new'}, headers=headers)
+        client.delete('/todos/2', headers=headers)
+
+    queries = [
+        (statement, parameters)
+        for statement, parameters in statements
+        if statement.lstrip().startswith(('SELECT', 'UPDATE', 'DELETE'))
+    ]
+    assert queries
+
+    for statement, parameters in queries:
+        plan = await _explain(session.bind.engine, statement, parameters)
+        assert 'Seq Scan' not in plan, f'{statement}\n{plan}'
+
+
+@pytest.mark.asyncio
+async def test_list_todos_cached_page_statements(
+    session, user, token, client, capture_sql
+):
+    session.add_all(TodoFactory.create_batch(20, user_id=user.id))
+    await session.commit()
+
+    headers = {'authorization': f'Bearer {token}'}
+    etag = client.get('/todos/', headers=headers).headers['etag']
+
+    with capture_sql() as statements:
+        cached = client.get('/todos/', headers=headers)
+        not_modified = client.get(
+            '/todos/', headers={**headers, 'if-none-match': etag}
+        )
+
+    assert cached.status_code == HTTPStatus.OK
+    assert cached.json()['todos']
+    assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+    assert not statements
+
+
+def test_user_reads_do_not_select_password(user, token, client, capture_sql):
+    headers = {'authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    with capture_sql() as statements:
+        client.get('/users/', headers=headers)
+        client.get(f'/users/{user.id}', headers=headers)
+
+    assert len(statements) == 2  # noqa: PLR2004
+    assert not any('password' in statement for statement, _ in statements)
@@ -0,0 +1,364 @@
+import hashlib
+import math
+import os
+import time
+import uuid
+from http import HTTPStatus
+
+import pytest
+import pytest_asyncio
+
+from fast_async import hashing
+from fast_async.cache import RedisBackend
+from fast_async.ratelimit import (
+    CHECK_SCRIPT,
+    RECORD_FAILURE_SCRIPT,
+    SCRIPT_SHAS,
+    Bucket,
+    LoginLimiter,
+    MemoryLimitStore,
+    RedisLimitStore,
+)
+from fast_async.routers.auth import login_limiter
+from tests.test_cache import FakeRedis
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = MemoryLimitStore(maxsize=10, timer=clock)
+    bucket = Bucket('ip:1', rate=0.5, burst=3)
+
+    allowed = [await store.check([bucket], 'f', 10, 60) for _ in range(3)]
+    rejected = await store.check([bucket], 'f', 10, 60)
+
+    assert allowed == [0, 0, 0]
+    assert rejected == pytest.approx(2)
+
+    clock.now += 2
+    assert await store.check([bucket], 'f', 10, 60) == 0
+
+
+@pytest.mark.asyncio
+async def test_bucket_is_per_key():
+    store = MemoryLimitStore(maxsize=10, timer=FakeClock())
+    first = Bucket('ip:1', rate=1, burst=1)
+    second = Bucket('ip:2', rate=1, burst=1)
+
+    await store.check([first], 'f', 10, 60)
+
+    assert await store.check([first], 'f', 10, 60) > 0
+    assert await store.check([second], 'f', 10, 60) == 0
+
+
+@pytest.mark.asyncio
+async def test_rejected_attempt_takes_no_tokens():
+    store = MemoryLimitStore(maxsize=10, timer=FakeClock())
+    ip = Bucket('ip:1', rate=1, burst=5)
+    account = Bucket('account:a', rate=1, burst=1)
+
+    await store.check([ip, account], 'f', 10, 60)
+    for _ in range(3):
+        assert await store.check([ip, account], 'f', 10, 60) > 0
+
+    other = Bucket('account:b', rate=1, burst=5)
+    allowed = [await store.check([ip, other], 'f', 10, 60) for _ in range(4)]
+    assert allowed == [0, 0, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_lockout_slides_with_oldest_failure():
+    clock = FakeClock()
+    store = MemoryLimitStore(maxsize=10, timer=clock)
+    limit, window = 3, 60
+
+    for _ in range(limit):
+        await store.record_failure('f', window)
+        clock.now += 10
+
+    assert await store.check([], 'f', limit, window) == pytest.approx(30)
+
+    clock.now += 30
+    assert await store.check([], 'f', limit, window) == 0
+
+    await store.record_failure('f', window)
+    assert await store.check([], 'f', limit, window) > 0
+
+    await store.reset('f')
+    assert await store.check([], 'f', limit, window) == 0
+
+
+class FakeLimitRedis(FakeRedis):
+    """Runs the rate limit scripts as Python."""
+
+    def __init__(self):
+        super().__init__()
+        self.buckets = {}
+        self.zsets = {}
+        self.scripts = {}
+
+    def cmd_evalsha(self, sha, count, *args):
+        if sha not in self.scripts:
+            return b'-NOSCRIPT No matching script.\r\n'
+        return self.cmd_eval(self.scripts[sha], count, *args)
+
+    def cmd_eval(self, script, count, *args):
+        self.scripts[hashlib.sha1(script.encode()).hexdigest()] = script
+        keys, args = args[: int(count)], args[int(count) :]
+        if script == RECORD_FAILURE_SCRIPT:
+            self.zsets.setdefault(keys[0], {})[args[1]] = time.time()
+            return b':1\r\n'
+
+        now = time.time()
+        limit, window = int(args[0]), float(args[1])
+        failures = sorted(
+            score
+            for score in self.zsets.get(keys[-1], {}).values()
+            if score > now - window
+        )
+        retry_after = 0
+        if len(failures) >= limit:
+            retry_after = failures[-limit] + window - now
+
+        tokens = []
+        for i, key in enumerate(keys[:-1]):
+            rate, burst = float(args[2 + 2 * i]), int(args[3 + 2 * i])
+            level, updated_at = self.buckets.get(key, (burst, now))
+            level = min(burst, level + (now - updated_at) * rate)
+            if level < 1:
+                retry_after = max(retry_after, (1 - level) / rate)
+            tokens.append(level)
+
+        taken = 0 if retry_after > 0 else 1
+        for key, level in zip(keys, tokens):
+            self.buckets[key] = (level - taken, now)
+
+        value = str(retry_after).encode()
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def cmd_del(self, *keys):
+        for key in keys:
+            self.zsets.pop(key, None)
+        return super().cmd_del(*keys)
+
+
+@pytest_asyncio.fixture
+async def redis_limiter(settings):
+    fake = FakeLimitRedis()
+    port = await fake.start()
+    backend = RedisBackend(f'redis://127.0.0.1:{port}')
+    settings.LOGIN_ACCOUNT_BURST = 2
+    settings.LOGIN_LOCKOUT_FAILURES = 2
+    limiter = LoginLimiter(RedisLimitStore(backend), settings)
+    limiter.fake = fake
+
+    yield limiter
+
+    await backend.close()
+    fake.server.close()
+    await fake.server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_redis_store_checks_in_one_round_trip(redis_limiter):
+    await redis_limiter.check('10.0.0.1', 'A@test.com')
+    assert await redis_limiter.check('10.0.0.1', 'A@test.com') == 0
+
+    (command,) = redis_limiter.fake.batches[-1]
+    assert command[:6] == [
+        'EVALSHA',
+        SCRIPT_SHAS[CHECK_SCRIPT],
+        '3',
+        'login:ip:10.0.0.1',
+        'login:account:a@test.com',
+        'login:failures:a@test.com',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_redis_store_loads_scripts_once(redis_limiter):
+    for _ in range(3):
+        await redis_limiter.check('10.0.0.1', 'a@test.com')
+        await redis_limiter.failed('a@test.com')
+
+    commands = [c[0] for batch in redis_limiter.fake.batches for c in batch]
+    assert commands.count('EVAL') == 2  # noqa: PLR2004
+    assert commands.count('EVALSHA') == 6  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_redis_store_bucket_and_lockout(redis_limiter):
+    ip, account = '10.0.0.1', 'a@test.com'
+
+    await redis_limiter.check(ip, account)
+    await redis_limiter.check(ip, account)
+    assert await redis_limiter.check(ip, account) > 0
+
+    redis_limiter.fake.buckets.clear()
+    await redis_limiter.failed(account)
+    await redis_limiter.failed(account)
+    retry_after = await redis_limiter.check(ip, account)
+
+    assert retry_after == pytest.approx(
+        redis_limiter.config.LOGIN_LOCKOUT_WINDOW_SECONDS, abs=1
+    )
+
+    redis_limiter.fake.buckets.clear()
+    await redis_limiter.succeeded(account)
+    assert await redis_limiter.check(ip, account) == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_store_down_fails_open(redis_limiter, caplog):
+    redis_limiter.fake.server.close()
+    await redis_limiter.fake.server.wait_closed()
+
+    assert await redis_limiter.check('10.0.0.1', 'a@test.com') == 0
+    assert 'login rate limit check failed' in caplog.text
+
+
+@pytest.fixture(scope='module')
+def redis_url():
+    # TEST_REDIS_URL points at a running server, e.g. where there is no
+    # container runtime. Without either, the real scripts are not run.
+    if url := os.environ.get('TEST_REDIS_URL'):
+        yield url
+        return
+
+    container = pytest.importorskip('testcontainers.core.container')
+    waiting = pytest.importorskip('testcontainers.core.waiting_utils')
+    docker_errors = pytest.importorskip('docker.errors')
+    redis = container.DockerContainer('redis:7').with_exposed_ports(6379)
+    try:
+        redis.start()
+    except docker_errors.DockerException as exc:
+        pytest.skip(f'no container runtime: {exc}')
+    try:
+        waiting.wait_for_logs(redis, 'Ready to accept connections')
+        host, port = (
+            redis.get_container_host_ip(),
+            redis.get_exposed_port(6379),
+        )
+        yield f'redis://{host}:{port}'
+    finally:
+        redis.stop()
+
+
+@pytest_asyncio.fixture
+async def real_redis_limiter(settings, redis_url):
+    backend = RedisBackend(redis_url)
+    settings.LOGIN_ACCOUNT_BURST = 2
+    settings.LOGIN_LOCKOUT_FAILURES = 2
+    # Keys of their own, so runs against a shared server do not collide.
+    limiter = LoginLimiter(
+        RedisLimitStore(backend, namespace=f'test-{uuid.uuid4().hex}'),
+        settings,
+    )
+
+    yield limiter
+
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_scripts_limit_attempts(real_redis_limiter):
+    ip, account = '10.0.0.1', 'a@test.com'
+    burst = real_redis_limiter.config.LOGIN_ACCOUNT_BURST
+    rate = real_redis_limiter.config.LOGIN_ACCOUNT_RATE_PER_MINUTE / 60
+
+    allowed = [
+        await real_redis_limiter.check(ip, account) for _ in range(burst)
+    ]
+    retry_after = await real_redis_limiter.check(ip, account)
+
+    assert allowed == [0] * burst
+    assert 0 < retry_after <= 1 / rate
+    # A rejected attempt takes no tokens, so the wait does not grow.
+    assert await real_redis_limiter.check(ip, account) <= retry_after
+    assert await real_redis_limiter.check(ip, 'b@test.com') == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_scripts_lock_out_and_reset(real_redis_limiter):
+    ip, account = '10.0.0.1', 'a@test.com'
+    window = real_redis_limiter.config.LOGIN_LOCKOUT_WINDOW_SECONDS
+
+    await real_redis_limiter.failed(account)
+    assert await real_redis_limiter.check(ip, account) == 0
+
+    await real_redis_limiter.failed(account)
+    assert await real_redis_limiter.check(ip, account) == pytest.approx(
+        window, abs=1
+    )
+
+    await real_redis_limiter.succeeded(account)
+    assert await real_redis_limiter.check(ip, account) == 0
+
+
+def test_login_rejected_before_lookup_and_hash(
+    client, user, capture_sql, monkeypatch
+):
+    burst = login_limiter.config.LOGIN_ACCOUNT_BURST
+    for _ in range(burst):
+        client.post(
+            '/auth/token', data={'username': user.email, 'password': 'x'}
+        )
+
+    verified = []
+    monkeypatch.setattr(
+        hashing, 'verify_password', lambda *args: verified.append(args)
+    )
+    with capture_sql() as statements:
+        response = client.post(
+            '/auth/token',
+            data={'username': user.email, 'password': user.clean_password},
+        )
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert response.json() == {'detail': 'Too many login attempts'}
+    retry_after = 60 / login_limiter.config.LOGIN_ACCOUNT_RATE_PER_MINUTE
+    assert 0 < int(response.headers['Retry-After']) <= math.ceil(retry_after)
+    assert statements == []
+    assert verified == []
+
+
+def test_lockout_after_repeated_failures(client, user, monkeypatch):
+    monkeypatch.setattr(login_limiter.config, 'LOGIN_ACCOUNT_BURST', 100)
+    monkeypatch.setattr(login_limiter.config, 'LOGIN_IP_BURST', 100)
+    monkeypatch.setattr(login_limiter.config, 'LOGIN_LOCKOUT_FAILURES', 3)
+
+    for _ in range(3):
+        response = client.post(
+            '/auth/token', data={'username': user.email, 'password': 'x'}
+        )
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    response = client.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response.headers['Retry-After']) > 0
+
+
+def test_successful_login_resets_failures(client, user, monkeypatch):
+    monkeypatch.setattr(login_limiter.config, 'LOGIN_ACCOUNT_BURST', 100)
+    monkeypatch.setattr(login_limiter.config, 'LOGIN_IP_BURST', 100)
+    monkeypatch.setattr(login_limiter.config, 'LOGIN_LOCKOUT_FAILURES', 2)
+    wrong = {'username': user.email, 'password': 'x'}
+    right = {'username': user.email, 'password': user.clean_password}
+
+    client.post('/auth/token', data=wrong)
+    assert client.post('/auth/token', data=right).status_code == HTTPStatus.OK
+
+    client.post('/auth/token', data=wrong)
+    assert client.post('/auth/token', data=right).status_code == HTTPStatus.OK
@@ -1,8 +1,15 @@
 from http import HTTPStatus
 
+import pytest
 from jwt import decode
+from sqlalchemy import update
 
-from fast_async.security import create_access_token
+from fast_async.models import User
+from fast_async.security import (
+    create_access_token,
+    principal_cache,
+    token_versions,
+)
 
 
 def test_jwt(settings):
@@ -23,3 +30,238 @@ def test_jwt_invalid(client):
 
     assert resultado.status_code == HTTPStatus.UNAUTHORIZED
     assert resultado.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_current_user_is_cached_after_first_request(
+    client, token, capture_sql
+):
+    client.get('/users/1', headers={'authorization': f'Bearer {token}'})
+
+    with capture_sql() as statements:
+        resultado = client.get(
+            '/users/1', headers={'authorization': f'Bearer {token}'}
+        )
+
+    assert resultado.status_code == HTTPStatus.OK
+    assert len(statements) == 1
+    assert principal_cache.hits == 1
+    assert principal_cache.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_principal_leaves_out_password_hash(client, user, token):
+    client.get('/users/1', headers={'authorization': f'Bearer {token}'})
+
+    snapshot = await principal_cache.get(user.email)
+
+    assert snapshot['id'] == user.id
+    assert 'password' not in snapshot
+
+
+def test_update_user_invalidates_cached_principal(client, user, token):
+    client.get('/users/1', headers={'authorization': f'Bearer {token}'})
+
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'alice',
+            'email': 'alice@test.com',
+            'password': 'teste',
+        },
+        headers={'authorization': f'Bearer {token}'},
+    )
+    resultado = client.get(
+        '/users/1', headers={'authorization': f'Bearer {token}'}
+    )
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+    assert resultado.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_delete_user_invalidates_cached_principal(client, user, token):
+    client.get('/users/1', headers={'authorization': f'Bearer {token}'})
+
+    client.delete(
+        f'/users/{user.id}', headers={'authorization': f'Bearer {token}'}
+    )
+    resultado = client.get(
+        '/users/1', headers={'authorization': f'Bearer {token}'}
+    )
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+    assert resultado.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_unknown_principal_is_negatively_cached(client, capture_sql):
+    token = create_access_token({'sub': 'ghost@test.com'})
+    headers = {'authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    with capture_sql() as statements:
+        resultado = client.get('/users/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+    assert not statements
+
+
+def test_created_user_drops_cached_miss(client):
+    token = create_access_token({'sub': 'ghost@test.com'})
+    headers = {'authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    client.post(
+        '/users/',
+        json={
+            'username': 'ghost',
+            'email': 'ghost@test.com',
+            'password': 'secret',
+        },
+    )
+    resultado = client.get('/users/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.OK
+
+
+@pytest.fixture
+def stateless(monkeypatch):
+    monkeypatch.setattr('fast_async.security.settings.AUTH_STATELESS', True)
+
+
+def test_token_carries_user_id_and_version(client, user, token, settings):
+    decoded = decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+    assert decoded['sub'] == user.email
+    assert decoded['uid'] == user.id
+    assert decoded['ver'] == 0
+
+
+@pytest.mark.usefixtures('stateless')
+def test_stateless_auth_skips_user_lookup(client, user, token, capture_sql):
+    headers = {'authorization': f'Bearer {token}'}
+    client.get(f'/users/{user.id}', headers=headers)
+
+    with capture_sql() as statements:
+        resultado = client.get(f'/users/{user.id}', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.OK
+    assert len(statements) == 1
+    assert 'token_version' not in statements[0][0]
+
+
+@pytest.mark.usefixtures('stateless')
+def test_stateless_auth_update_user_revokes_token(client, user, token):
+    headers = {'authorization': f'Bearer {token}'}
+
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'alice',
+            'email': user.email,
+            'password': 'teste',
+        },
+        headers=headers,
+    )
+    resultado = client.get('/todos/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.usefixtures('stateless')
+def test_stateless_auth_delete_user_revokes_token(client, user, token):
+    headers = {'authorization': f'Bearer {token}'}
+
+    client.delete(f'/users/{user.id}', headers=headers)
+    resultado = client.get('/todos/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.usefixtures('stateless')
+@pytest.mark.asyncio
+async def test_stateless_auth_rechecks_stale_version(
+    client, session, user, token
+):
+    headers = {'authorization': f'Bearer {token}'}
+    client.get('/todos/', headers=headers)
+
+    # Another worker revoked the token; our cached version then expires.
+    await session.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(token_version=User.token_version + 1)
+    )
+    await session.commit()
+    token_versions.clear()
+
+    resultado = client.get('/todos/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_stateless_auth_accepts_tokens_without_version(
+    client, user, stateless
+):
+    token = create_access_token({'sub': user.email})
+
+    resultado = client.get(
+        '/todos/', headers={'authorization': f'Bearer {token}'}
+    )
+
+    assert resultado.status_code == HTTPStatus.OK
+
+
+def test_update_user_revokes_token(client, user, token):
+    headers = {'authorization': f'Bearer {token}'}
+
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'alice',
+            'email': user.email,
+            'password': 'teste',
+        },
+        headers=headers,
+    )
+    resultado = client.get('/users/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.parametrize('auth_stateless', [False, True])
+def test_update_user_keeps_token_when_only_username_changes(
+    client, user, token, monkeypatch, auth_stateless
+):
+    monkeypatch.setattr(
+        'fast_async.security.settings.AUTH_STATELESS', auth_stateless
+    )
+    headers = {'authorization': f'Bearer {token}'}
+
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'alice',
+            'email': user.email,
+            'password': user.clean_password,
+        },
+        headers=headers,
+    )
+    resultado = client.get('/users/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.OK
+
+
+def test_update_user_email_revokes_token(client, user, token):
+    headers = {'authorization': f'Bearer {token}'}
+
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': user.username,
+            'email': 'alice@test.com',
+            'password': user.clean_password,
+        },
+        headers=headers,
+    )
+    resultado = client.get('/users/', headers=headers)
+
+    assert resultado.status_code == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,171 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from fast_async import hashing
+
+
+async def pid_app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while (await receive())['type'] != 'lifespan.shutdown':
+            await send({'type': 'lifespan.startup.complete'})
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'%d' % os.getpid()})
+
+
+async def cost_app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await pid_app(scope, receive, send)
+        return
+
+    body = '%d %s' % (
+        hashing.hash_cost.time_cost,
+        os.environ['PASSWORD_HASH_TIME_COST'],
+    )
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': body.encode()})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def launch():
+    processes = []
+
+    def start(*args, app='tests.test_server:pid_app', env=None):
+        port = free_port()
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                '-m',
+                'fast_async.server',
+                '--app',
+                app,
+                '--port',
+                str(port),
+                *args,
+            ],
+            env={
+                **os.environ,
+                'SERVER_MAX_REQUESTS_JITTER': '0',
+                'SERVER_GRACEFUL_TIMEOUT_SECONDS': '5',
+                # Needed for several workers; the test apps never connect.
+                'CACHE_URL': 'redis://127.0.0.1:1',
+                **(env or {}),
+            },
+        )
+        processes.append(process)
+        url = f'http://127.0.0.1:{port}/'
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(url)
+                return process, url
+            except httpx.TransportError:
+                time.sleep(0.1)
+        pytest.fail('server did not start')
+
+    yield start
+
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def worker_pids(url, requests):
+    return {httpx.get(url).text for _ in range(requests)}
+
+
+def test_server_recycles_workers_after_max_requests(launch):
+    _, url = launch('--workers', '2', '--max-requests', '3')
+
+    pids = worker_pids(url, 20)
+
+    assert len(pids) > 2  # noqa: PLR2004
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc')
+def test_server_does_not_leak_fds_when_recycling(launch):
+    process, url = launch('--workers', '1', '--max-requests', '1')
+    worker_pids(url, 5)
+    before = len(os.listdir(f'/proc/{process.pid}/fd'))
+
+    worker_pids(url, 20)
+
+    assert len(os.listdir(f'/proc/{process.pid}/fd')) <= before
+
+
+def test_server_refuses_workers_without_shared_cache():
+    env = {**os.environ}
+    env.pop('CACHE_URL', None)
+
+    result = subprocess.run(
+        [sys.executable, '-m', 'fast_async.server', '--workers', '2'],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=30,
+        check=False,
+    )
+
+    assert result.returncode != 0
+    assert 'needs CACHE_URL' in result.stderr
+
+
+def test_server_rolling_reload_on_sighup(launch):
+    process, url = launch('--workers', '2', '--max-requests', '0')
+    old_pids = worker_pids(url, 20)
+
+    process.send_signal(signal.SIGHUP)
+    responses = []
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        responses.append(httpx.get(url))
+        latest = {r.text for r in responses[-10:]}
+        if len(responses) >= 10 and latest.isdisjoint(old_pids):  # noqa: PLR2004
+            break
+
+    assert all(r.status_code == 200 for r in responses)  # noqa: PLR2004
+    assert latest.isdisjoint(old_pids)
+
+
+def test_server_stops_workers_on_sigterm(launch):
+    process, url = launch('--workers', '2', '--max-requests', '0')
+
+    process.send_signal(signal.SIGTERM)
+
+    assert process.wait(timeout=30) == 0
+    with pytest.raises(httpx.TransportError):
+        httpx.get(url)
+
+
+def test_workers_hash_with_the_calibrated_cost(launch):
+    _, url = launch(
+        '--workers',
+        '1',
+        app='tests.test_server:cost_app',
+        env={
+            'PASSWORD_HASH_TIME_COST': '1',
+            'PASSWORD_HASH_MEMORY_COST': '1024',
+            'PASSWORD_HASH_TARGET_MS': '50',
+        },
+    )
+
+    in_use, configured = httpx.get(url).text.split()
+
+    assert in_use == configured
+    assert int(in_use) > 1
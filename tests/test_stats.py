@@ -0,0 +1,138 @@
+import pytest
+from sqlalchemy import delete, func, insert, select, text, update
+
+from fast_async.models import Todo, TodoDailyCount, TodoStateCount, User
+from fast_async.stats import reconcile
+
+
+async def _state_counts(conn, user_id):
+    rows = await conn.execute(
+        select(TodoStateCount.state, TodoStateCount.todos).where(
+            TodoStateCount.user_id == user_id, TodoStateCount.todos != 0
+        )
+    )
+    return dict(rows.all())
+
+
+async def _daily_counts(conn, user_id):
+    rows = await conn.execute(
+        select(
+            TodoDailyCount.day, TodoDailyCount.created, TodoDailyCount.done
+        ).where(
+            TodoDailyCount.user_id == user_id,
+            (TodoDailyCount.created != 0) | (TodoDailyCount.done != 0),
+        )
+    )
+    return rows.all()
+
+
+@pytest.mark.asyncio
+async def test_done_at_follows_state(session, user):
+    todo = await session.scalar(
+        insert(Todo)
+        .values(title='t', description='d', state='todo', user_id=user.id)
+        .returning(Todo)
+    )
+    assert todo.done_at is None
+
+    await session.execute(
+        update(Todo).where(Todo.id == todo.id).values(state='done')
+    )
+    await session.refresh(todo)
+    done_at = todo.done_at
+    assert done_at is not None
+
+    await session.execute(
+        update(Todo).where(Todo.id == todo.id).values(title='new')
+    )
+    await session.refresh(todo)
+    assert todo.done_at == done_at
+
+    await session.execute(
+        update(Todo).where(Todo.id == todo.id).values(state='trash')
+    )
+    await session.refresh(todo)
+    assert todo.done_at is None
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_writes(session, user):
+    today = await session.scalar(select(func.current_date()))
+    await session.execute(
+        insert(Todo),
+        [
+            {
+                'title': 't',
+                'description': 'd',
+                'state': state,
+                'user_id': user.id,
+            }
+            for state in ('todo', 'todo', 'doing', 'done')
+        ],
+    )
+    assert await _state_counts(session, user.id) == {
+        'todo': 2,
+        'doing': 1,
+        'done': 1,
+    }
+    assert await _daily_counts(session, user.id) == [(today, 4, 1)]
+
+    await session.execute(
+        update(Todo).where(Todo.state == 'todo').values(state='done')
+    )
+    await session.execute(delete(Todo).where(Todo.state == 'doing'))
+
+    assert await _state_counts(session, user.id) == {'done': 3}
+    assert await _daily_counts(session, user.id) == [(today, 3, 3)]
+
+
+@pytest.mark.asyncio
+async def test_deleting_user_drops_counters(session, user):
+    await session.execute(
+        insert(Todo).values(
+            title='t', description='d', state='todo', user_id=user.id
+        )
+    )
+
+    await session.execute(delete(User).where(User.id == user.id))
+
+    assert not await session.scalar(select(func.count(TodoStateCount.user_id)))
+    assert not await session.scalar(select(func.count(TodoDailyCount.user_id)))
+
+
+@pytest.mark.usefixtures('truncate')
+@pytest.mark.asyncio
+async def test_reconcile_repairs_drift(engine):
+    async with engine.begin() as conn:
+        today = await conn.scalar(select(func.current_date()))
+        user_id = await conn.scalar(
+            insert(User)
+            .values(username='a', email='a@a.com', password='a')
+            .returning(User.id)
+        )
+        await conn.execute(
+            insert(Todo),
+            [
+                {
+                    'title': 't',
+                    'description': 'd',
+                    'state': state,
+                    'user_id': user_id,
+                }
+                for state in ('todo', 'done', 'done')
+            ],
+        )
+
+        # Drift the counters behind the triggers' back.
+        await conn.execute(text('ALTER TABLE todos DISABLE TRIGGER USER'))
+        await conn.execute(delete(Todo).where(Todo.state == 'todo'))
+        await conn.execute(text('ALTER TABLE todos ENABLE TRIGGER USER'))
+        await conn.execute(update(TodoStateCount).values(todos=7))
+        await conn.execute(delete(TodoDailyCount))
+
+    assert await reconcile(engine)
+
+    async with engine.connect() as conn:
+        assert await _state_counts(conn, user_id) == {'done': 2}
+        assert await _daily_counts(conn, user_id) == [(today, 2, 2)]
+    assert not await reconcile(engine)
@@ -3,8 +3,10 @@ from http import HTTPStatus
 import factory
 import factory.fuzzy
 import pytest
+from sqlalchemy import func, select, text, update
 
 from fast_async.models import Todo, TodoState
+from fast_async.schemas import TodoList
 
 
 class TodoFactory(factory.Factory):
@@ -54,6 +56,22 @@ async def test_list_todos_should_return_5_todos(session, token, user, client):
     assert len(response.json()['todos']) == expected_todos
 
 
+@pytest.mark.asyncio
+async def test_list_todos_body_matches_todo_list_schema(
+    session, token, user, client
+):
+    session.add_all(TodoFactory.create_batch(3, user_id=user.id))
+    await session.commit()
+    todos = (await session.scalars(select(Todo).order_by(Todo.id))).all()
+
+    response = client.get(
+        '/todos/', headers={'authorization': f'Bearer {token}'}
+    )
+
+    expected = TodoList.model_validate({'todos': todos}, from_attributes=True)
+    assert response.text == expected.model_dump_json()
+
+
 @pytest.mark.asyncio
 async def test_list_todos_filter_offset_limit(session, token, user, client):
     expected_todos = 2
@@ -69,6 +87,47 @@ async def test_list_todos_filter_offset_limit(session, token, user, client):
     assert len(response.json()['todos']) == expected_todos
 
 
+@pytest.mark.asyncio
+async def test_list_todos_cursor_pagination(session, token, user, client):
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+
+    ids = []
+    cursor = None
+    while True:
+        url = '/todos/?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(
+            url, headers={'authorization': f'Bearer {token}'}
+        ).json()
+        ids += [todo['id'] for todo in response['todos']]
+        cursor = response['next_cursor']
+        if not cursor:
+            break
+
+    assert ids == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_list_todos_offset_returns_next_cursor(
+    session, token, user, client
+):
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+
+    response = client.get(
+        '/todos/?offset=2&limit=2',
+        headers={'authorization': f'Bearer {token}'},
+    ).json()
+    next_response = client.get(
+        f'/todos/?limit=2&cursor={response["next_cursor"]}',
+        headers={'authorization': f'Bearer {token}'},
+    ).json()
+
+    assert [todo['id'] for todo in response['todos']] == [3, 4]
+    assert [todo['id'] for todo in next_response['todos']] == [5]
+    assert next_response['next_cursor'] is None
+
+
 @pytest.mark.asyncio
 async def test_list_todos_filter_title(session, token, user, client):
     expected_todos = 2
@@ -207,6 +266,42 @@ async def test_get_todos_all_values(
     ]
 
 
+@pytest.mark.asyncio
+async def test_list_todos_search_orders_by_relevance(
+    session, token, user, client
+):
+    session.add_all([
+        TodoFactory(
+            user_id=user.id, title='buy milk', description='groceries'
+        ),
+        TodoFactory(
+            user_id=user.id, title='milk the cow', description='milk milk'
+        ),
+        TodoFactory(user_id=user.id, title='walk', description='the dog'),
+    ])
+    await session.commit()
+
+    response = client.get(
+        '/todos/?search=milk',
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert [todo['title'] for todo in response.json()['todos']] == [
+        'milk the cow',
+        'buy milk',
+    ]
+    assert response.json()['next_cursor'] is None
+
+
+def test_list_todos_search_rejects_cursor(token, client):
+    response = client.get(
+        '/todos/?search=milk&cursor=abc',
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
 def test_list_todos_filter_title_min(token, client):
     test_title = 'l'
 
@@ -215,7 +310,7 @@ def test_list_todos_filter_title_min(token, client):
         headers={'authorization': f'Bearer {token}'},
     )
 
-    assert response.status_code == HTTPStatus.UNPROCESSABLE_CONTENT
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
 
 
 def test_list_todos_filter_title_max(token, client):
@@ -226,4 +321,278 @@ def test_list_todos_filter_title_max(token, client):
         headers={'authorization': f'Bearer {token}'},
     )
 
-    assert response.status_code == HTTPStatus.UNPROCESSABLE_CONTENT
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_create_todos_batch(client, token):
+    response = client.post(
+        '/todos/batch',
+        json={
+            'todos': [
+                {'title': f'todo {i}', 'description': 'd'} for i in range(3)
+            ]
+        },
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    results = response.json()['results']
+    assert response.status_code == HTTPStatus.CREATED
+    assert [r['status'] for r in results] == ['created'] * 3
+    assert [r['todo']['title'] for r in results] == [
+        'todo 0',
+        'todo 1',
+        'todo 2',
+    ]
+
+
+def test_create_todos_batch_not_atomic(client, token):
+    response = client.post(
+        '/todos/batch',
+        json={
+            'todos': [{'title': 'a', 'description': 'd'}],
+            'atomic': False,
+        },
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['results'][0]['status'] == 'created'
+
+
+@pytest.mark.asyncio
+async def test_patch_todos_batch(session, client, user, token):
+    session.add_all(
+        TodoFactory.create_batch(3, user_id=user.id, state=TodoState.todo)
+    )
+    await session.commit()
+
+    response = client.patch(
+        '/todos/batch',
+        json={'ids': [1, 3], 'state': 'done'},
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    results = response.json()['results']
+    assert response.status_code == HTTPStatus.OK
+    assert [(r['id'], r['status']) for r in results] == [
+        (1, 'updated'),
+        (3, 'updated'),
+    ]
+    assert {r['todo']['state'] for r in results} == {'done'}
+
+
+@pytest.mark.asyncio
+async def test_patch_todos_batch_atomic_rolls_back(
+    session, client, user, token
+):
+    session.add(TodoFactory(user_id=user.id, state=TodoState.todo))
+    await session.commit()
+
+    response = client.patch(
+        '/todos/batch',
+        json={'ids': [1, 2], 'state': 'done'},
+        headers={'authorization': f'Bearer {token}'},
+    )
+    todos = client.get(
+        '/todos/', headers={'authorization': f'Bearer {token}'}
+    ).json()['todos']
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {
+        'detail': {'message': 'Task not found.', 'ids': [2]}
+    }
+    assert todos[0]['state'] == 'todo'
+
+
+@pytest.mark.asyncio
+async def test_patch_todos_batch_not_atomic(session, client, user, token):
+    session.add(TodoFactory(user_id=user.id))
+    await session.commit()
+
+    response = client.patch(
+        '/todos/batch',
+        json={'ids': [1, 2], 'state': 'done', 'atomic': False},
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [r['status'] for r in response.json()['results']] == [
+        'updated',
+        'not_found',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_delete_todos_batch(session, client, user, other_user, token):
+    session.add_all(TodoFactory.create_batch(2, user_id=user.id))
+    session.add(TodoFactory(user_id=other_user.id))
+    await session.commit()
+
+    response = client.request(
+        'DELETE',
+        '/todos/batch',
+        json={'ids': [1, 2, 3], 'atomic': False},
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [r['status'] for r in response.json()['results']] == [
+        'deleted',
+        'deleted',
+        'not_found',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_delete_todos_batch_atomic(session, client, user, token):
+    session.add(TodoFactory(user_id=user.id))
+    await session.commit()
+
+    response = client.request(
+        'DELETE',
+        '/todos/batch',
+        json={'ids': [1, 2]},
+        headers={'authorization': f'Bearer {token}'},
+    )
+    todos = client.get(
+        '/todos/', headers={'authorization': f'Bearer {token}'}
+    ).json()['todos']
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert len(todos) == 1
+
+
+def test_list_todos_returns_etag(client, token):
+    response = client.get(
+        '/todos/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'].startswith('"')
+
+
+def test_list_todos_if_none_match_not_modified(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/todos/', headers=headers).headers['etag']
+
+    response = client.get(
+        '/todos/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert not response.content
+
+
+def test_list_todos_etag_changes_after_write(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/todos/', headers=headers).headers['etag']
+
+    client.post(
+        '/todos/',
+        headers=headers,
+        json={'title': 'Test', 'description': 'Test', 'state': 'draft'},
+    )
+    response = client.get(
+        '/todos/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'] != etag
+    assert len(response.json()['todos']) == 1
+
+
+def test_list_todos_etag_depends_on_filter(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/todos/', headers=headers)
+    second = client.get('/todos/?state=done', headers=headers)
+
+    assert first.headers['etag'] != second.headers['etag']
+
+
+@pytest.mark.asyncio
+async def test_todo_stats(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post(
+        '/todos/batch',
+        headers=headers,
+        json={
+            'todos': [
+                {'title': 't', 'description': 'd', 'state': 'draft'},
+                {'title': 't', 'description': 'd', 'state': 'todo'},
+                {'title': 't', 'description': 'd', 'state': 'todo'},
+                {'title': 't', 'description': 'd', 'state': 'done'},
+            ]
+        },
+    )
+    client.patch(
+        '/todos/batch', headers=headers, json={'ids': [2], 'state': 'done'}
+    )
+    client.delete('/todos/1', headers=headers)
+    today = await session.scalar(select(func.current_date()))
+
+    response = client.get('/todos/stats', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'states': {'draft': 0, 'todo': 1, 'doing': 0, 'done': 2, 'trash': 0},
+        'daily': [{'day': today.isoformat(), 'created': 3, 'done': 2}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_todo_stats_only_counts_own_todos(
+    session, client, other_user, token
+):
+    session.add_all(TodoFactory.create_batch(3, user_id=other_user.id))
+    await session.commit()
+
+    response = client.get(
+        '/todos/stats', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert not any(response.json()['states'].values())
+    assert response.json()['daily'] == []
+
+
+@pytest.mark.asyncio
+async def test_todo_stats_daily_window(session, client, user, token):
+    session.add_all(TodoFactory.create_batch(2, user_id=user.id))
+    await session.commit()
+    await session.execute(
+        update(Todo)
+        .where(Todo.id == 1)
+        .values(created_at=func.now() - text("interval '3 days'"))
+    )
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    recent = client.get('/todos/stats?days=3', headers=headers).json()
+    longer = client.get('/todos/stats?days=4', headers=headers).json()
+
+    assert sum(day['created'] for day in recent['daily']) == 1
+    assert sum(day['created'] for day in longer['daily']) == 2  # noqa: PLR2004
+
+
+def test_todo_stats_days_out_of_range(client, token):
+    response = client.get(
+        '/todos/stats?days=0', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_todo_stats_reads_counters_not_todos(
+    session, client, user, token, capture_sql
+):
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+
+    with capture_sql() as statements:
+        client.get(
+            '/todos/stats', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert not any('FROM todos' in statement for statement, _ in statements)
@@ -1,5 +1,11 @@
+from base64 import urlsafe_b64encode
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import select
+
+from fast_async.hashing import verify_password
+from fast_async.models import User
 from fast_async.schemas import UserPublic
 
 
@@ -57,7 +63,7 @@ def test_read_user(client, user, token):
     )
 
     assert resultado.status_code == HTTPStatus.OK
-    assert resultado.json() == {'users': [model_user]}
+    assert resultado.json() == {'users': [model_user], 'next_cursor': None}
 
 
 def test_update_user(client, token):
@@ -148,3 +154,85 @@ def test_delete_error_permissons(client, token, other_user):
 
     assert resultado.status_code == HTTPStatus.FORBIDDEN
     assert resultado.json() == {'detail': 'Not enough permissions'}
+
+
+def test_read_users_cursor_pagination(client, user, other_user, token):
+    first_page = client.get(
+        '/users/?limit=1', headers={'authorization': f'Bearer {token}'}
+    ).json()
+
+    second_page = client.get(
+        f'/users/?limit=1&cursor={first_page["next_cursor"]}',
+        headers={'authorization': f'Bearer {token}'},
+    ).json()
+
+    assert [u['id'] for u in first_page['users']] == [user.id]
+    assert [u['id'] for u in second_page['users']] == [other_user.id]
+    assert second_page['next_cursor'] is None
+
+
+def test_read_users_invalid_cursor(client, token):
+    resultado = client.get(
+        '/users/?cursor=not-a-cursor',
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert resultado.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert resultado.json() == {'detail': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize(
+    'payload', [b'[1e999]', b'[2147483648]', b'[-9223372036854775809]']
+)
+def test_read_users_out_of_range_cursor(client, token, payload):
+    cursor = urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+    resultado = client.get(
+        f'/users/?cursor={cursor}',
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    assert resultado.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert resultado.json() == {'detail': 'Invalid cursor'}
+
+
+@pytest.fixture(params=[False, True], ids=['stateful', 'stateless'])
+def auth_stateless(request, monkeypatch):
+    monkeypatch.setattr(
+        'fast_async.security.settings.AUTH_STATELESS', request.param
+    )
+
+
+@pytest.mark.usefixtures('auth_stateless')
+@pytest.mark.asyncio
+async def test_update_user_keeps_unchanged_password_hash(
+    client, session, user, token
+):
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'alice',
+            'email': user.email,
+            'password': user.clean_password,
+        },
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    stored = await session.scalar(
+        select(User.password).where(User.id == user.id)
+    )
+    assert stored == user.password
+
+
+@pytest.mark.asyncio
+async def test_update_user_hashes_new_password(client, session, user, token):
+    client.put(
+        f'/users/{user.id}',
+        json={'username': 'alice', 'email': user.email, 'password': 'nova'},
+        headers={'authorization': f'Bearer {token}'},
+    )
+
+    stored = await session.scalar(
+        select(User.password).where(User.id == user.id)
+    )
+    assert verify_password('nova', stored)